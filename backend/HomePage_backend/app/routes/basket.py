@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from backend.database import users_collection, item_collection, order_collection
-from backend.registerloginbackend.jwt_handler import get_current_user
+from backend.registerloginbackend.jwt_handler import get_current_user, load_user
+from backend.hydration import hydrate_items
 
 router = APIRouter()
 
@@ -14,14 +15,10 @@ async def get_basket(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="User not found")
 
     item_ids = user.get("basket", [])
-    items = []
-    for item_id in item_ids:
-        item = await item_collection.find_one(
-            {"item_id": item_id},
-            {"_id": 0, "item_id": 1, "title": 1, "price": 1, "isSold": 1}
-        )
-        if item:
-            items.append(item)
+    items = await hydrate_items(
+        item_ids,
+        {"_id": 0, "item_id": 1, "title": 1, "price": 1, "isSold": 1}
+    )
 
     return {"basket": items}
 
@@ -88,7 +85,7 @@ async def get_is_delivered(item_id: str, current_user: dict = Depends(get_curren
 
 @router.get("/is_processing")
 async def is_item_processing(item_id: str, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
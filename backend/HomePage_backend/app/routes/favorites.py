@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from backend.database import item_collection, users_collection
 from bson import ObjectId
 from backend.registerloginbackend.jwt_handler import get_current_user
+from backend.hydration import hydrate_items
 
 router = APIRouter()
 
@@ -15,13 +16,7 @@ async def get_favorites(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="User not found")
 
     favorite_ids = user.get("favorites", [])
-    favorites = []
-
-    for fav_id in favorite_ids:
-        product = await item_collection.find_one({"item_id": fav_id})
-        if product:
-            product["_id"] = str(product["_id"])
-            favorites.append(product)
+    favorites = await hydrate_items(favorite_ids)
 
     return {"favorites": favorites}
 
@@ -1,52 +1,54 @@
 from io import BytesIO
 from bson import ObjectId
-from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi import APIRouter, Query, HTTPException, Depends, Request
 from typing import Optional
 from backend.database import item_collection, users_collection, order_collection, category_collection
 from backend.HomePage_backend.app.schemas import ProductCreate, ProductUpdate, CategoryModel
 from datetime import datetime, time, timezone
-from backend.registerloginbackend.jwt_handler import get_current_user
-import smtplib
+from backend.registerloginbackend.jwt_handler import get_current_user, load_user
+from backend.pagination import fetch_page
+from backend.item_refs import pull_item_references
+from backend.facets import get_facet_counts, empty_facet_counts
+from backend.response_cache import LISTING_TAG, CATEGORIES_TAG, cached_json, invalidate_items, invalidate_categories
+from backend.search import ITEM_PUBLIC_PROJECTION, SEARCHABLE_FIELDS, search_fields, search_pipeline
+from backend.mailer import enqueue_emails
+from backend.invoices import get_invoice_pdf
+from backend.streaming import EXPORT_FORMAT_PATTERN, EXPORT_BATCH_SIZE, select_columns, export_projection, stream_export
 from email.mime.text import MIMEText
-from email.message import EmailMessage
 from fastapi.responses import StreamingResponse
 from starlette.responses import Response
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.mime.text import MIMEText
 from io import BytesIO
-from reportlab.pdfgen import canvas
 
 
 router = APIRouter()
 
 # ------------------------- sneding discount email -------------------------
-async def send_discount_email(to_email: str, product_title: str, old_price: float, discounted_price: float):
-    sender_email = "susold78@gmail.com"
-    sender_password = "eoiz jtje lhyv lhsn"
-
-    msg = EmailMessage()
-    msg.set_content(
+async def send_discount_email(to_emails: list, product_title: str, old_price: float, discounted_price: float):
+    body = (
         f"The product '{product_title}' in your wishlist has a new discount!\n\n"
         f"Old Price: {old_price} TL\n"
         f"New Price: {discounted_price} TL\n\n"
         f"Visit SUSOLD to purchase it before the discount ends!"
     )
-    msg["Subject"] = "SUSOLD Discount Alert"
-    msg["From"] = sender_email
-    msg["To"] = to_email
-
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(sender_email, sender_password)
-            smtp.send_message(msg)
-    except Exception as e:
-        print("Failed to send discount email:", e)
+    await enqueue_emails(to_emails, "SUSOLD Discount Alert", body)
 
 # ------------------------- GET: List Products -------------------------
+DEFAULT_PAGE_SIZE = 48
+
+# sort_by -> (field, direction); ties are broken on _id when paginating
+HOME_SORTS = {
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+    "popularity": ("likes", -1),
+    "newest": ("created_at", -1),
+}
+
 @router.get("/home/")
 async def get_home_data(
+    request: Request,
     title: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     sub_category: Optional[str] = Query(None),
@@ -67,92 +69,145 @@ async def get_home_data(
     image: Optional[str] = Query(None),
     item_id: Optional[str] = Query(None),
     sort_by: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, max_length=200),
+    typeahead: bool = Query(False),
+    facets: bool = Query(False),
 ):
-    query = {}
-
-    if title:
-        query["title"] = {"$regex": title, "$options": "i"}
-    if category:
-        query["category"] = category
-    if sub_category:
-        query["sub_category"] = sub_category
-    if brand:
-        query["brand"] = brand
-    if price is not None:
-        query["price"] = price
-    if min_price is not None or max_price is not None:
-        query.setdefault("price", {})
-        if min_price is not None:
-            query["price"]["$gte"] = min_price
-        if max_price is not None:
-            query["price"]["$lte"] = max_price
-    if condition:
-        query["condition"] = condition
-    if age is not None:
-        query["age"] = age
-    if course is not None:
-        query["course"] = course
-    if dorm is not None:
-        query["dorm"] = dorm
-    if verified is not None:
-        query["verified"] = verified
-    if inStock is not None:
-        query["inStock"] = inStock
-    if available_now is not None:
-        query["available_now"] = available_now
-    if isSold:
-        query["isSold"] = isSold
-    if returnable is not None:
-        query["returnable"] = returnable
-    if description:
-        query["description"] = {"$regex": description, "$options": "i"}
-    if image:
-        query["image"] = {"$regex": image, "$options": "i"}
-    if item_id:
-        query["item_id"] = item_id
-
-    query["price"] = {"$gt": 0}
-
-    sort_order = []
-    if sort_by == "price_asc":
-        sort_order.append(("price", 1))
-    elif sort_by == "price_desc":
-        sort_order.append(("price", -1))
-    elif sort_by == "popularity":
-        sort_order.append(("likes", -1))
-    elif sort_by == "newest":
-        sort_order.append(("created_at", -1))
-
-    cursor = item_collection.find(query)
-    if sort_order:
-        cursor = cursor.sort(sort_order)
-
-    products = []
-    async for product in cursor:
-        product["item_id"] = product.get("item_id", str(product["_id"]))
-        product["_id"] = str(product["_id"])
-        products.append(product)
-
-    return {"featured_products": products}
+    # Search results are ranked by relevance and have no keyset order to page on
+    if q and (cursor is not None or sort_by is not None):
+        raise HTTPException(status_code=400, detail="cursor and sort_by cannot be combined with q; use limit")
+
+    # Served from the response cache until a product write invalidates listings
+    async def build():
+        query = {}
+
+        if title:
+            query["title"] = {"$regex": title, "$options": "i"}
+        if category:
+            query["category"] = category
+        if sub_category:
+            query["sub_category"] = sub_category
+        if brand:
+            query["brand"] = brand
+        if price is not None:
+            query["price"] = price
+        if min_price is not None or max_price is not None:
+            query.setdefault("price", {})
+            if min_price is not None:
+                query["price"]["$gte"] = min_price
+            if max_price is not None:
+                query["price"]["$lte"] = max_price
+        if condition:
+            query["condition"] = condition
+        if age is not None:
+            query["age"] = age
+        if course is not None:
+            query["course"] = course
+        if dorm is not None:
+            query["dorm"] = dorm
+        if verified is not None:
+            query["verified"] = verified
+        if inStock is not None:
+            query["inStock"] = inStock
+        if available_now is not None:
+            query["available_now"] = available_now
+        if isSold:
+            query["isSold"] = isSold
+        if returnable is not None:
+            query["returnable"] = returnable
+        if description:
+            query["description"] = {"$regex": description, "$options": "i"}
+        if image:
+            query["image"] = {"$regex": image, "$options": "i"}
+        if item_id:
+            query["item_id"] = item_id
+
+        query["price"] = {"$gt": 0}
+
+        # Search mode: indexed term lookup ranked by relevance, other filters still apply
+        pipeline = search_pipeline(q, query, limit or DEFAULT_PAGE_SIZE, typeahead) if q else None
+
+        # Facet counts share the listing's match (one cached $facet aggregation)
+        response = {}
+        if facets:
+            if pipeline == []:
+                response["facets"] = empty_facet_counts()
+            else:
+                response["facets"] = await get_facet_counts(pipeline[0]["$match"] if pipeline else query)
+
+        if q:
+            docs = await item_collection.aggregate(pipeline).to_list(length=None) if pipeline else []
+            for product in docs:
+                product["item_id"] = product.get("item_id", str(product["_id"]))
+                product["_id"] = str(product["_id"])
+            return {"featured_products": docs, **response}
+
+        sort_field, direction = HOME_SORTS.get(sort_by, ("_id", 1))
+
+        # Keyset pagination: only used when the client asks for a page
+        if limit is not None or cursor is not None:
+            docs, next_cursor = await fetch_page(
+                item_collection, query, limit or DEFAULT_PAGE_SIZE, cursor,
+                sort_field=sort_field, direction=direction, projection=ITEM_PUBLIC_PROJECTION
+            )
+            for product in docs:
+                product["item_id"] = product.get("item_id", str(product["_id"]))
+                product["_id"] = str(product["_id"])
+            return {"featured_products": docs, "next_cursor": next_cursor, **response}
+
+        items_cursor = item_collection.find(query, ITEM_PUBLIC_PROJECTION)
+        if sort_by in HOME_SORTS:
+            items_cursor = items_cursor.sort([(sort_field, direction)])
+
+        products = []
+        async for product in items_cursor:
+            product["item_id"] = product.get("item_id", str(product["_id"]))
+            product["_id"] = str(product["_id"])
+            products.append(product)
+
+        return {"featured_products": products, **response}
+
+    return await cached_json(request, [LISTING_TAG], build)
+
+
+# ------------------------- GET: Search suggestions (PUBLIC) -------------------------
+@router.get("/home/suggest")
+async def suggest_products(request: Request, q: str = Query(..., min_length=1, max_length=100), limit: int = Query(8, ge=1, le=20)):
+    async def build():
+        pipeline = search_pipeline(q, {"price": {"$gt": 0}}, limit, typeahead=True)
+        if not pipeline:
+            return {"suggestions": []}
+        pipeline.append({"$project": {"_id": 0, "item_id": 1, "title": 1}})
+        return {"suggestions": await item_collection.aggregate(pipeline).to_list(length=limit)}
+
+    return await cached_json(request, [LISTING_TAG], build)
 
 
 # ------------------------- GET: Product by item_id (PUBLIC) -------------------------
 @router.get("/home/item/{item_id}")
-async def get_product_by_item_id(item_id: str):
-    product = await item_collection.find_one({"item_id": item_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    product["_id"] = str(product["_id"])
-    return product
+async def get_product_by_item_id(item_id: str, request: Request):
+    async def build():
+        product = await item_collection.find_one({"item_id": item_id}, ITEM_PUBLIC_PROJECTION)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product["_id"] = str(product["_id"])
+        return product
+
+    return await cached_json(request, [f"item:{item_id}"], build)
 
 
 # ------------------------- GET: Product by title (PUBLIC) -------------------------
 @router.get("/home/title/{title}")
-async def get_product_id_by_title(title: str):
-    product = await item_collection.find_one({"title": title})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return {"item_id": product.get("item_id", str(product["_id"]))}
+async def get_product_id_by_title(title: str, request: Request):
+    async def build():
+        product = await item_collection.find_one({"title": title}, {"item_id": 1})
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return {"item_id": product.get("item_id", str(product["_id"]))}
+
+    return await cached_json(request, [f"title:{title}"], build)
 
 
 # ------------------------- POST: Add Product (LOGIN REQUIRED) -------------------------
@@ -170,12 +225,14 @@ async def add_product(product: ProductCreate, current_user: dict = Depends(get_c
     if product_dict.get("warranty_expiry"):
         product_dict["warranty_expiry"] = datetime.combine(product_dict["warranty_expiry"], time.min)
 
+    product_dict.update(search_fields(product_dict))
     await item_collection.insert_one(product_dict)
 
     await users_collection.update_one(
         {"user_id": current_user["user_id"]},
         {"$push": {"offeredProducts": product_dict["item_id"]}}
     )
+    await invalidate_items([product_dict["item_id"]], [product_dict.get("title")])
 
     return {"message": "Product added successfully", "item_id": product_dict["item_id"]}
 
@@ -201,10 +258,15 @@ async def update_product(item_id: str, update_data: ProductUpdate, current_user:
     if "isSold" in update_fields and not current_user.get("isManager", False):
         raise HTTPException(status_code=403, detail="Only product managers can update delivery status.")
 
+    # Keep the search terms in step with the text fields
+    if any(field in update_fields for field in SEARCHABLE_FIELDS):
+        update_fields.update(search_fields({**existing_item, **update_fields}))
+
     await item_collection.update_one(
         {"item_id": item_id},
         {"$set": update_fields}
     )
+    await invalidate_items([item_id], [existing_item.get("title"), update_fields.get("title")])
 
     return {"message": "Product updated successfully"}
 
@@ -223,19 +285,12 @@ async def delete_product(item_id: str, current_user: dict = Depends(get_current_
         raise HTTPException(status_code=403, detail="Not authorized to delete this product")
 
     await item_collection.delete_one({"item_id": item_id})
+    await invalidate_items([item_id], [existing_item.get("title")])
 
-    await users_collection.update_many(
-        {},  # all users
-        {
-            "$pull": {
-                "offeredProducts": item_id,
-                "basket": item_id,
-                "favorites": item_id
-            }
-        }
-    )
+    # Only users that reference the item are matched (indexed reverse lookups)
+    users_updated = await pull_item_references(item_id)
 
-    return {"message": "Product deleted successfully and removed from all user data"}
+    return {"message": "Product deleted successfully and removed from all user data", "users_updated": users_updated}
 
 
 
@@ -244,8 +299,8 @@ async def delete_product(item_id: str, current_user: dict = Depends(get_current_
 #------discount method ---------
 @router.post("/home/set-discount/{item_id}")
 async def set_discount(item_id: str, discount_rate: float = Query(...), current_user: dict = Depends(get_current_user)):
-    # 🔁 Get the full user from DB, because JWT doesn't include isSalesManager
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    # 🔁 Get the full user (cached for this request), because JWT doesn't include isSalesManager
+    user = await load_user(current_user)
     if not user or not user.get("isSalesManager", False):
         raise HTTPException(status_code=403, detail="Only sales managers can set discounts.")
 
@@ -263,10 +318,12 @@ async def set_discount(item_id: str, discount_rate: float = Query(...), current_
         {"item_id": item_id},
         {"$set": {"discount_rate": discount_rate, "discounted_price": discounted_price}}
     )
+    await invalidate_items([item_id])
 
-    users_cursor = users_collection.find({"favorites": item_id})
-    async for user in users_cursor:
-        await send_discount_email(user["email"], product["title"], old_price, discounted_price)
+    # Queue one alert per user who favorited the item; delivery happens in the mail workers
+    users_cursor = users_collection.find({"favorites": item_id}, {"email": 1, "_id": 0})
+    emails = [user["email"] async for user in users_cursor]
+    await send_discount_email(emails, product["title"], old_price, discounted_price)
 
     return {"message": f"Discount applied. New price: {discounted_price} TL"}
 
@@ -274,10 +331,61 @@ async def set_discount(item_id: str, discount_rate: float = Query(...), current_
 
 #------ sales summary method -------
 
+def _sales_summary_pipeline(start_dt: datetime, end_dt: datetime, by_day: bool, by_category: bool) -> list:
+    # One row per (order, item). Revenue is counted on the first row of each
+    # order only; cost falls back to 50% of the sale price if the item has none.
+    facets = {
+        "totals": [
+            {"$group": {"_id": None, "revenue": {"$sum": "$revenue"}, "cost": {"$sum": "$cost"}}}
+        ]
+    }
+    if by_day:
+        facets["by_day"] = [
+            {"$group": {"_id": "$day", "revenue": {"$sum": "$revenue"}, "cost": {"$sum": "$cost"}}},
+            {"$sort": {"_id": 1}}
+        ]
+    if by_category:
+        # An order's total spans categories, so per-category revenue uses item prices
+        facets["by_category"] = [
+            {"$match": {"item.item_id": {"$exists": True}}},
+            {"$group": {"_id": "$item.category", "revenue": {"$sum": "$item_price"}, "cost": {"$sum": "$cost"}}},
+            {"$sort": {"_id": 1}}
+        ]
+
+    return [
+        {"$match": {"date": {"$gte": start_dt, "$lte": end_dt}}},
+        {"$project": {"_id": 0, "date": 1, "total_price": 1, "item_ids": 1}},
+        {"$unwind": {"path": "$item_ids", "includeArrayIndex": "line", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {"from": item_collection.name, "localField": "item_ids", "foreignField": "item_id", "as": "item"}},
+        {"$set": {"item": {"$arrayElemAt": ["$item", 0]}}},
+        {"$set": {
+            "revenue": {"$cond": [{"$eq": [{"$ifNull": ["$line", 0]}, 0]}, {"$ifNull": ["$total_price", 0]}, 0]},
+            "item_price": {"$ifNull": ["$item.price", 0]},
+            "cost": {"$cond": [
+                {"$ifNull": ["$item", False]},
+                {"$ifNull": ["$item.cost", {"$multiply": [{"$ifNull": ["$item.price", 0]}, 0.5]}]},
+                0
+            ]},
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}
+        }},
+        {"$facet": facets}
+    ]
+
+
+def _summary_row(group: dict) -> dict:
+    return {
+        "revenue": round(group["revenue"], 2),
+        "cost": round(group["cost"], 2),
+        "profit": round(group["revenue"] - group["cost"], 2)
+    }
+
+
 @router.get("/home/sales-summary")
 async def sales_summary(
     start_date: str = Query(...),
     end_date: str = Query(...),
+    by_day: bool = Query(False),
+    by_category: bool = Query(False),
     current_user: dict = Depends(get_current_user)
 ):
     if not current_user.get("isSalesManager", False):
@@ -289,37 +397,40 @@ async def sales_summary(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    orders = await order_collection.find({
-        "date": {"$gte": start_dt, "$lte": end_dt}
-    }).to_list(None)
-
-    total_revenue = 0
-    total_cost = 0
-
-    for order in orders:
-        total_revenue += order.get("total_price", 0)
-        for item_id in order.get("item_ids", []):
-            item = await item_collection.find_one({"item_id": item_id})
-            if item:
-                sale_price = item.get("price", 0)
-                cost = item.get("cost", sale_price * 0.5)  # fallback to 50% if no cost field
-                total_cost += cost
+    pipeline = _sales_summary_pipeline(start_dt, end_dt, by_day, by_category)
+    result = await order_collection.aggregate(pipeline).to_list(length=1)
+    facets = result[0] if result else {}
 
+    totals = facets.get("totals") or [{"revenue": 0, "cost": 0}]
+    total_revenue = totals[0]["revenue"]
+    total_cost = totals[0]["cost"]
     total_profit = total_revenue - total_cost
 
-    return {
+    summary = {
         "start_date": start_date,
         "end_date": end_date,
         "total_revenue": round(total_revenue, 2),
         "total_cost": round(total_cost, 2),
         "total_profit": round(total_profit, 2)
     }
+    if by_day:
+        summary["by_day"] = [{"date": g["_id"], **_summary_row(g)} for g in facets.get("by_day", [])]
+    if by_category:
+        summary["by_category"] = [{"category": g["_id"], **_summary_row(g)} for g in facets.get("by_category", [])]
+
+    return summary
 
 #-----view the invoices in data range----
+INVOICE_EXPORT_COLUMNS = ["order_id", "user_id", "date", "total_price", "number_of_items"]
+
+
 @router.get("/home/invoices")
 async def get_invoices_by_date(
     start_date: str,
     end_date: str,
+    user_id: Optional[str] = Query(None),
+    export_format: Optional[str] = Query(None, alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    columns: Optional[str] = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
     if not current_user.get("isSalesManager", False):
@@ -333,9 +444,17 @@ async def get_invoices_by_date(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-    orders = await order_collection.find({
-        "date": {"$gte": start_dt, "$lte": end_dt}
-    }).to_list(None)
+    query = {"date": {"$gte": start_dt, "$lte": end_dt}}
+    if user_id:
+        query["user_id"] = user_id
+
+    # Exports stream straight from the cursor instead of building the list
+    if export_format:
+        selected = select_columns(columns, INVOICE_EXPORT_COLUMNS)
+        docs = order_collection.find(query, export_projection(selected)).sort("date", 1).batch_size(EXPORT_BATCH_SIZE)
+        return stream_export(docs, export_format, selected, f"invoices_{start_date}_{end_date}")
+
+    orders = await order_collection.find(query, export_projection(INVOICE_EXPORT_COLUMNS)).to_list(None)
 
     results = []
     for order in orders:
@@ -361,36 +480,11 @@ async def download_invoice_pdf(order_id: str, current_user: dict = Depends(get_c
     if current_user["user_id"] != order["user_id"] and not current_user.get("isSalesManager", False):
         raise HTTPException(status_code=403, detail="Not authorized to download this invoice.")
 
-    # Get item details
-    item_ids = order.get("item_ids", [])
-    item_docs = await item_collection.find({"item_id": {"$in": item_ids}}).to_list(length=None)
-    item_names = [item["title"] for item in item_docs]
-
-    # Build message
-    message = (
-        f"Invoice for Order ID: {order['order_id']}\n\n"
-        f"User ID: {order['user_id']}\n"
-        f"Date: {order['date']}\n\n"
-        f"Purchased Items:\n- " + "\n- ".join(item_names) + "\n\n"
-        f"Shipping Address: {order['shipping_address']}\n"
-        f"Payment Info: {order['payment_info']}\n\n"
-        f"Total Price: {order['total_price']}\n"
-        f"Number of Items: {order['number_of_items']}\n"
-    )
-
-    # Generate PDF in memory
-    pdf_buffer = BytesIO()
-    p = canvas.Canvas(pdf_buffer)
-    text_object = p.beginText(40, 800)
-    for line in message.split("\n"):
-        text_object.textLine(line)
-    p.drawText(text_object)
-    p.showPage()
-    p.save()
-    pdf_buffer.seek(0)
+    # Rendered once per order and served from storage afterwards
+    pdf_bytes = await get_invoice_pdf(order)
 
     return StreamingResponse(
-        pdf_buffer,
+        BytesIO(pdf_bytes),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename=invoice_{order_id}.pdf"}
     )
@@ -407,11 +501,15 @@ async def create_category(category: CategoryModel, current_user: dict = Depends(
         raise HTTPException(status_code=400, detail="Category already exists.")
 
     await category_collection.insert_one({"name": category.name})
+    await invalidate_categories()
 
     return {"message": f"Category '{category.name}' created successfully."}
 
 @router.get("/categories")
-async def get_all_categories():
-    categories_cursor = category_collection.find({})
-    categories = await categories_cursor.to_list(length=None)
-    return {"categories": [c["name"] for c in categories]}
\ No newline at end of file
+async def get_all_categories(request: Request):
+    async def build():
+        categories_cursor = category_collection.find({}, {"name": 1, "_id": 0})
+        categories = await categories_cursor.to_list(length=None)
+        return {"categories": [c["name"] for c in categories]}
+
+    return await cached_json(request, [CATEGORIES_TAG], build)
\ No newline at end of file
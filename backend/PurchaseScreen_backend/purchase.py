@@ -1,21 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import BaseModel
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
-import random
 
 from backend.database import users_collection, order_collection, item_collection
-from backend.registerloginbackend.jwt_handler import get_current_user
+from backend.registerloginbackend.jwt_handler import get_current_user, invalidate_principal, load_user
+from backend.mailer import enqueue_email
+from backend.ids import allocate_id
+from backend.transactions import run_in_transaction
+from backend.response_cache import invalidate_items
+from backend.invoices import render_pdf_async, invoice_text, store_invoice
+from backend.inspector import (
+    MAX_PAGE_SIZE, MAX_SAMPLE_SIZE, database_summary, get_inspectable, redaction, sample_documents
+)
+from backend.pagination import fetch_page
+from backend.streaming import stream_json_array
 
 ###
 from datetime import datetime, timezone, timedelta
 from bson import ObjectId
 
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from email.mime.text import MIMEText
-from io import BytesIO
-from reportlab.pdfgen import canvas
 ###
 
 router = APIRouter()
@@ -38,6 +42,7 @@ async def add_credit_card(entry: NewEntry, current_user: dict = Depends(get_curr
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found or card not added.")
+    await invalidate_principal(user_id=current_user["user_id"])
     return {"message": "Credit card added successfully"}
 
 @router.post("/add-address")
@@ -48,6 +53,7 @@ async def add_address(entry: NewEntry, current_user: dict = Depends(get_current_
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found or address not added.")
+    await invalidate_principal(user_id=current_user["user_id"])
     return {"message": "Address added successfully"}
 
 
@@ -133,17 +139,8 @@ async def complete_order(data: CreateOrderRequest, current_user: dict = Depends(
 
     ## Now we will generate a row for order_collection
 
-    ## Create a list of all order_id values (to make sure that the newly generated order_id isn't a duplicate)
-    order_cursor = order_collection.find({}, {'order_id': 1, '_id': 0})
-    order_docs = await order_cursor.to_list(length=None)
-    order_ids = [doc['order_id'] for doc in order_docs]
-
-    ## Generate a new order_id until one that hasn't already been used is found
-    while True:
-        order_id_number = random.randint(0, 99999)
-        order_id = f"order{order_id_number:05d}"
-        if order_id not in order_ids:
-            break
+    ## Allocate a new order_id from the shared counter (no scan of existing orders)
+    order_id = await allocate_id("order")
 
     ###
     ## Now, let us create a date object
@@ -175,20 +172,27 @@ async def complete_order(data: CreateOrderRequest, current_user: dict = Depends(
         "number_of_items": number_of_items
         ###
     }
-    await order_collection.insert_one(new_order)
 
-    # Update the stock and delivery status of each item in item_collection
-    for item_id in item_ids:
-        await item_collection.update_one(
-            {"item_id": item_id},
-            {"$set": {"isSold": "processing", "inStock": False}}
+    ## Order insert, item status and basket clear commit together
+    async def place_order(session):
+        await order_collection.insert_one(new_order, session=session)
+
+        # One write for every purchased item
+        await item_collection.update_many(
+            {"item_id": {"$in": item_ids}},
+            {"$set": {"isSold": "processing", "inStock": False}},
+            session=session
         )
 
-    ## Empty the cart
-    await users_collection.update_one(
-        {"user_id": user_id},
-        {"$set": {"basket": []}}
-    )
+        ## Empty the cart
+        await users_collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"basket": []}},
+            session=session
+        )
+
+    await run_in_transaction(place_order)
+    await invalidate_items(item_ids)
 
     ## Now we will generate the invoice
 
@@ -217,46 +221,17 @@ async def complete_order(data: CreateOrderRequest, current_user: dict = Depends(
     ###
     ## Now, we will send the invoice as an email with a PDF attachment
 
-    # Email account credentials
-    sender_email = "susold78@gmail.com"
-    sender_password = "eoiz jtje lhyv lhsn"
-    receiver_email = current_user["email"]
-
-    # Generate PDF from message string
-    pdf_buffer = BytesIO()
-    p = canvas.Canvas(pdf_buffer)
-    text_object = p.beginText(40, 800)  # Starting position
-
-    for line in message.split("\n"):
-        text_object.textLine(line)
-    p.drawText(text_object)
-    p.showPage()
-    p.save()
-    pdf_buffer.seek(0)
-
-    # Create the email with attachment
-    msg = MIMEMultipart()
-    msg["Subject"] = "SUSOLD Invoice"
-    msg["From"] = sender_email
-    msg["To"] = receiver_email
-
-    # Add a plain-text fallback message
-    msg.attach(MIMEText("Please find your invoice attached as a PDF."))
-
-    # Add PDF attachment
-    pdf_attachment = MIMEApplication(pdf_buffer.read(), _subtype="pdf")
-    pdf_attachment.add_header("Content-Disposition", "attachment", filename="invoice.pdf")
-    msg.attach(pdf_attachment)
-
-    # Send the email
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
-
-    server = smtplib.SMTP(smtp_server, smtp_port)
-    server.starttls()
-    server.login(sender_email, sender_password)
-    server.sendmail(sender_email, receiver_email, msg.as_string())
-    server.quit()
+    # Render the invoice in the worker pool and store it for later downloads
+    pdf_bytes = await render_pdf_async(invoice_text(new_order, item_names))
+    pdf_bytes = await store_invoice(order_id, pdf_bytes)
+
+    # Queue the email; the mail workers send it so checkout does not wait on SMTP
+    await enqueue_email(
+        current_user["email"],
+        "SUSOLD Invoice",
+        "Please find your invoice attached as a PDF.",
+        attachments=[{"filename": "invoice.pdf", "content": pdf_bytes, "subtype": "pdf"}]
+    )
     ###
 
     return {"message": message}
@@ -291,21 +266,38 @@ async def get_order_history(current_user: dict = Depends(get_current_user)):
     return {"order_items": items}
 
 
-@router.get("/debug-all")
-async def debug_all():
-    users = await users_collection.find().to_list(length=None)
-    items = await item_collection.find().to_list(length=None)
-    orders = await order_collection.find().to_list(length=None)
-
-    # Clean _id fields
-    users = [clean_document(doc) for doc in users]
-    items = [clean_document(doc) for doc in items]
-    orders = [clean_document(doc) for doc in orders]
-
-    return {
-        "users": users,
-        "items": items,
-        "orders": orders
-    }
+# ------------------------- Admin database inspector -------------------------
+# Admins are granted with "python -m backend.admins --grant <email>"
+async def require_admin(current_user: dict):
+    # Read from the database, not the principal cache: a revoked admin loses access at once
+    user = await users_collection.find_one({"user_id": current_user["user_id"]}, {"isAdmin": 1})
+    if not user or not user.get("isAdmin", False):
+        raise HTTPException(status_code=403, detail="Only admins can inspect the database.")
 
 
+@router.get("/debug-all")
+async def debug_all(current_user: dict = Depends(get_current_user)):
+    # Counts, storage and index usage only; documents are fetched per collection below
+    await require_admin(current_user)
+    return await database_summary()
+
+
+@router.get("/debug-all/{collection_name}")
+async def debug_collection(
+    collection_name: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    sample: Optional[int] = Query(None, ge=1, le=MAX_SAMPLE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    await require_admin(current_user)
+    collection = get_inspectable(collection_name)
+
+    if sample:
+        return stream_json_array(sample_documents(collection_name, sample), clean_document)
+
+    docs, next_cursor = await fetch_page(collection, {}, limit, cursor, projection=redaction(collection_name))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [clean_document(doc) for doc in docs]
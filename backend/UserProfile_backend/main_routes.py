@@ -1,40 +1,31 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import HttpUrl, Field
-from typing import Annotated
+from typing import Annotated, Optional
 from bson import ObjectId
 from datetime import datetime, timezone, timedelta
 from backend.database import users_collection, feedback_collection, item_collection, order_collection, refund_collection
-from backend.registerloginbackend.jwt_handler import get_current_user, get_password_hash
-from backend.UserProfile_backend.model import FeedbackInput, UserUpdate, RefundRequestBody
+from backend.registerloginbackend.jwt_handler import get_current_user, hash_password, load_user, invalidate_principal
+from backend.UserProfile_backend.model import FeedbackInput, UserUpdate, RefundRequestBody, RefundBatchBody
 from backend.HomePage_backend.app.schemas import ProductCreate as Product
-import smtplib
-import random
-from email.message import EmailMessage
+from backend.hydration import hydrate_items
+from backend.item_refs import pull_item_references
+from backend.search import ITEM_PUBLIC_PROJECTION, search_fields
+from backend.response_cache import invalidate_items
+from backend.ratings import record_rating, rating_summary
+from backend.transactions import run_in_transaction
+from backend.mailer import enqueue_email, enqueue_messages
+from backend.ids import allocate_id
+from backend.pagination import fetch_page, encode_cursor, decode_cursor, keyset_filter
+from backend.streaming import (
+    stream_json_array, stream_export, select_columns, export_projection, EXPORT_FORMAT_PATTERN, EXPORT_BATCH_SIZE
+)
 
 async def send_email_notification(to_email: str, subject: str, body: str):
-    sender_email = "susold78@gmail.com"
-    sender_password = "eoiz jtje lhyv lhsn"
-
-    msg = EmailMessage()
-    msg.set_content(body)
-    msg["Subject"] = subject
-    msg["From"] = sender_email
-    msg["To"] = to_email
-
-    # You need to replace with your actual SMTP credentials
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(sender_email, sender_password)
-            smtp.send_message(msg)
-    except Exception as e:
-        print("Email sending failed:", e)
+    # Queued; the mail workers deliver it outside the request
+    await enqueue_email(to_email, subject, body)
 
 async def generate_unique_item_id():
-    while True:
-        item_id = "item" + str(random.randint(10000, 99999))
-        existing_user = await item_collection.find_one({"item_id": item_id})
-        if not existing_user:
-            return item_id
+    return await allocate_id("item")
         
 main_router = APIRouter()
 
@@ -49,7 +40,7 @@ main_router = APIRouter()
 # -------------------------------
 @main_router.get("/is_manager")
 async def is_user_manager(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
      
@@ -62,7 +53,7 @@ async def is_user_manager(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 @main_router.get("/is_sales_manager")
 async def is_user_sales_manager(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
      
@@ -75,7 +66,7 @@ async def is_user_sales_manager(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 @main_router.get("/my_name")
 async def get_my_name(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -87,7 +78,7 @@ async def get_my_name(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 @main_router.get("/current_photo")
 async def get_current_photo(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -100,11 +91,11 @@ async def get_current_photo(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 @main_router.get("/current_rating")
 async def get_current_rating(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return {"current_rating": user.get("rating", 0.0)}
+    return {"current_rating": rating_summary(user)["rating"]}
 
 
 # -------------------------------
@@ -112,7 +103,7 @@ async def get_current_rating(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 @main_router.get("/is_verified")
 async def is_user_verified(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -125,7 +116,7 @@ async def is_user_verified(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 @main_router.put("/update_user_info")
 async def update_user_info(update_data: UserUpdate, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -141,27 +132,30 @@ async def update_user_info(update_data: UserUpdate, current_user: dict = Depends
         raise HTTPException(status_code=400, detail=str(e))
 
     if "password" in update_dict:
-        update_dict["password"] = get_password_hash(update_dict["password"])
+        update_dict["password"] = await hash_password(update_dict["password"])
 
     await users_collection.update_one({"user_id": current_user["user_id"]}, {"$set": update_dict})
+    await invalidate_principal(email=user.get("email"), user_id=user_id)
 
     return {"message": "User information updated successfully"}
 
 
 @main_router.get("/users/me/info")
 async def get_my_user_info(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
+
+    rating = rating_summary(user)
     return {
         "name": user["name"],
         "lastname": user["lastname"],
         "email": user["email"],
         "photo": user.get("photo", []),
         "isVerified": user.get("isVerified", False),
-        "rating": user.get("rating", 0.0),
-        "rate_number": user.get("rate_number", 0),
+        "rating": rating["rating"],
+        "rate_number": rating["rate_number"],
+        "rating_histogram": rating["histogram"],
         "user_id": user["user_id"],
         "isManager": user.get("isManager", False),
         "isSalesManager": user.get("isSalesManager", False),
@@ -186,9 +180,17 @@ async def send_feedback(data: FeedbackInput, current_user: dict = Depends(get_cu
     if data.rating is None and (data.comment is None or data.comment.strip() == ""):
         raise HTTPException(status_code=400, detail="At least one of rating or comment must be provided.")
 
-    seller = await users_collection.find_one({"user_id": seller_id})
-    if not seller:
-        raise HTTPException(status_code=404, detail="Seller not found.")
+    # Rating goes in with one atomic update, which also tells us whether the seller exists
+    if data.rating is not None:
+        summary = await record_rating(seller_id, data.rating)
+        if summary is None:
+            raise HTTPException(status_code=404, detail="Seller not found.")
+        await invalidate_principal(user_id=seller_id)
+    else:
+        seller = await users_collection.find_one({"user_id": seller_id}, {"rating_stats": 1, "rating": 1, "rate_number": 1})
+        if not seller:
+            raise HTTPException(status_code=404, detail="Seller not found.")
+        summary = rating_summary(seller)
 
     now = datetime.now(timezone.utc)
     feedback_doc = {
@@ -203,80 +205,94 @@ async def send_feedback(data: FeedbackInput, current_user: dict = Depends(get_cu
 
     await feedback_collection.insert_one(feedback_doc)
 
-    if data.rating is not None:
-        current_rating = seller.get("rating", 0.0)
-        current_rate_number = seller.get("rate_number", 0)
-        new_rate_number = current_rate_number + 1
-        new_rating = (current_rating * current_rate_number + data.rating) / new_rate_number
-        await users_collection.update_one(
-            {"user_id": seller_id},
-            {
-                "$set": {
-                    "rating": new_rating,
-                    "rate_number": new_rate_number
-                }
-            }
-        )
-
     return {
         "message": "Feedback submitted successfully.",
-        "new_rating": round(new_rating, 2) if data.rating is not None else seller.get("rating", 0.0),
-        "rate_number": new_rate_number if data.rating is not None else seller.get("rate_number", 0)
+        "new_rating": summary["rating"],
+        "rate_number": summary["rate_number"]
     }
 
 
+# -------------------------------
+# Show the rating summary of a seller
+# -------------------------------
+@main_router.get("/seller_rating")
+async def get_seller_rating(seller_id: str):
+    seller = await users_collection.find_one({"user_id": seller_id}, {"rating_stats": 1, "rating": 1, "rate_number": 1})
+    if not seller:
+        raise HTTPException(status_code=404, detail="Seller not found.")
+
+    return rating_summary(seller)
+
+
+# -------------------------------
+# Feedback pages (newest first, masked in the query)
+# -------------------------------
+def _feedback_pipeline(receiver_id: str, limit: Optional[int], cursor: Optional[str]) -> list:
+    match = {"receiver_id": receiver_id}
+    if cursor:
+        match = {"$and": [match, keyset_filter(decode_cursor(cursor), "date", -1)]}
+
+    # Onaylanmamış ya da boş yorumlar veritabanında "no comment" olarak döner
+    visible_comment = {"$and": [{"$ne": [{"$ifNull": ["$comment", None]}, None]}, {"$eq": ["$isCommentVerified", True]}]}
+    pipeline = [{"$match": match}, {"$sort": {"date": -1, "_id": -1}}]
+    if limit:
+        pipeline.append({"$limit": limit + 1})
+    pipeline.append({"$project": {
+        "_id": 0,
+        "id": "$_id",
+        "date": 1,
+        "rating": 1,
+        "comment": {"$cond": [visible_comment, "$comment", "no comment"]},
+    }})
+    return pipeline
+
+
+async def _feedback_page(receiver_id: str, limit: Optional[int], cursor: Optional[str]) -> dict:
+    if limit is None and cursor is None:
+        feedbacks = await feedback_collection.aggregate(_feedback_pipeline(receiver_id, None, None)).to_list(length=None)
+        next_cursor = None
+    else:
+        page_size = limit or 20
+        feedbacks = await feedback_collection.aggregate(_feedback_pipeline(receiver_id, page_size, cursor)).to_list(length=page_size + 1)
+        next_cursor = None
+        if len(feedbacks) > page_size:
+            feedbacks = feedbacks[:page_size]
+            next_cursor = encode_cursor({"_id": feedbacks[-1]["id"], "date": feedbacks[-1].get("date")}, "date")
+
+    feedback_list = [
+        {"rating": fb.get("rating"), "comment": fb["comment"], "_id": str(fb["id"]), "date": fb.get("date")}
+        for fb in feedbacks
+    ]
+    return {"feedbacks_received": feedback_list, "next_cursor": next_cursor}
+
+
 # -------------------------------
 # Show feedbacks for current user
 # -------------------------------
 @main_router.get("/my_feedbacks")
-async def get_my_feedbacks(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+async def get_my_feedbacks(
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    feedbacks = feedback_collection.find({"receiver_id": current_user["user_id"]})
-    feedback_list = []
-    async for fb in feedbacks:
-        fb["_id"] = str(fb["_id"])
-        
-        # Handle comment display
-        if fb.get("comment") and not fb.get("isCommentVerified", False):
-            fb["comment"] = "no comment"
-        if fb.get("comment") == None:
-            fb["comment"] = "no comment"
-        feedback_list.append({
-            "rating": fb.get("rating"),
-            "comment": fb.get("comment"),
-            "_id": fb["_id"],
-        })
-
-    return {"feedbacks_received": feedback_list}
+    return await _feedback_page(current_user["user_id"], limit, cursor)
 
 
 # -------------------------------
 # Show feedbacks for a specific seller
 # -------------------------------
 @main_router.get("/seller_feedbacks")
-async def get_seller_feedbacks(seller_id: str): 
-    seller = await users_collection.find_one({"user_id": seller_id})
-
-    feedbacks = feedback_collection.find({"receiver_id": seller["user_id"]})
-    feedback_list = []
-    async for fb in feedbacks:
-        fb["_id"] = str(fb["_id"])
-        
-        # Handle comment display
-        if fb.get("comment") and not fb.get("isCommentVerified", False):
-            fb["comment"] = "no comment"
-        if fb.get("comment") == None:
-            fb["comment"] = "no comment"
-        feedback_list.append({
-            "rating": fb.get("rating"),
-            "comment": fb.get("comment"),
-            "_id": fb["_id"],
-        })
-
-    return {"feedbacks_received": feedback_list}
+async def get_seller_feedbacks(
+    seller_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None)
+):
+    # Bilinmeyen satıcı için boş liste döner; users sorgusuna gerek yok
+    return await _feedback_page(seller_id, limit, cursor)
 
 
 # -------------------------------
@@ -284,11 +300,11 @@ async def get_seller_feedbacks(seller_id: str):
 # -------------------------------
 @main_router.get("/my_offerings")
 async def get_my_offerings(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    offerings_cursor = item_collection.find({"user_id": current_user["user_id"]})
+    offerings_cursor = item_collection.find({"user_id": current_user["user_id"]}, ITEM_PUBLIC_PROJECTION)
     offerings = await offerings_cursor.to_list(length=None)
 
     for offering in offerings:
@@ -302,29 +318,23 @@ async def get_my_offerings(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 @main_router.post("/add_to_offerings")
 async def add_to_offerings(product: Product, current_user: dict = Depends(get_current_user)):
+    user = await load_user(current_user)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
+    product_dict = product.model_dump()
     if isinstance(product_dict.get("image"), HttpUrl):
         product_dict["image"] = str(product_dict["image"])
+    product_dict["user_id"] = current_user["user_id"]
 
-    product_dict = product.model_dump()
-    insert_result = await item_collection.insert_one(product_dict)
-    product_id = insert_result.inserted_id
-
-    new_product = await item_collection.find_one({"item_id": product_id})
-    if not new_product:
-        raise HTTPException(status_code=500, detail="Failed to create product.")
+    product_dict.update(search_fields(product_dict))
+    await item_collection.insert_one(product_dict)
+    await invalidate_items([product_dict["item_id"]], [product_dict.get("title")])
 
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if "offeredProducts" not in user:
-        user["offeredProducts"] = []
- 
-    user["offeredProducts"].append(new_product)
+    # Offerings hold item ids, like POST /home/ (pull_item_references relies on it)
     await users_collection.update_one(
         {"user_id": current_user["user_id"]},
-        {"$set": {"offeredProducts": user["offeredProducts"]}}
+        {"$push": {"offeredProducts": product_dict["item_id"]}}
     )
 
     return {"message": "Product created and added to offerings."}
@@ -335,18 +345,21 @@ async def add_to_offerings(product: Product, current_user: dict = Depends(get_cu
 # -------------------------------
 @main_router.post("/remove_from_offerings")
 async def remove_from_offerings(product_id: str, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    delete_result = await item_collection.delete_one({
-        "user_id": current_user["user_id"],
-        "item_id": product_id
-    })
+    deleted_item = await item_collection.find_one_and_delete(
+        {"user_id": current_user["user_id"], "item_id": product_id},
+        projection={"title": 1}
+    )
 
-    if delete_result.deleted_count == 0:
+    if not deleted_item:
         raise HTTPException(status_code=404, detail="Product not found or not authorized to delete")
 
+    await invalidate_items([product_id], [deleted_item.get("title")])
+    await pull_item_references(product_id)
+
     return {"message": "Product removed from offerings"}
 
 # -------------------------------
@@ -360,15 +373,8 @@ async def get_my_favorites(current_user: dict = Depends(get_current_user)):
     
     favorite_ids = user.get("favorites", [])
 
-    # Fetch all favorite products by their item_id
-    favorite_products = []
-    for item_id in favorite_ids:
-        product = await item_collection.find_one({"item_id": item_id})
-        if product:
-            
-            if "_id" in product and isinstance(product["_id"], ObjectId):
-                product["_id"] = str(product["_id"])
-            favorite_products.append(product)
+    # Fetch all favorite products by their item_id in one query
+    favorite_products = await hydrate_items(favorite_ids)
 
     return {"favorites": favorite_products}
 
@@ -430,7 +436,7 @@ async def remove_from_favorites(product_id: str, current_user: dict = Depends(ge
 # -------------------------------
 @main_router.get("/purchased-products")
 async def get_purchased_products(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -450,18 +456,29 @@ async def get_purchased_products(current_user: dict = Depends(get_current_user))
 # -------------------------------
 # Display all orders for the current user 
 # -------------------------------
-@main_router.get("/user-orders")
-async def get_user_orders(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+USER_ORDER_EXPORT_COLUMNS = ["order_id", "date", "status", "refund_status", "item_ids", "shipping_address", "number_of_items"]
 
-    orders_cursor = order_collection.find({"user_id": user["user_id"]})
-    orders = await orders_cursor.to_list(length=100)
 
+async def _user_order_views(orders: list, user_id: str) -> list:
     if not orders:
         return []
 
+    # Tüm siparişlerdeki ürün durumlarını ve iade taleplerini tek seferde getir
+    all_item_ids = list({item_id for order in orders for item_id in order.get("item_ids", [])})
+    items = await item_collection.find(
+        {"item_id": {"$in": all_item_ids}},
+        {"_id": 0, "item_id": 1, "isSold": 1}
+    ).to_list(length=None)
+    item_statuses = {item["item_id"]: item.get("isSold", "processing") for item in items}
+
+    refunds = await refund_collection.find(
+        {"user_id": user_id, "order_id": {"$in": [order.get("order_id") for order in orders]}},
+        {"_id": 0, "order_id": 1, "status": 1}
+    ).to_list(length=None)
+    refund_statuses = {}
+    for refund in refunds:
+        refund_statuses.setdefault(refund["order_id"], refund.get("status", "pending"))
+
     result = []
     for order in orders:
         order_id = order.get("order_id")
@@ -469,11 +486,7 @@ async def get_user_orders(current_user: dict = Depends(get_current_user)):
         item_ids = order.get("item_ids", [])
         
         # Her siparişin durumunu belirlemek için siparişte bulunan ürünlerin durumlarını kontrol et
-        items_status = []
-        for item_id in item_ids:
-            item = await item_collection.find_one({"item_id": item_id})
-            if item:
-                items_status.append(item.get("isSold", "processing"))
+        items_status = [item_statuses[item_id] for item_id in item_ids if item_id in item_statuses]
         
         # Sipariş durumunu belirle (en düşük durum öncelikli)
         status = "delivered"  # Varsayılan olarak teslim edildi kabul et
@@ -482,11 +495,7 @@ async def get_user_orders(current_user: dict = Depends(get_current_user)):
         elif "inTransit" in items_status:
             status = "inTransit"  # Eğer herhangi bir ürün kargoda ise ve işlemde olan yoksa, sipariş kargoda
 
-        refund_request = await refund_collection.find_one({"user_id": current_user["user_id"], "order_id": order_id})
-        if refund_request:
-            refund_status = refund_request.get("status", "pending")
-        else:
-            refund_status = "notSent"
+        refund_status = refund_statuses.get(order_id, "notSent")
 
         result.append({
             "order_id": order_id,
@@ -496,12 +505,49 @@ async def get_user_orders(current_user: dict = Depends(get_current_user)):
             "item_ids": item_ids,
             "shipping_address": order.get("shipping_address", "No address provided"),  # Kargo adresi eklendi
             "number_of_items": len(item_ids),  # Siparişteki ürün sayısı eklendi
-            "user_id": current_user["user_id"]  # Kullanıcı ID'si eklendi
+            "user_id": user_id  # Kullanıcı ID'si eklendi
         })
 
     return result
 
 
+async def _user_order_export_docs(user_id: str):
+    # Tüm geçmiş, her seferinde bir batch bellekte olacak şekilde akıtılır
+    batch = []
+    async for order in order_collection.find({"user_id": user_id}).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE):
+        batch.append(order)
+        if len(batch) == EXPORT_BATCH_SIZE:
+            for view in await _user_order_views(batch, user_id):
+                yield view
+            batch = []
+    for view in await _user_order_views(batch, user_id):
+        yield view
+
+
+@main_router.get("/user-orders")
+async def get_user_orders(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    export_format: Optional[str] = Query(None, alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    current_user: dict = Depends(get_current_user)
+):
+    user = await load_user(current_user)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Tüm sipariş geçmişi sadece export ile (ndjson/csv) alınır
+    if export_format:
+        return stream_export(_user_order_export_docs(user["user_id"]), export_format, USER_ORDER_EXPORT_COLUMNS, "my_orders")
+
+    # Sonraki sayfanın cursor'ı X-Next-Cursor header'ında döner
+    orders, next_cursor = await fetch_page(order_collection, {"user_id": user["user_id"]}, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return await _user_order_views(orders, current_user["user_id"])
+
+
 # -------------------------------
 # Cancel an order if the status is 'processing'
 # -------------------------------
@@ -513,16 +559,21 @@ async def cancel_order(order_id: str, current_user: dict = Depends(get_current_u
 
     item_ids = order.get("item_ids", [])
     
-    # Check if all items are still in 'processing'
-    for item_id in item_ids:
-        product = await item_collection.find_one({"item_id": item_id})
-        if not product or product.get("isSold") != "processing":
-            raise HTTPException(status_code=400, detail="Order cannot be canceled. One or more items are already processed.")
-    
-    await order_collection.delete_one({"order_id": order_id})
+    # Check if all items are still in 'processing' (tek sorgu)
+    processing_count = await item_collection.count_documents({"item_id": {"$in": item_ids}, "isSold": "processing"})
+    if processing_count != len(set(item_ids)):
+        raise HTTPException(status_code=400, detail="Order cannot be canceled. One or more items are already processed.")
+
+    async def restock(session):
+        await order_collection.delete_one({"order_id": order_id}, session=session)
+        await item_collection.update_many(
+            {"item_id": {"$in": item_ids}},
+            {"$set": {"isSold": "stillInStock", "inStock": True}},
+            session=session
+        )
 
-    for item_id in item_ids:
-        await item_collection.update_one({"item_id": item_id}, {"$set": {"isSold": "stillInStock", "inStock": True}})
+    await run_in_transaction(restock)
+    await invalidate_items(item_ids)
 
     return {"message": f"Order {order_id} has been successfully canceled."}
 
@@ -532,7 +583,7 @@ async def cancel_order(order_id: str, current_user: dict = Depends(get_current_u
 # -------------------------------
 @main_router.get("/my-refunded-items")
 async def get_my_refunded_items(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -603,7 +654,7 @@ async def submit_refund_request(order_id: str, body: RefundRequestBody, current_
 # -------------------------------
 @main_router.patch("/change-stock-status")
 async def change_stock_status(item_id: str, in_stock: bool, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -621,15 +672,11 @@ async def change_stock_status(item_id: str, in_stock: bool, current_user: dict =
             {"$set": {"inStock": False, "isSold": "outOfStock"}}
         )
 
-        # Remove item from each user's basket individually if the basket exists
-        async for user_doc in users_collection.find({"basket": {"$exists": True}}):
-            if item_id in user_doc.get("basket", []):
-                await users_collection.update_one(
-                    {"user_id": user_doc["user_id"]},
-                    {"$pull": {"basket": item_id}}
-                )
+        # Only the users whose basket holds the item are touched (basket index)
+        users_updated = await pull_item_references(item_id, ("basket",))
+        await invalidate_items([item_id])
 
-        return {"message": "Item marked as out of stock and removed from baskets"}
+        return {"message": "Item marked as out of stock and removed from baskets", "users_updated": users_updated}
 
     # Case 2: If turning from outOfStock to stillInStock (restocking)
     # Create a new item with same details but different item_id and manager as the seller
@@ -646,6 +693,7 @@ async def change_stock_status(item_id: str, in_stock: bool, current_user: dict =
         {"user_id": current_user["user_id"]},
         {"$push": {"offeredProducts": new_item["item_id"]}}
     )
+    await invalidate_items([new_item["item_id"]])
 
     return {"message": "Item duplicated and restocked", "new_item_id": new_item["item_id"]}
 
@@ -655,7 +703,7 @@ async def change_stock_status(item_id: str, in_stock: bool, current_user: dict =
 # -------------------------------
 @main_router.get("/unapproved_comments")
 async def get_unapproved_comments(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -676,7 +724,7 @@ async def get_unapproved_comments(current_user: dict = Depends(get_current_user)
 # -------------------------------
 @main_router.put("/mark_status/{item_id}")
 async def update_product_status(item_id: str, status: str, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -704,6 +752,7 @@ async def update_product_status(item_id: str, status: str, current_user: dict =
             {"item_id": item_id},
             {"$set": {"isSold": status, "inStock": True}}
         )
+    await invalidate_items([item_id])
 
     return {"message": f"Product status updated to '{status}' successfully."}
 
@@ -713,7 +762,7 @@ async def update_product_status(item_id: str, status: str, current_user: dict =
 # -------------------------------
 @main_router.post("/approve_comment/{feedback_id}")
 async def approve_comment(feedback_id: str, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -741,7 +790,7 @@ async def approve_comment(feedback_id: str, current_user: dict = Depends(get_cur
 # -------------------------------
 @main_router.delete("/remove_comment/{feedback_id}")
 async def remove_comment(feedback_id: str, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -767,48 +816,124 @@ async def remove_comment(feedback_id: str, current_user: dict = Depends(get_curr
 # -------------------------------
 # Display all orders - PRODUCT MANAGER
 # -------------------------------
+def _first_image(image):
+    # Görseller liste ya da tek bir URL olarak saklanmış olabilir
+    if isinstance(image, list):
+        return image[0] if image else None
+    return image
+
+
+def _manager_order_view(order: dict) -> dict:
+    # $lookup sonuçları item_ids sırasında gelmez; sırayı siparişe göre kur
+    items_by_id = {item["item_id"]: item for item in order.get("items", [])}
+    return {
+        "order_id": order.get("order_id"),
+        "user_id": order.get("user_id"),
+        "date": order.get("date"),
+        "shipping_address": order.get("shipping_address", "No address provided"),
+        "items": [
+            {
+                "item_id": item.get("item_id"),
+                "title": item.get("title"),
+                "image": _first_image(item.get("image")),  # İlk resmi al veya None
+                "price": item.get("price"),
+                "category": item.get("category"),
+                "status": item.get("isSold", "processing"),
+                "inStock": item.get("inStock", False)
+            }
+            for item in (items_by_id[item_id] for item_id in order.get("item_ids", []) if item_id in items_by_id)
+        ]
+    }
+
+
+def _all_orders_pipeline(match: dict, status: Optional[str], limit: Optional[int]) -> list:
+    lookup = [
+        {"$lookup": {"from": item_collection.name, "localField": "item_ids", "foreignField": "item_id", "as": "items"}},
+        {"$project": {
+            "_id": 1, "order_id": 1, "user_id": 1, "date": 1, "shipping_address": 1, "item_ids": 1,
+            "items.item_id": 1, "items.title": 1, "items.image": 1, "items.price": 1,
+            "items.category": 1, "items.isSold": 1, "items.inStock": 1
+        }},
+    ]
+    pipeline = [{"$match": match}, {"$sort": {"_id": 1}}]
+    if status:
+        # Ürün durumu filtresi join'den sonra uygulanmalı; limit ondan sonra gelir
+        pipeline += lookup + [{"$match": {"items.isSold": status}}]
+        if limit:
+            pipeline.append({"$limit": limit})
+        return pipeline
+    if limit:
+        pipeline.append({"$limit": limit})
+    return pipeline + lookup
+
+
+ORDER_EXPORT_COLUMNS = ["order_id", "user_id", "date", "shipping_address", "item_ids", "total_price", "number_of_items"]
+
+
+def _order_export_docs(match: dict, status: Optional[str], columns: list):
+    # Düz sipariş satırları; ürün durumu filtresi varsa join sadece eşleşme için yapılır
+    if not status:
+        return order_collection.find(match, export_projection(columns)).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"_id": 1}},
+        {"$lookup": {"from": item_collection.name, "localField": "item_ids", "foreignField": "item_id", "as": "items"}},
+        {"$match": {"items.isSold": status}},
+        {"$project": export_projection(columns)},
+    ]
+    return order_collection.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE)
+
+
 @main_router.get("/all-orders")
-async def get_all_orders(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+async def get_all_orders(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    user_id: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    export_format: Optional[str] = Query(None, alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    columns: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Sadece product manager'lar tüm siparişleri görebilir
     if not user.get("isManager", False):
         raise HTTPException(status_code=403, detail="Only product managers can view all orders")
-    
-    # Tüm siparişleri getir
-    orders_cursor = order_collection.find({})
-    orders = await orders_cursor.to_list(length=1000)
-    
-    result = []
-    for order in orders:
-        # Siparişin temel bilgilerini al
-        order_data = {
-            "order_id": order.get("order_id"),
-            "user_id": order.get("user_id"),
-            "date": order.get("date"),
-            "shipping_address": order.get("shipping_address", "No address provided"),
-            "items": []
-        }
-        
-        # Her siparişteki ürünleri getir
-        for item_id in order.get("item_ids", []):
-            item = await item_collection.find_one({"item_id": item_id})
-            if item:
-                order_data["items"].append({
-                    "item_id": item.get("item_id"),
-                    "title": item.get("title"),
-                    "image": item.get("image", [None])[0],  # İlk resmi al veya None
-                    "price": item.get("price"),
-                    "category": item.get("category"),
-                    "status": item.get("isSold", "processing"),
-                    "inStock": item.get("inStock", False)
-                })
-        
-        result.append(order_data)
-    
-    return result
+
+    match = {}
+    if user_id:
+        match["user_id"] = user_id
+    try:
+        if start_date:
+            match.setdefault("date", {})["$gte"] = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        if end_date:
+            match.setdefault("date", {})["$lte"] = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if cursor:
+        match = {"$and": [match, keyset_filter(decode_cursor(cursor))]}
+
+    if export_format:
+        selected = select_columns(columns, ORDER_EXPORT_COLUMNS)
+        return stream_export(_order_export_docs(match, status, selected), export_format, selected, "orders")
+
+    # Sayfa istenmezse tüm sipariş geçmişi cursor'dan doğrudan akıtılır (bellek sabit kalır)
+    if limit is None and cursor is None:
+        orders_cursor = order_collection.aggregate(_all_orders_pipeline(match, status, None))
+        return stream_json_array(orders_cursor, _manager_order_view)
+
+    page_size = limit or 100
+    orders = await order_collection.aggregate(_all_orders_pipeline(match, status, page_size + 1)).to_list(length=page_size + 1)
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        response.headers["X-Next-Cursor"] = encode_cursor(orders[-1])
+
+    return [_manager_order_view(order) for order in orders]
 
 
 # ---------------------------------------------------------------------------------------------
@@ -819,84 +944,74 @@ async def get_all_orders(current_user: dict = Depends(get_current_user)):
 # -------------------------------
 # Display refund requests - SALES MANAGEEERRRRR
 # -------------------------------
+def _refund_queue_pipeline(match: dict, limit: int) -> list:
+    return [
+        {"$match": match},
+        {"$sort": {"_id": 1}},
+        {"$limit": limit + 1},
+        {"$lookup": {"from": item_collection.name, "localField": "item_ids", "foreignField": "item_id", "as": "items"}},
+        {"$project": {
+            "_id": 1, "order_id": 1, "user_id": 1, "refund_amount": 1, "status": 1, "item_ids": 1,
+            "items.item_id": 1, "items.title": 1, "items.category": 1, "items.image": 1, "items.price": 1
+        }},
+    ]
+
+
+def _refund_view(request: dict) -> dict:
+    # $lookup sırası item_ids sırası değildir
+    items_by_id = {item["item_id"]: item for item in request.get("items", [])}
+    return {
+        "refund_id": str(request.get("_id")),
+        "order_id": request.get("order_id"),
+        "user_id": request.get("user_id"),
+        "refund_amount": request.get("refund_amount"),
+        "status": request.get("status"),
+        "items": [items_by_id[item_id] for item_id in request.get("item_ids", []) if item_id in items_by_id]
+    }
+
+
 @main_router.get("/refund-requests")
-async def view_refund_requests(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+async def view_refund_requests(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    status: str = Query("pending"),
+    current_user: dict = Depends(get_current_user)
+):
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     if not user.get("isSalesManager", False):
         raise HTTPException(status_code=403, detail="Only sales managers can view refund requests.")
-    
-    requests = await refund_collection.find({"status": "pending"}).to_list(length=100)
-    
-    result = []
-    for request in requests:
-        item_details = []
-        for item_id in request.get("item_ids", []):
-            item = await item_collection.find_one({"item_id": item_id})
-            if item:
-                item_details.append({
-                    "item_id": item.get("item_id"),
-                    "title": item.get("title"),
-                    "category": item.get("category"),
-                    "image": item.get("image"),
-                    "price": item.get("price")
-                })
-        
-        result.append({
-            "refund_id": str(request.get("_id")),
-            "order_id": request.get("order_id"),
-            "user_id": request.get("user_id"),
-            "refund_amount": request.get("refund_amount"),
-            "status": request.get("status"),
-            "items": item_details
-        })
-    
-    return result
+
+    # {status, _id} indeksi üzerinden sayfa sayfa; ürünler tek bir $lookup ile gelir
+    match = {"status": status}
+    if cursor:
+        match = {"$and": [match, keyset_filter(decode_cursor(cursor))]}
+
+    requests = await refund_collection.aggregate(_refund_queue_pipeline(match, limit)).to_list(length=limit + 1)
+    if len(requests) > limit:
+        requests = requests[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(requests[-1])
+
+    return [_refund_view(request) for request in requests]
 
 
 # -------------------------------
 # Approve/reject refund requests - SALES MANAGEEERRRRR
 # -------------------------------
-@main_router.post("/handle-refund-request/{order_id}")
-async def handle_refund(order_id: str, action: str = Query(...), current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if not user.get("isSalesManager", False):
-        raise HTTPException(status_code=403, detail="Only sales managers can handle refunds.")
-
-    request = await refund_collection.find_one({"order_id": order_id})
-    if not request:
-        raise HTTPException(status_code=404, detail="Refund request not found")
-
-    if request["status"] != "pending":
-        raise HTTPException(status_code=400, detail="Refund request already processed")
+REFUND_ACTIONS = {"approve": "approved", "reject": "rejected"}
 
-    user = await users_collection.find_one({"user_id": request["user_id"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
+def _refund_email(action: str, user: dict, request: dict):
     item_list = ', '.join(request['item_ids'])
-
     if action == "approve":
-        for item_id in request["item_ids"]:
-            await item_collection.update_one(
-                {"item_id": item_id},
-                {"$set": {"inStock": True, "isSold": "stillInStock"}}
-            )
-        await refund_collection.update_one(
-            {"order_id": order_id},
-            {"$set": {"status": "approved"}}
-        )
-
         subject = "✅ Your refund request has been approved"
         body = (
             f"Dear {user['name']},\n\n"
             f"We're happy to let you know that your refund request has been **approved**.\n\n"
-            f"📦 **Order ID:** {order_id}\n"
+            f"📦 **Order ID:** {request['order_id']}\n"
             f"💸 **Refunded Amount:** {request['refund_amount']} TL\n"
             f"🛍️ **Items Refunded:** {item_list}\n\n"
             "The items will now be marked as available for other users to purchase.\n\n"
@@ -904,34 +1019,119 @@ async def handle_refund(order_id: str, action: str = Query(...), current_user: d
             "Best regards,\n"
             "suSold Support Team"
         )
-        await send_email_notification(user["email"], subject, body)
-
-        return {"message": "Refund approved and user notified."}
-
-    elif action == "reject":
-        await refund_collection.update_one(
-            {"order_id": order_id},
-            {"$set": {"status": "rejected"}}
-        )
-
+    else:
         subject = "❌ Your refund request has been rejected"
         body = (
             f"Dear {user['name']},\n\n"
             f"Unfortunately, your refund request has been **rejected**.\n\n"
-            f"📦 **Order ID:** {order_id}\n"
+            f"📦 **Order ID:** {request['order_id']}\n"
             f"🛍️ **Items Requested:** {item_list}\n\n"
             "If you have any questions or need assistance, please contact our support team.\n\n"
             "Thank you for understanding.\n"
             "Best regards,\n"
             "suSold Support Team"
         )
-        await send_email_notification(user["email"], subject, body)
+    return subject, body
 
-        return {"message": "Refund rejected and user notified."}
+
+async def _apply_refund_decisions(requests: list, action: str):
+    """Write the decision for ``requests``: one restock update_many, one status update_many."""
+    item_ids = list({item_id for request in requests for item_id in request.get("item_ids", [])})
+    order_ids = [request["order_id"] for request in requests]
+
+    async def decide(session):
+        if action == "approve" and item_ids:
+            await item_collection.update_many(
+                {"item_id": {"$in": item_ids}},
+                {"$set": {"inStock": True, "isSold": "stillInStock"}},
+                session=session
+            )
+        await refund_collection.update_many(
+            {"status": "pending", "order_id": {"$in": order_ids}},
+            {"$set": {"status": REFUND_ACTIONS[action]}},
+            session=session
+        )
+
+    await run_in_transaction(decide)
+    if action == "approve":
+        await invalidate_items(item_ids)
+
+
+@main_router.post("/handle-refund-request/{order_id}")
+async def handle_refund(order_id: str, action: str = Query(...), current_user: dict = Depends(get_current_user)):
+    user = await load_user(current_user)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    else:
+    if not user.get("isSalesManager", False):
+        raise HTTPException(status_code=403, detail="Only sales managers can handle refunds.")
+
+    request = await refund_collection.find_one({"order_id": order_id})
+    if not request:
+        raise HTTPException(status_code=404, detail="Refund request not found")
+
+    if request["status"] != "pending":
+        raise HTTPException(status_code=400, detail="Refund request already processed")
+
+    if action not in REFUND_ACTIONS:
+        raise HTTPException(status_code=400, detail="Action must be 'approve' or 'reject'.")
+
+    user = await users_collection.find_one({"user_id": request["user_id"]})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Restock (on approve) and the status change commit together
+    await _apply_refund_decisions([request], action)
+
+    subject, body = _refund_email(action, user, request)
+    await send_email_notification(user["email"], subject, body)
+
+    if action == "approve":
+        return {"message": "Refund approved and user notified."}
+    return {"message": "Refund rejected and user notified."}
+
+
+# -------------------------------
+# Approve/reject many refund requests at once - SALES MANAGEEERRRRR
+# -------------------------------
+@main_router.post("/handle-refund-requests")
+async def handle_refunds_bulk(data: RefundBatchBody, current_user: dict = Depends(get_current_user)):
+    user = await load_user(current_user)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if not user.get("isSalesManager", False):
+        raise HTTPException(status_code=403, detail="Only sales managers can handle refunds.")
+
+    if data.action not in REFUND_ACTIONS:
         raise HTTPException(status_code=400, detail="Action must be 'approve' or 'reject'.")
 
+    # {status, order_id} indeksi: sadece bekleyen talepler okunur
+    requests = await refund_collection.find(
+        {"status": "pending", "order_id": {"$in": data.order_ids}}
+    ).to_list(length=None)
+
+    found = {request["order_id"] for request in requests}
+    skipped = [order_id for order_id in data.order_ids if order_id not in found]
+    if not requests:
+        return {"processed": 0, "skipped": skipped}
+
+    await _apply_refund_decisions(requests, data.action)
+
+    user_ids = list({request["user_id"] for request in requests})
+    users_by_id = {
+        doc["user_id"]: doc
+        async for doc in users_collection.find({"user_id": {"$in": user_ids}}, {"user_id": 1, "name": 1, "email": 1})
+    }
+    messages = []
+    for request in requests:
+        customer = users_by_id.get(request["user_id"])
+        if customer:
+            subject, body = _refund_email(data.action, customer, request)
+            messages.append((customer["email"], subject, body))
+    await enqueue_messages(messages)
+
+    return {"processed": len(requests), "skipped": skipped}
 
 
 # -------------------------------
@@ -939,7 +1139,7 @@ async def handle_refund(order_id: str, action: str = Query(...), current_user: d
 # -------------------------------
 @main_router.post("/set-price/{item_id}")
 async def set_product_price(item_id: str, price: float, current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -954,6 +1154,7 @@ async def set_product_price(item_id: str, price: float, current_user: dict = Dep
         raise HTTPException(status_code=400, detail="Product already has a price.")
 
     await item_collection.update_one({"item_id": item_id},{"$set": {"price": price}})
+    await invalidate_items([item_id])
     
     return {"message": f"Price for product {item_id} set to {price} successfully."}
 
@@ -961,9 +1162,23 @@ async def set_product_price(item_id: str, price: float, current_user: dict = Dep
 # -------------------------------
 # Get items without a price - SALES MANAGEEERRRRR
 # -------------------------------
+ITEM_EXPORT_COLUMNS = ["item_id", "title", "description", "category", "condition", "image", "inStock"]
+
+
+def _unpriced_item_row(item: dict) -> dict:
+    if "image" in item:
+        item["image"] = _first_image(item["image"])  # İlk resmi al veya None
+    return item
+
+
 @main_router.get("/items-without-price")
-async def get_items_without_price(current_user: dict = Depends(get_current_user)):
-    user = await users_collection.find_one({"user_id": current_user["user_id"]})
+async def get_items_without_price(
+    category: Optional[str] = Query(None),
+    export_format: Optional[str] = Query(None, alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    columns: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    user = await load_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -973,6 +1188,14 @@ async def get_items_without_price(current_user: dict = Depends(get_current_user)
     
     # Fiyatı olmayan veya fiyatı 0 olan ürünleri bul
     query = {"$or": [{"price": {"$exists": False}}, {"price": None}, {"price": 0}]}
+    if category:
+        query["category"] = category
+
+    if export_format:
+        selected = select_columns(columns, ITEM_EXPORT_COLUMNS)
+        docs = item_collection.find(query, export_projection(selected)).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+        return stream_export(docs, export_format, selected, "items_without_price", _unpriced_item_row)
+
     items_cursor = item_collection.find(query)
     items = await items_cursor.to_list(length=1000)
     
@@ -135,4 +135,8 @@ class RefundRequest(BaseModel):
     status: str = "pending"  # "pending", "approved", "rejected"
 
 class RefundRequestBody(BaseModel):
-    item_ids: List[str]
\ No newline at end of file
+    item_ids: List[str]
+
+class RefundBatchBody(BaseModel):
+    order_ids: List[str] = Field(..., min_length=1, max_length=500)
+    action: str  # "approve" or "reject"
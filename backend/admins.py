@@ -0,0 +1,48 @@
+"""Grant or revoke the admin role.
+
+Admins (``isAdmin: true`` on the user document) can use the database
+inspector (``/api/debug-all``) and read ``/metrics`` with their login token.
+No API route sets the flag; an operator runs::
+
+    python -m backend.admins --grant someone@sabanciuniv.edu
+    python -m backend.admins --revoke someone@sabanciuniv.edu
+    python -m backend.admins --list
+"""
+import argparse
+import asyncio
+from backend.database import users_collection
+from backend.registerloginbackend.jwt_handler import invalidate_principal
+
+
+async def set_admin(email: str, is_admin: bool) -> bool:
+    """Returns False when no user has this email."""
+    result = await users_collection.update_one({"email": email}, {"$set": {"isAdmin": is_admin}})
+    if result.matched_count == 0:
+        return False
+    await invalidate_principal(email=email)
+    return True
+
+
+async def list_admins() -> list:
+    return [user["email"] for user in await users_collection.find({"isAdmin": True}, {"email": 1}).to_list(length=None)]
+
+
+async def _main(args):
+    if args.list:
+        for email in await list_admins():
+            print(email)
+        return
+
+    email = args.grant or args.revoke
+    if not await set_admin(email, bool(args.grant)):
+        raise SystemExit(f"No user with email {email}")
+    print(("Granted" if args.grant else "Revoked"), "admin role:", email)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage SuSOLD admins")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--grant", metavar="EMAIL")
+    group.add_argument("--revoke", metavar="EMAIL")
+    group.add_argument("--list", action="store_true")
+    asyncio.run(_main(parser.parse_args()))
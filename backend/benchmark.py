@@ -0,0 +1,317 @@
+"""Load test and benchmark harness for the API.
+
+Seeds a scratch database, then drives the app through user flows and reports
+latency percentiles, requests per second and MongoDB commands per request::
+
+    python -m backend.benchmark --items 20000 --users 5000 --orders 10000
+    python -m backend.benchmark --save backend/benchmarks/baseline.json
+    python -m backend.benchmark --no-seed --baseline backend/benchmarks/baseline.json
+
+The database is ``SUSOLD_DB_NAME`` (default ``susold_bench``) on ``MONGO_URL``;
+seeding drops its collections. By default the app runs in-process (``httpx`` + ASGI transport). With
+``--url`` the requests go to a running server instead, which must use the same
+``MONGO_URL`` and ``SUSOLD_DB_NAME`` as the harness. DB commands per request
+are read from the ``Server-Timing`` header (see ``backend/metrics.py``).
+
+The ``checkout`` scenario completes real orders, and every order queues an
+invoice email to a seeded ``bench.userN`` address. In-process runs use the
+``memory`` mail transport, whatever ``SUSOLD_MAIL_TRANSPORT`` says. With ``--url`` the harness cannot see the server's
+transport, so it refuses to run ``checkout`` unless ``SUSOLD_MAIL_TRANSPORT=memory``
+is set for the harness too, as a statement that the server was started with
+it; otherwise leave ``checkout`` out with ``--scenarios``.
+
+``--baseline`` exits with status 1 when a step's p95 grows by more than
+``--tolerance`` or its DB commands per request grow at all, so an N+1
+regression fails even when the machine is fast.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+SCENARIOS = ("browse", "search", "basket", "checkout", "manager")
+DEFAULT_TOLERANCE = 0.25
+# Allowed drift in mean DB commands per request before it counts as a regression
+DB_OPS_SLACK = 0.05
+
+_DB_CALLS = re.compile(r'db;[^,]*desc="(\d+) calls"')
+
+
+# ------------------------- Statistics -------------------------
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def db_calls(response) -> int:
+    match = _DB_CALLS.search(response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies = []
+        self.db_ops = []
+        self.errors = 0
+
+    def add(self, seconds: float, response):
+        self.latencies.append(seconds)
+        self.db_ops.append(db_calls(response))
+        if response.status_code >= 400:
+            self.errors += 1
+
+    def summary(self, wall_seconds: float) -> dict:
+        count = len(self.latencies)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+            "rps": round(count / wall_seconds, 1) if wall_seconds else 0.0,
+            "db_ops": round(sum(self.db_ops) / count, 2) if count else 0.0,
+        }
+
+
+# ------------------------- Scenarios -------------------------
+class Session:
+    """One virtual user: an HTTP client, a token and the per-step stats."""
+
+    def __init__(self, client, token: str, rng: random.Random, dataset: dict, stats: dict):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.rng = rng
+        self.dataset = dataset
+        self.stats = stats
+
+    async def call(self, step: str, method: str, url: str, auth: bool = True, **kwargs):
+        started = time.perf_counter()
+        response = await self.client.request(method, url, headers=self.headers if auth else None, **kwargs)
+        self.stats.setdefault(step, StepStats()).add(time.perf_counter() - started, response)
+        return response
+
+    def random_item(self) -> str:
+        return self.dataset["item_ids"][self.rng.randrange(len(self.dataset["item_ids"]))]
+
+
+async def browse(s: Session):
+    category = s.rng.choice(s.dataset["categories"])
+    await s.call("home", "GET", "/api/home/", auth=False, params={"limit": 20, "sort_by": "popularity"})
+    await s.call("home_category", "GET", "/api/home/", auth=False, params={"category": category, "limit": 20, "facets": "true"})
+    await s.call("item", "GET", f"/api/home/item/{s.random_item()}", auth=False)
+    await s.call("categories", "GET", "/api/categories", auth=False)
+
+
+async def search(s: Session):
+    word = s.rng.choice(s.dataset["search_words"])
+    await s.call("suggest", "GET", "/api/home/suggest", auth=False, params={"q": word[:3]})
+    await s.call("search", "GET", "/api/home/", auth=False, params={"q": word, "limit": 20})
+
+
+async def basket(s: Session):
+    item = s.random_item()
+    await s.call("basket_add", "POST", f"/api/basket/{item}")
+    await s.call("basket_get", "GET", "/api/basket")
+    await s.call("basket_remove", "DELETE", f"/api/basket/{item}")
+
+
+async def checkout(s: Session):
+    await s.call("basket_add", "POST", f"/api/basket/{s.random_item()}")
+    await s.call("complete_order", "POST", "/api/complete-order",
+                 json={"selected_address": "A Block, Room 101", "selected_credit_card": "**** 4242"})
+
+
+async def manager(s: Session):
+    await s.call("all_orders", "GET", "/api/all-orders", params={"limit": 50})
+    await s.call("refund_queue", "GET", "/api/refund-requests", params={"limit": 50})
+    await s.call("sales_summary", "GET", "/api/home/sales-summary",
+                 params={"start_date": "2024-09-01", "end_date": "2025-09-01", "by_category": "true"})
+    await s.call("invoices", "GET", "/api/home/invoices", params={"start_date": "2024-09-01", "end_date": "2024-10-01"})
+
+
+SCENARIO_FLOWS = {
+    "browse": browse,
+    "search": search,
+    "basket": basket,
+    "checkout": checkout,
+    "manager": manager,
+}
+
+
+async def run_scenario(name: str, client, tokens: list, dataset: dict, iterations: int, concurrency: int, seed: int) -> dict:
+    """Run ``iterations`` flows with ``concurrency`` virtual users; returns step summaries."""
+    stats = {}
+    remaining = iter(range(iterations))
+
+    async def worker(n: int):
+        session = Session(client, tokens[n % len(tokens)], random.Random(seed * 1000 + n), dataset, stats)
+        for _ in remaining:
+            await SCENARIO_FLOWS[name](session)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    steps = {f"{name}.{step}": step_stats.summary(wall) for step, step_stats in stats.items()}
+    total = StepStats()
+    for step_stats in stats.values():
+        total.latencies += step_stats.latencies
+        total.db_ops += step_stats.db_ops
+        total.errors += step_stats.errors
+    steps[name] = total.summary(wall)
+    return steps
+
+
+# ------------------------- Baseline -------------------------
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Human-readable regressions of ``results`` against ``baseline`` (empty when none)."""
+    regressions = []
+    for step, current in results["steps"].items():
+        previous = baseline.get("steps", {}).get(step)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{step}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["db_ops"] > previous["db_ops"] + DB_OPS_SLACK:
+            regressions.append(f"{step}: db ops/request {previous['db_ops']} -> {current['db_ops']}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{step}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def format_table(steps: dict) -> str:
+    header = f"{'step':<32}{'count':>8}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'db ops':>8}"
+    lines = [header, "-" * len(header)]
+    for step, row in steps.items():
+        lines.append(
+            f"{step:<32}{row['count']:>8}{row['errors']:>6}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+            f"{row['p99_ms']:>10}{row['rps']:>9}{row['db_ops']:>8}"
+        )
+    return "\n".join(lines)
+
+
+# ------------------------- Runner -------------------------
+async def load_dataset(users: int) -> dict:
+    from backend.database import item_collection, category_collection
+    from backend.seed import CATEGORIES, BRANDS
+
+    item_ids = await item_collection.distinct("item_id", {"inStock": True})
+    categories = [doc["name"] for doc in await category_collection.find({}, {"name": 1}).to_list(length=None)]
+    words = [word.lower() for names in CATEGORIES.values() for word in names] + [brand.lower() for brand in BRANDS]
+    return {"item_ids": item_ids, "categories": categories or list(CATEGORIES), "search_words": words, "users": users}
+
+
+async def run(args) -> dict:
+    import httpx
+    from backend.database import MONGO_DB_NAME
+    from backend.indexes import apply_indexes
+    from backend.registerloginbackend.jwt_handler import create_access_token, get_password_hash
+    from backend.seed import seed_dataset, user_email
+
+    if not args.no_seed:
+        await seed_dataset(args.users, args.items, args.orders, seed=args.seed,
+                           password_hash=get_password_hash("Bench1234"))
+    await apply_indexes()
+
+    dataset = await load_dataset(args.users)
+    if not dataset["item_ids"]:
+        raise SystemExit("No in-stock items in the benchmark database; run without --no-seed")
+
+    # user 0 is the (sales) manager; shoppers are spread over the rest
+    shoppers = [create_access_token({"sub": user_email(n)}) for n in range(1, min(args.users, args.concurrency + 1))]
+    managers = [create_access_token({"sub": user_email(0)})]
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from backend.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    steps = {}
+    async with client:
+        for name in args.scenarios:
+            tokens = managers if name == "manager" else shoppers or managers
+            steps.update(await run_scenario(name, client, tokens, dataset, args.iterations, args.concurrency, args.seed))
+
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": MONGO_DB_NAME,
+            "target": args.url or "in-process",
+            "users": args.users, "items": args.items, "orders": args.orders,
+            "iterations": args.iterations, "concurrency": args.concurrency,
+            "python": platform.python_version(), "machine": platform.machine(),
+        },
+        "steps": steps,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SuSOLD API against a seeded scratch database")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=10000, help="at most 90000 (itemNNNNN ids)")
+    parser.add_argument("--orders", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in the database")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=200, help="flows per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users per scenario")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--save", help="write the results as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="compare against a saved JSON result")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed p95 growth (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+def check_mail_transport(args):
+    """Refuse to run checkout unless its invoice emails stay in memory."""
+    if "checkout" in args.scenarios and os.getenv("SUSOLD_MAIL_TRANSPORT") != "memory":
+        raise SystemExit(
+            "checkout sends an invoice email per order: start the server with SUSOLD_MAIL_TRANSPORT=memory "
+            "and set it here too, or pass --scenarios without checkout"
+        )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Never benchmark against the development database by accident
+    os.environ.setdefault("SUSOLD_DB_NAME", "susold_bench")
+    os.environ.setdefault("SUSOLD_APPLY_INDEXES", "0")
+    if not args.url:
+        # The in-process app never sends real mail, even if the shell exports smtp
+        os.environ["SUSOLD_MAIL_TRANSPORT"] = "memory"
+    check_mail_transport(args)
+
+    results = asyncio.run(run(args))
+    print(format_table(results["steps"]))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Saved results to", args.save)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against", args.baseline)
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,32 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+from backend.metrics import command_listener
 
 MONGO_URI = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["cs308"]
+# Benchmarks and the seeder point this at a scratch database
+MONGO_DB_NAME = os.getenv("SUSOLD_DB_NAME", "cs308")
+
+# Connection pool settings (unset -> driver default). Each API worker process
+# has its own pool, so the server sees up to workers * maxPoolSize connections.
+POOL_OPTIONS = {
+    "SUSOLD_MONGO_MAX_POOL_SIZE": "maxPoolSize",
+    "SUSOLD_MONGO_MIN_POOL_SIZE": "minPoolSize",
+    "SUSOLD_MONGO_MAX_IDLE_MS": "maxIdleTimeMS",
+    "SUSOLD_MONGO_WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS",
+    "SUSOLD_MONGO_CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+    "SUSOLD_MONGO_SOCKET_TIMEOUT_MS": "socketTimeoutMS",
+    "SUSOLD_MONGO_SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+}
+
+
+def client_options() -> dict:
+    return {option: int(os.environ[env]) for env, option in POOL_OPTIONS.items() if os.environ.get(env)}
+
+
+# The client connects lazily, so every worker process that imports this
+# module gets its own pool. command_listener feeds backend/metrics.py
+client = AsyncIOMotorClient(MONGO_URI, event_listeners=[command_listener], **client_options())
+db = client[MONGO_DB_NAME]
 
 users_collection = db.users
 feedback_collection = db.feedbacks
@@ -0,0 +1,85 @@
+import json
+import time
+from collections import OrderedDict
+from backend.database import item_collection
+
+# Filter sidebar fields counted by GET /home/?facets=true
+FACET_FIELDS = ("category", "sub_category", "brand", "condition", "dorm", "verified", "returnable", "inStock")
+FACET_LIMIT = 50
+PRICE_BOUNDARIES = [0, 50, 100, 250, 500, 1000, 5000]
+
+# Normalized filter set -> (expires_at, counts). Per process; the TTL bounds
+# how long a new or edited listing can be missing from the counts.
+FACET_CACHE_TTL = 30
+FACET_CACHE_SIZE = 256
+_facet_cache = OrderedDict()
+
+
+def facet_pipeline(match: dict) -> list:
+    """One aggregation: the shared match, then a count per facet in a single $facet stage."""
+    facets = {
+        field: [
+            {"$match": {field: {"$ne": None}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": FACET_LIMIT},
+        ]
+        for field in FACET_FIELDS
+    }
+    facets["price"] = [{"$bucket": {
+        "groupBy": "$price",
+        "boundaries": PRICE_BOUNDARIES,
+        "default": f"{PRICE_BOUNDARIES[-1]}+",
+        "output": {"count": {"$sum": 1}},
+    }}]
+    facets["total"] = [{"$count": "count"}]
+    return [{"$match": match}, {"$facet": facets}]
+
+
+def _price_bucket(group: dict) -> dict:
+    lower = group["_id"]
+    if not isinstance(lower, (int, float)):
+        return {"min": PRICE_BOUNDARIES[-1], "max": None, "count": group["count"]}
+    upper = PRICE_BOUNDARIES[PRICE_BOUNDARIES.index(lower) + 1]
+    return {"min": lower, "max": upper, "count": group["count"]}
+
+
+def _facet_result(raw: dict) -> dict:
+    counts = {
+        field: [{"value": group["_id"], "count": group["count"]} for group in raw.get(field, [])]
+        for field in FACET_FIELDS
+    }
+    counts["price"] = [_price_bucket(group) for group in raw.get("price", [])]
+    total = raw.get("total", [])
+    counts["total"] = total[0]["count"] if total else 0
+    return counts
+
+
+def empty_facet_counts() -> dict:
+    return _facet_result({})
+
+
+def clear_facet_cache():
+    _facet_cache.clear()
+
+
+def cache_key(match: dict) -> str:
+    # Key order does not matter, so equal filter sets share one entry
+    return json.dumps(match, sort_keys=True, default=str)
+
+
+async def get_facet_counts(match: dict) -> dict:
+    key = cache_key(match)
+    entry = _facet_cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        _facet_cache.move_to_end(key)
+        return entry[1]
+
+    raw = await item_collection.aggregate(facet_pipeline(match)).to_list(length=1)
+    counts = _facet_result(raw[0] if raw else {})
+
+    _facet_cache[key] = (time.monotonic() + FACET_CACHE_TTL, counts)
+    _facet_cache.move_to_end(key)
+    while len(_facet_cache) > FACET_CACHE_SIZE:
+        _facet_cache.popitem(last=False)
+    return counts
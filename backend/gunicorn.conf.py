@@ -0,0 +1,90 @@
+"""Production server profile.
+
+    gunicorn -c backend/gunicorn.conf.py backend.main:app
+
+One uvicorn worker process per core (``WEB_CONCURRENCY`` overrides), each
+with its own event loop (uvloop and httptools when installed) and its own
+Motor connection pool. The app is imported in every worker after the fork
+(no ``preload_app``), so no MongoDB client or thread is shared across
+processes. The index manifest is applied once, here in the master, before
+the workers start.
+
+When ``SUSOLD_CACHE_URL`` is set (the ``redis`` service in docker-compose)
+the response cache moves to Redis so a write invalidates the cache of every
+worker; without it each worker keeps its own cache. Each worker writes its
+metrics to ``SUSOLD_METRICS_DIR`` so ``/metrics`` reports the whole server.
+
+On SIGTERM gunicorn stops accepting connections and gives the workers
+``SUSOLD_GRACEFUL_TIMEOUT`` seconds to finish in-flight requests and run the
+app's shutdown (mail workers, invoice pool, Mongo client) before killing them.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+CPU_COUNT = os.cpu_count() or 1
+
+bind = os.getenv("SUSOLD_BIND", "0.0.0.0:8000")
+workers = max(1, int(os.getenv("WEB_CONCURRENCY") or CPU_COUNT))
+
+try:
+    import uvicorn_worker  # noqa: F401
+    worker_class = "uvicorn_worker.UvicornWorker"
+except ImportError:
+    # Older uvicorn releases ship the worker themselves
+    worker_class = "uvicorn.workers.UvicornWorker"
+
+preload_app = False
+graceful_timeout = int(os.getenv("SUSOLD_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("SUSOLD_WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("SUSOLD_KEEPALIVE", "5"))
+# Recycle workers now and then so a slow leak cannot grow forever; jitter avoids restarting them all at once
+max_requests = int(os.getenv("SUSOLD_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("SUSOLD_ACCESS_LOG", "-")
+
+# Per-worker defaults, inherited by the forked workers. Pools that used to be
+# sized to the whole machine get a share of it so N workers do not oversubscribe.
+_per_worker_cpus = str(max(1, CPU_COUNT // workers))
+WORKER_ENV = {
+    "SUSOLD_APPLY_INDEXES": "0",
+    "SUSOLD_INVOICE_WORKERS": _per_worker_cpus,
+    "SUSOLD_HASH_WORKERS": _per_worker_cpus,
+    "SUSOLD_MAIL_WORKERS": "1",
+    "SUSOLD_MONGO_MAX_POOL_SIZE": "50",
+    "SUSOLD_MONGO_MIN_POOL_SIZE": "5",
+    "SUSOLD_MONGO_MAX_IDLE_MS": "300000",
+    "SUSOLD_MONGO_WAIT_QUEUE_TIMEOUT_MS": "5000",
+    "SUSOLD_MONGO_SERVER_SELECTION_TIMEOUT_MS": "5000",
+    "SUSOLD_MONGO_CONNECT_TIMEOUT_MS": "5000",
+    # One directory per master, so two servers on a host do not mix counters
+    "SUSOLD_METRICS_DIR": os.path.join(tempfile.gettempdir(), f"susold-metrics-{os.getpid()}"),
+}
+if os.getenv("SUSOLD_CACHE_URL"):
+    # An in-process cache would only be invalidated in the worker that handled the write
+    WORKER_ENV["SUSOLD_CACHE_BACKEND"] = "redis"
+for key, value in WORKER_ENV.items():
+    os.environ.setdefault(key, value)
+
+
+def on_starting(server):
+    os.makedirs(os.environ["SUSOLD_METRICS_DIR"], exist_ok=True)
+    if workers > 1 and os.environ.get("SUSOLD_CACHE_BACKEND", "memory") == "memory":
+        server.log.warning("SUSOLD_CACHE_URL is not set: each worker keeps its own response and "
+                           "principal caches and sees other workers' changes only when they expire")
+    # Once per deployment instead of once per worker
+    result = subprocess.run([sys.executable, "-m", "backend.indexes"])
+    if result.returncode != 0:
+        server.log.warning("Index bootstrap failed; workers start anyway")
+
+
+def child_exit(server, worker):
+    # Keep the counters of recycled workers in the totals
+    from backend.metrics import retire_worker
+    retire_worker(worker.pid, os.environ["SUSOLD_METRICS_DIR"])
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ["SUSOLD_METRICS_DIR"], ignore_errors=True)
@@ -0,0 +1,31 @@
+from backend.database import item_collection
+from backend.search import ITEM_PUBLIC_PROJECTION
+
+
+# ------------------------- Batch item hydration -------------------------
+async def hydrate_items(item_ids: list, projection: dict = None) -> list:
+    """Load the items for ``item_ids`` with a single ``$in`` query.
+
+    The result follows the order of ``item_ids`` (duplicates included) and
+    silently drops ids that no longer exist, like the old per-id lookups did.
+    ``item_id`` is always fetched so documents can be matched back to ids
+    and the internal search terms are never returned;
+    ObjectIds are converted to strings when ``_id`` is part of the result.
+    """
+    if not item_ids:
+        return []
+
+    if projection is None:
+        projection = ITEM_PUBLIC_PROJECTION
+    elif any(projection.values()):
+        projection = {**projection, "item_id": 1}
+
+    docs = await item_collection.find({"item_id": {"$in": list(set(item_ids))}}, projection).to_list(length=None)
+
+    by_id = {}
+    for doc in docs:
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+        by_id[doc["item_id"]] = doc
+
+    return [by_id[item_id] for item_id in item_ids if item_id in by_id]
@@ -0,0 +1,47 @@
+from pymongo import ReturnDocument
+from backend.database import db, users_collection, order_collection, item_collection
+
+counters_collection = db.counters
+
+
+# ------------------------- ID sequences -------------------------
+# kind -> (prefix, width, first value, collection, field)
+# Each allocation is one atomic $inc plus one indexed existence check. The
+# check only matters where older random ids share the numeric range: a hit
+# is skipped for good, because the counter never goes back.
+# Orders and users start above the old 5-digit random range and simply grow
+# wider; items stay at 5 digits because ProductCreate validates ^item\d{5}$.
+ID_SEQUENCES = {
+    "order": ("order", 5, 100000, order_collection, "order_id"),
+    "user": ("user", 5, 100000, users_collection, "user_id"),
+    "item": ("item", 5, 10000, item_collection, "item_id"),
+    "tax_id": ("", 11, 10000000000, users_collection, "tax_id"),
+}
+
+MAX_VALUES = {
+    "item": 99999,
+    "tax_id": 99999999999,
+}
+
+
+async def next_sequence(kind: str) -> int:
+    counter = await counters_collection.find_one_and_update(
+        {"_id": kind},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+
+async def allocate_id(kind: str) -> str:
+    prefix, width, start, collection, field = ID_SEQUENCES[kind]
+
+    while True:
+        value = start + await next_sequence(kind) - 1
+        if kind in MAX_VALUES and value > MAX_VALUES[kind]:
+            raise RuntimeError(f"No {kind} ids left to allocate")
+
+        new_id = f"{prefix}{value:0{width}d}"
+        if not await collection.find_one({field: new_id}, {"_id": 1}):
+            return new_id
@@ -0,0 +1,232 @@
+"""Versioned index manifest for the cs308 database.
+
+Apply pending versions with ``python -m backend.indexes`` or let the API do it
+on startup. The same step runs the pending data backfills (``DATA_MIGRATIONS``)
+that routes depend on, e.g. the search terms of items saved before search. ``python -m backend.indexes --report`` lists the route queries that
+still fall back to a collection scan.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from backend.database import (
+    db, item_collection, users_collection, order_collection,
+    feedback_collection, refund_collection, category_collection
+)
+from backend.search import reindex_items
+
+migrations_collection = db.schema_migrations
+
+
+# ------------------------- Manifest -------------------------
+# Append a new version instead of editing an applied one; each entry maps a
+# collection name to the indexes introduced by that version.
+INDEX_MANIFEST = [
+    (1, "initial lookup, filter and sort indexes", {
+        "items": [
+            IndexModel([("item_id", ASCENDING)], name="item_id_unique", unique=True),
+            IndexModel([("user_id", ASCENDING)], name="seller"),
+            IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_sort"),
+            IndexModel([("category", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="category_price"),
+            IndexModel([("category", ASCENDING), ("sub_category", ASCENDING), ("price", ASCENDING)], name="category_sub_price"),
+            IndexModel([("brand", ASCENDING), ("price", ASCENDING)], name="brand_price"),
+            IndexModel([("likes", DESCENDING), ("_id", DESCENDING)], name="popularity_sort"),
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="newest_sort"),
+            IndexModel([("isSold", ASCENDING)], name="delivery_status"),
+        ],
+        "users": [
+            IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+            IndexModel([("tax_id", ASCENDING)], name="tax_id_unique", unique=True, sparse=True),
+            IndexModel([("favorites", ASCENDING)], name="favorites"),
+            IndexModel([("basket", ASCENDING)], name="basket"),
+        ],
+        "orders": [
+            IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+            IndexModel([("date", ASCENDING)], name="date"),
+            IndexModel([("user_id", ASCENDING), ("date", DESCENDING)], name="user_date"),
+        ],
+        "feedbacks": [
+            IndexModel([("receiver_id", ASCENDING)], name="receiver"),
+        ],
+        "refund_requests": [
+            IndexModel([("order_id", ASCENDING)], name="order_id"),
+            IndexModel([("user_id", ASCENDING), ("order_id", ASCENDING)], name="user_order"),
+        ],
+        "category_collection": [
+            IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+        ],
+    }),
+    (2, "mail queue claim order", {
+        "mail_queue": [
+            IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        ],
+    }),
+    (3, "reverse lookup of offered items", {
+        "users": [
+            IndexModel([("offeredProducts", ASCENDING)], name="offered_products"),
+        ],
+    }),
+    (4, "product search terms and typeahead prefixes", {
+        "items": [
+            IndexModel([("search.terms", ASCENDING)], name="search_terms"),
+            IndexModel([("search.prefixes", ASCENDING)], name="search_prefixes"),
+        ],
+    }),
+    (5, "newest-first feedback pages per receiver", {
+        "feedbacks": [
+            IndexModel([("receiver_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="receiver_date"),
+        ],
+    }),
+    (6, "refund review queue", {
+        "refund_requests": [
+            IndexModel([("status", ASCENDING), ("order_id", ASCENDING)], name="status_order"),
+            IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_queue"),
+        ],
+    }),
+    # Fails on invoices stored twice before it existed: python -m backend.invoices --dedupe
+    (7, "one stored invoice per order", {
+        "invoices.files": [
+            IndexModel([("filename", ASCENDING)], name="filename_unique", unique=True),
+        ],
+    }),
+]
+
+LATEST_VERSION = INDEX_MANIFEST[-1][0]
+
+
+async def get_applied_version() -> int:
+    doc = await migrations_collection.find_one({"_id": "indexes"})
+    return doc["version"] if doc else 0
+
+
+async def apply_indexes(target_version: int = LATEST_VERSION) -> list:
+    """Create every index from versions newer than the stored one.
+
+    Returns the list of versions that were applied. A version whose index
+    build fails (e.g. duplicates under a unique key) stops the run so it can
+    be retried after the data is fixed.
+    """
+    current = await get_applied_version()
+    applied = []
+
+    for version, description, collections in INDEX_MANIFEST:
+        if version <= current or version > target_version:
+            continue
+
+        for collection_name, models in collections.items():
+            try:
+                await db[collection_name].create_indexes(models)
+            except OperationFailure as e:
+                raise RuntimeError(f"Index version {version} failed on '{collection_name}': {e}")
+
+        await migrations_collection.update_one(
+            {"_id": "indexes"},
+            {"$set": {"version": version, "description": description}},
+            upsert=True
+        )
+        applied.append(version)
+
+    return applied
+
+
+# ------------------------- Data backfills -------------------------
+# Same rules as the index manifest: append, never edit an applied version.
+# Each step must be safe to re-run if the process dies half way.
+DATA_MIGRATIONS = [
+    (1, "search terms for items saved before product search", lambda: reindex_items(only_missing=True)),
+]
+
+
+async def apply_data_migrations() -> list:
+    doc = await migrations_collection.find_one({"_id": "data"})
+    current = doc["version"] if doc else 0
+    applied = []
+
+    for version, description, step in DATA_MIGRATIONS:
+        if version <= current:
+            continue
+        await step()
+        await migrations_collection.update_one(
+            {"_id": "data"},
+            {"$set": {"version": version, "description": description}},
+            upsert=True
+        )
+        applied.append(version)
+
+    return applied
+
+
+# ------------------------- Unindexed query report -------------------------
+# Representative filter for each route, used with explain() to spot
+# collection scans. Keep in sync when routes gain new query shapes.
+ROUTE_QUERIES = {
+    "GET /home/": (item_collection, {"price": {"$gt": 0}}),
+    "GET /home/ (title search)": (item_collection, {"title": {"$regex": "a", "$options": "i"}, "price": {"$gt": 0}}),
+    "GET /home/ (category)": (item_collection, {"category": "Books", "price": {"$gt": 0}}),
+    "GET /home/?q=": (item_collection, {"search.terms": {"$in": ["kitap"]}, "price": {"$gt": 0}}),
+    "GET /home/suggest": (item_collection, {"search.prefixes": "ki", "price": {"$gt": 0}}),
+    "GET /home/item/{item_id}": (item_collection, {"item_id": "item00000"}),
+    "GET /home/title/{title}": (item_collection, {"title": "x"}),
+    "GET /my_offerings": (item_collection, {"user_id": "user00000"}),
+    "GET /items-without-price": (item_collection, {"$or": [{"price": {"$exists": False}}, {"price": None}, {"price": 0}]}),
+    "get_current_user (auth lookup)": (users_collection, {"email": "x@sabanciuniv.edu"}),
+    "POST /home/set-discount": (users_collection, {"favorites": "item00000"}),
+    "PATCH /change-stock-status": (users_collection, {"basket": "item00000"}),
+    "DELETE /home/{item_id}": (users_collection, {"$or": [{"basket": "item00000"}, {"favorites": "item00000"}, {"offeredProducts": "item00000"}]}),
+    "GET /user-orders": (order_collection, {"user_id": "user00000"}),
+    "GET /home/sales-summary": (order_collection, {"date": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc), "$lte": datetime(2024, 2, 1, tzinfo=timezone.utc)}}),
+    "GET /all-orders": (order_collection, {}),
+    "GET /my_feedbacks": (feedback_collection, {"receiver_id": "user00000"}),
+    "GET /seller_feedbacks (page)": (feedback_collection, {"receiver_id": "user00000", "date": {"$lt": datetime(2024, 1, 1, tzinfo=timezone.utc)}}),
+    "GET /unapproved_comments": (feedback_collection, {"comment": {"$ne": None}, "isCommentVerified": False}),
+    "GET /refund-requests": (refund_collection, {"status": "pending"}),
+    "POST /handle-refund-request": (refund_collection, {"order_id": "order00000"}),
+    "POST /handle-refund-requests": (refund_collection, {"status": "pending", "order_id": {"$in": ["order00000", "order00001"]}}),
+    "POST /categories": (category_collection, {"name": "x"}),
+}
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def find_unindexed_queries() -> list:
+    """Return the routes whose representative query plans a COLLSCAN."""
+    unindexed = []
+    for route, (collection, query) in ROUTE_QUERIES.items():
+        explain = await collection.find(query).explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            unindexed.append(route)
+    return unindexed
+
+
+async def _main(args):
+    if args.report:
+        for route in await find_unindexed_queries():
+            print("COLLSCAN:", route)
+        return
+
+    applied = await apply_indexes(args.version)
+    if applied:
+        print("Applied index versions:", ", ".join(str(v) for v in applied))
+    else:
+        print(f"Indexes already at version {await get_applied_version()}")
+
+    backfilled = await apply_data_migrations()
+    if backfilled:
+        print("Applied data migrations:", ", ".join(str(v) for v in backfilled))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the cs308 index manifest")
+    parser.add_argument("--version", type=int, default=LATEST_VERSION, help="apply up to this manifest version")
+    parser.add_argument("--report", action="store_true", help="list route queries that still scan a collection")
+    asyncio.run(_main(parser.parse_args()))
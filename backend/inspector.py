@@ -0,0 +1,85 @@
+"""Bounded database inspection for the admin debug endpoints.
+
+Nothing here reads a whole collection: summaries come from ``$collStats`` and
+``$indexStats``, documents come back either one keyset page at a time or as a
+``$sample`` streamed from the cursor. Secrets are projected out server-side.
+"""
+from fastapi import HTTPException
+from backend.database import (
+    db, users_collection, item_collection, order_collection, feedback_collection,
+    refund_collection, category_collection
+)
+from backend.mailer import mail_queue_collection
+
+INSPECTABLE = {
+    "users": users_collection,
+    "items": item_collection,
+    "orders": order_collection,
+    "feedbacks": feedback_collection,
+    "refund_requests": refund_collection,
+    "categories": category_collection,
+    "mail_queue": mail_queue_collection,
+}
+
+# Fields that never leave the database through the inspector
+REDACTED = {
+    "users": {"password": 0, "credit_cards": 0},
+    "orders": {"payment_info": 0},
+    "mail_queue": {"attachments": 0},
+}
+
+MAX_PAGE_SIZE = 200
+MAX_SAMPLE_SIZE = 500
+
+
+def get_inspectable(name: str):
+    if name not in INSPECTABLE:
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{name}'")
+    return INSPECTABLE[name]
+
+
+def redaction(name: str):
+    return REDACTED.get(name) or None
+
+
+async def collection_summary(name: str) -> dict:
+    collection = INSPECTABLE[name]
+    stats = await collection.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=None)
+    storage = stats[0].get("storageStats", {}) if stats else {}
+    index_usage = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+
+    return {
+        "count": storage.get("count", 0),
+        "size_bytes": storage.get("size", 0),
+        "storage_size_bytes": storage.get("storageSize", 0),
+        "avg_doc_size_bytes": storage.get("avgObjSize", 0),
+        "total_index_size_bytes": storage.get("totalIndexSize", 0),
+        "indexes": [
+            {
+                "name": index["name"],
+                "key": dict(index["key"]),
+                "size_bytes": storage.get("indexSizes", {}).get(index["name"], 0),
+                "ops": index.get("accesses", {}).get("ops", 0),
+            }
+            for index in index_usage
+        ],
+    }
+
+
+async def database_summary() -> dict:
+    stats = await db.command("dbStats")
+    return {
+        "database": db.name,
+        "data_size_bytes": stats.get("dataSize", 0),
+        "storage_size_bytes": stats.get("storageSize", 0),
+        "index_size_bytes": stats.get("indexSize", 0),
+        "collections": {name: await collection_summary(name) for name in INSPECTABLE},
+    }
+
+
+def sample_documents(name: str, size: int):
+    """Return an aggregation cursor over ``size`` random documents of ``name``."""
+    pipeline = [{"$sample": {"size": size}}]
+    if redaction(name):
+        pipeline.append({"$project": redaction(name)})
+    return INSPECTABLE[name].aggregate(pipeline)
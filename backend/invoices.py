@@ -0,0 +1,197 @@
+"""Invoice PDF rendering and storage.
+
+Invoices never change once an order is placed, so each one is rendered once
+(with reportlab, in a process pool) and kept in the ``invoices`` GridFS
+bucket under ``invoice_<order_id>.pdf``. Later downloads read the stored bytes.
+The filename is unique (index version 7), so when two first downloads race the
+loser drops its upload and serves the stored copy.
+
+Pre-render a date range with
+``python -m backend.invoices --start 2024-05-01 --end 2024-05-31``. If index
+version 7 fails on older data, ``python -m backend.invoices --dedupe`` keeps the
+first copy of each invoice and deletes the rest.
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from reportlab.pdfgen import canvas
+from backend.database import db, order_collection, item_collection
+
+POOL_SIZE = int(os.getenv("SUSOLD_INVOICE_WORKERS", str(os.cpu_count() or 1)))
+PRERENDER_CONCURRENCY = 8
+
+_pool = None
+_bucket = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=POOL_SIZE)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+
+
+def get_bucket() -> AsyncIOMotorGridFSBucket:
+    global _bucket
+    if _bucket is None:
+        _bucket = AsyncIOMotorGridFSBucket(db, bucket_name="invoices")
+    return _bucket
+
+
+def invoice_filename(order_id: str) -> str:
+    return f"invoice_{order_id}.pdf"
+
+
+# ------------------------- Rendering -------------------------
+def invoice_text(order: dict, item_names: list) -> str:
+    return (
+        f"Invoice for Order ID: {order['order_id']}\n\n"
+        f"User ID: {order['user_id']}\n"
+        f"Date: {order['date']}\n\n"
+        f"Purchased Items:\n- " + "\n- ".join(item_names) + "\n\n"
+        f"Shipping Address: {order['shipping_address']}\n"
+        f"Payment Info: {order['payment_info']}\n\n"
+        f"Total Price: {order['total_price']}\n"
+        f"Number of Items: {order['number_of_items']}\n"
+    )
+
+
+def render_pdf(message: str) -> bytes:
+    # Runs in a worker process; keep it a plain top-level function
+    pdf_buffer = BytesIO()
+    p = canvas.Canvas(pdf_buffer)
+    text_object = p.beginText(40, 800)
+    for line in message.split("\n"):
+        text_object.textLine(line)
+    p.drawText(text_object)
+    p.showPage()
+    p.save()
+    return pdf_buffer.getvalue()
+
+
+async def render_pdf_async(message: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), render_pdf, message)
+
+
+# ------------------------- Storage -------------------------
+async def load_invoice(order_id: str):
+    try:
+        stream = await get_bucket().open_download_stream_by_name(invoice_filename(order_id))
+    except NoFile:
+        return None
+    return await stream.read()
+
+
+async def store_invoice(order_id: str, pdf: bytes) -> bytes:
+    """Store ``pdf`` unless the invoice is already stored; returns the stored copy."""
+    file_id = ObjectId()
+    try:
+        await get_bucket().upload_from_stream_with_id(
+            file_id, invoice_filename(order_id), pdf, metadata={"order_id": order_id}
+        )
+    except DuplicateKeyError:
+        # Another request stored it first; drop our orphaned chunks and use theirs
+        await db["invoices.chunks"].delete_many({"files_id": file_id})
+        return await load_invoice(order_id)
+    return pdf
+
+
+async def remove_duplicate_invoices() -> int:
+    """Keep the oldest copy of each invoice filename; returns the number deleted."""
+    duplicates = db["invoices.files"].aggregate([
+        {"$sort": {"uploadDate": 1}},
+        {"$group": {"_id": "$filename", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ])
+    deleted = 0
+    async for group in duplicates:
+        for file_id in group["ids"][1:]:
+            await get_bucket().delete(file_id)
+            deleted += 1
+    return deleted
+
+
+async def _item_names(item_ids: list) -> list:
+    item_docs = await item_collection.find({"item_id": {"$in": item_ids}}, {"title": 1, "_id": 0}).to_list(length=None)
+    return [item["title"] for item in item_docs]
+
+
+async def get_invoice_pdf(order: dict, item_names: list = None) -> bytes:
+    """Return the stored invoice for ``order``, rendering and storing it on first use."""
+    pdf = await load_invoice(order["order_id"])
+    if pdf is not None:
+        return pdf
+
+    if item_names is None:
+        item_names = await _item_names(order.get("item_ids", []))
+    pdf = await render_pdf_async(invoice_text(order, item_names))
+    return await store_invoice(order["order_id"], pdf)
+
+
+# ------------------------- Month-end batch -------------------------
+async def prerender_invoices(start_dt: datetime, end_dt: datetime) -> int:
+    """Render and store every missing invoice for orders in the date range."""
+    orders = await order_collection.find({"date": {"$gte": start_dt, "$lte": end_dt}}).to_list(length=None)
+    names = [invoice_filename(order["order_id"]) for order in orders]
+    stored_names = {f.filename async for f in get_bucket().find({"filename": {"$in": names}})}
+
+    pending = [order for order in orders if invoice_filename(order["order_id"]) not in stored_names]
+    if not pending:
+        return 0
+
+    item_ids = list({item_id for order in pending for item_id in order.get("item_ids", [])})
+    titles = {
+        item["item_id"]: item["title"]
+        async for item in item_collection.find({"item_id": {"$in": item_ids}}, {"item_id": 1, "title": 1, "_id": 0})
+    }
+
+    semaphore = asyncio.Semaphore(PRERENDER_CONCURRENCY)
+
+    async def render_one(order):
+        async with semaphore:
+            names = [titles[i] for i in order.get("item_ids", []) if i in titles]
+            pdf = await render_pdf_async(invoice_text(order, names))
+            await store_invoice(order["order_id"], pdf)
+
+    await asyncio.gather(*(render_one(order) for order in pending))
+    return len(pending)
+
+
+async def _main(args):
+    if args.dedupe:
+        print(f"Deleted {await remove_duplicate_invoices()} duplicate invoices")
+        return
+
+    start_dt = datetime.strptime(args.start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    end_dt = datetime.strptime(args.end, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    try:
+        rendered = await prerender_invoices(start_dt, end_dt)
+    finally:
+        shutdown_pool()
+    print(f"Rendered {rendered} invoices")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render invoices for a date range")
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    parser.add_argument("--dedupe", action="store_true", help="delete duplicate copies of stored invoices")
+    args = parser.parse_args()
+    if not args.dedupe and not (args.start and args.end):
+        parser.error("--start and --end are required unless --dedupe is given")
+    asyncio.run(_main(args))
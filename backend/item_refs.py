@@ -0,0 +1,15 @@
+from backend.database import users_collection
+
+# User fields that hold item ids; each one has a multikey index (see backend/indexes.py)
+ITEM_REFERENCE_FIELDS = ("basket", "favorites", "offeredProducts")
+
+
+async def pull_item_references(item_id: str, fields: tuple = ITEM_REFERENCE_FIELDS) -> int:
+    """Remove ``item_id`` from ``fields`` of the users holding it; returns the users touched.
+
+    The filter is an $or of indexed equality matches, so only the affected
+    users are read and written, in one update_many.
+    """
+    query = {"$or": [{field: item_id} for field in fields]}
+    result = await users_collection.update_many(query, {"$pull": {field: item_id for field in fields}})
+    return result.modified_count
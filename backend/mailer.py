@@ -0,0 +1,248 @@
+"""Background outbound email queue.
+
+Handlers call ``enqueue_email``/``enqueue_emails``, which only insert into the
+``mail_queue`` collection. Worker tasks started with the app claim pending
+mails in batches, send each batch over one reused SMTP connection in a thread,
+and retry failures with exponential backoff. Every claim counts as an attempt,
+so a mail whose worker died mid-send is retried at most ``MAX_ATTEMPTS`` times
+too, and a mail that cannot even be built is marked ``failed`` on its own.
+
+Set ``SUSOLD_MAIL_TRANSPORT=memory`` to keep every message in
+``MemoryTransport.outbox`` instead of touching the network.
+"""
+import asyncio
+import os
+import smtplib
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+from pymongo import ReturnDocument
+from backend.database import db
+
+mail_queue_collection = db.mail_queue
+
+SENDER_EMAIL = os.getenv("SUSOLD_MAIL_USER", "susold78@gmail.com")
+SENDER_PASSWORD = os.getenv("SUSOLD_MAIL_PASSWORD", "eoiz jtje lhyv lhsn")
+SMTP_HOST = os.getenv("SUSOLD_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SUSOLD_SMTP_PORT", "465"))
+
+WORKER_COUNT = int(os.getenv("SUSOLD_MAIL_WORKERS", "2"))
+BATCH_SIZE = int(os.getenv("SUSOLD_MAIL_BATCH_SIZE", "20"))
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30
+POLL_INTERVAL = 2.0
+STALE_CLAIM = timedelta(minutes=10)
+
+
+# ------------------------- Transports -------------------------
+class SMTPTransport:
+    """Sends over a single SMTP_SSL connection that is kept open between batches."""
+
+    def __init__(self):
+        self.connection = None
+
+    def _connect(self):
+        self.connection = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT)
+        self.connection.login(SENDER_EMAIL, SENDER_PASSWORD)
+
+    def _ensure_connection(self):
+        if self.connection is None:
+            self._connect()
+            return
+        try:
+            self.connection.noop()
+        except smtplib.SMTPException:
+            self._connect()
+
+    def send_batch(self, messages: list) -> list:
+        """Send ``messages`` and return one error (or None) per message."""
+        errors = []
+        try:
+            self._ensure_connection()
+        except Exception as e:
+            self.connection = None
+            return [e] * len(messages)
+
+        for msg in messages:
+            try:
+                self.connection.send_message(msg)
+                errors.append(None)
+            except smtplib.SMTPServerDisconnected as e:
+                self.connection = None
+                errors.append(e)
+                try:
+                    self._connect()
+                except Exception:
+                    pass
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except Exception:
+                pass
+            self.connection = None
+
+
+class MemoryTransport:
+    """Local stand-in used by tests and development; nothing leaves the process."""
+
+    outbox = []
+
+    def send_batch(self, messages: list) -> list:
+        MemoryTransport.outbox.extend(messages)
+        return [None] * len(messages)
+
+    def close(self):
+        pass
+
+
+TRANSPORTS = {
+    "smtp": SMTPTransport,
+    "memory": MemoryTransport,
+}
+
+
+def get_transport():
+    return TRANSPORTS[os.getenv("SUSOLD_MAIL_TRANSPORT", "smtp")]()
+
+
+# ------------------------- Queueing -------------------------
+def _mail_doc(to_email: str, subject: str, body: str, attachments: list = None) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "attachments": attachments or [],  # [{"filename", "content", "subtype"}]
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+
+
+async def enqueue_email(to_email: str, subject: str, body: str, attachments: list = None):
+    await mail_queue_collection.insert_one(_mail_doc(to_email, subject, body, attachments))
+
+
+async def enqueue_emails(to_emails: list, subject: str, body: str):
+    if to_emails:
+        await mail_queue_collection.insert_many([_mail_doc(to, subject, body) for to in to_emails])
+
+
+async def enqueue_messages(messages: list):
+    """Queue personalised mails in one insert; ``messages`` holds (to, subject, body) tuples."""
+    if messages:
+        await mail_queue_collection.insert_many([_mail_doc(to, subject, body) for to, subject, body in messages])
+
+
+def build_message(doc: dict) -> EmailMessage:
+    msg = EmailMessage()
+    msg.set_content(doc["body"])
+    msg["Subject"] = doc["subject"]
+    msg["From"] = SENDER_EMAIL
+    msg["To"] = doc["to"]
+    for attachment in doc.get("attachments", []):
+        msg.add_attachment(
+            bytes(attachment["content"]),
+            maintype="application",
+            subtype=attachment.get("subtype", "octet-stream"),
+            filename=attachment["filename"]
+        )
+    return msg
+
+
+# ------------------------- Workers -------------------------
+async def claim_batch(limit: int = BATCH_SIZE) -> list:
+    now = datetime.now(timezone.utc)
+    # Claims abandoned by a dead worker that already used up their attempts
+    await mail_queue_collection.update_many(
+        {"status": "sending", "claimed_at": {"$lt": now - STALE_CLAIM}, "attempts": {"$gte": MAX_ATTEMPTS}},
+        {"$set": {"status": "failed", "last_error": "claim expired"}}
+    )
+    ready = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "claimed_at": {"$lt": now - STALE_CLAIM}, "attempts": {"$lt": MAX_ATTEMPTS}},
+    ]}
+    batch = []
+    for _ in range(limit):
+        doc = await mail_queue_collection.find_one_and_update(
+            ready,
+            {"$set": {"status": "sending", "claimed_at": now}, "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            break
+        batch.append(doc)
+    return batch
+
+
+async def process_batch(batch: list, transport) -> int:
+    """Send one claimed batch and record the outcome; returns the number sent."""
+    now = datetime.now(timezone.utc)
+    sendable, messages = [], []
+    for doc in batch:
+        try:
+            messages.append(build_message(doc))
+            sendable.append(doc)
+        except Exception as e:
+            # A malformed mail never gets better; do not retry it or hold up the batch
+            await mail_queue_collection.update_one(
+                {"_id": doc["_id"]}, {"$set": {"status": "failed", "last_error": f"build failed: {e}"}}
+            )
+
+    errors = await asyncio.to_thread(transport.send_batch, messages) if messages else []
+
+    sent = 0
+    for doc, error in zip(sendable, errors):
+        if error is None:
+            update = {"$set": {"status": "sent", "sent_at": now}, "$unset": {"attachments": ""}}
+            sent += 1
+        else:
+            # The claim already counted this attempt
+            attempts = doc.get("attempts", 1)
+            update = {"$set": {
+                "status": "failed" if attempts >= MAX_ATTEMPTS else "pending",
+                "last_error": str(error),
+                "next_attempt_at": now + timedelta(seconds=BACKOFF_SECONDS * 2 ** (attempts - 1)),
+            }}
+        await mail_queue_collection.update_one({"_id": doc["_id"]}, update)
+    return sent
+
+
+async def _worker():
+    transport = get_transport()
+    try:
+        while True:
+            try:
+                batch = await claim_batch()
+                if not batch:
+                    await asyncio.sleep(POLL_INTERVAL)
+                    continue
+                await process_batch(batch, transport)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Mail worker error:", e)
+                await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        transport.close()
+
+
+_worker_tasks = []
+
+
+def start_mail_workers(count: int = WORKER_COUNT):
+    for _ in range(count):
+        _worker_tasks.append(asyncio.create_task(_worker()))
+
+
+async def stop_mail_workers():
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
@@ -1,4 +1,6 @@
 # app/main.py
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
@@ -8,6 +10,51 @@ from backend.PurchaseScreen_backend.purchase import router as purchase_router
 from backend.HomePage_backend.app.routes import home
 from backend.HomePage_backend.app.routes import favorites
 from backend.HomePage_backend.app.routes import basket
+from backend.database import client
+from backend.indexes import apply_indexes, apply_data_migrations
+from backend.mailer import start_mail_workers, stop_mail_workers
+from backend.invoices import shutdown_pool as shutdown_invoice_pool
+from backend.metrics import MetricsMiddleware, metrics_router, flush_metrics
+
+
+# Bring the database indexes up to the latest manifest version.
+# Set SUSOLD_APPLY_INDEXES=0 to skip (e.g. when running "python -m backend.indexes" separately,
+# as the gunicorn profile does once before starting the workers)
+async def ensure_indexes():
+    if os.getenv("SUSOLD_APPLY_INDEXES", "1") == "0":
+        return
+    try:
+        applied = await apply_indexes()
+        if applied:
+            print("Applied index versions:", applied)
+        # Search only matches items that have search terms
+        backfilled = await apply_data_migrations()
+        if backfilled:
+            print("Applied data migrations:", backfilled)
+    except Exception as e:
+        print("Index bootstrap failed:", e)
+
+# Open the minPoolSize connections before the first request instead of during it
+async def warm_up_database():
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        print("MongoDB not reachable at startup:", e)
+
+# Runs once per worker process. By the time shutdown starts the server has
+# stopped accepting connections and finished the in-flight requests.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    await warm_up_database()
+    # Background workers that deliver the queued emails (see backend/mailer.py)
+    start_mail_workers()
+    yield
+    await stop_mail_workers()
+    # Last counters of this worker for the shared /metrics (gunicorn profile)
+    flush_metrics()
+    shutdown_invoice_pool()
+    client.close()
 
 
 app = FastAPI(
@@ -17,7 +64,8 @@ app = FastAPI(
     swagger_ui_init_oauth={
         "usePkceWithAuthorizationCodeGrant": False,
         "useBasicAuthenticationWithAccessCodeGrant": True
-    }
+    },
+    lifespan=lifespan
 )
 
 # Custom OpenAPI schema to fix the authentication in Swagger UI
@@ -54,8 +102,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
+# Latency / DB-call metrics at /metrics and a Server-Timing header on every response
+app.add_middleware(MetricsMiddleware)
+
 # Include all routers with their prefixes
 app.include_router(home.router, prefix="/api")
 app.include_router(main_router, prefix="/api")
@@ -63,6 +115,7 @@ app.include_router(purchase_router, prefix="/api")
 app.include_router(favorites.router, prefix="/api")
 app.include_router(basket.router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
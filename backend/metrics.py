@@ -0,0 +1,420 @@
+"""Request latency and MongoDB call instrumentation.
+
+``MetricsMiddleware`` times every request and, through ``CommandMetrics``
+(a pymongo command listener registered on the Motor client), counts the
+database commands it ran, their time and the size of their replies. Per
+route (the route's path template, e.g. ``/home/item/{item_id}``) it keeps:
+
+- a latency histogram
+- a histogram of DB commands per request, so an N+1 loop shows up as a
+  route whose requests land in the high buckets
+- total reply bytes
+
+``GET /metrics`` renders them in the Prometheus text format and every
+response carries a ``Server-Timing`` header (``app`` and ``db`` durations).
+``GET /metrics/slow-queries`` lists recent commands slower than
+``SUSOLD_SLOW_QUERY_MS``; samples keep only the command shape (field names,
+no values). Both endpoints need a bearer token: either
+``SUSOLD_METRICS_TOKEN`` (for the scraper) or the login token of an admin
+(see ``backend/admins.py``).
+
+Counters live in each worker process. When ``SUSOLD_METRICS_DIR`` is set (the
+gunicorn profile does this), every worker writes a snapshot of its counters
+there at most every ``SUSOLD_METRICS_FLUSH_SECONDS`` and ``/metrics`` sums the
+snapshots of all workers, whichever one answers the scrape. The master folds
+the snapshot of a worker that exits into ``retired.json`` (``retire_worker``),
+so totals do not drop when workers are recycled. For a
+streamed response the header is sent before the body's queries run; those
+queries still count towards the histograms.
+"""
+import hmac
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+import bson
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.security.utils import get_authorization_scheme_param
+from pymongo import monitoring
+
+METRICS_ENABLED = os.getenv("SUSOLD_METRICS", "1") != "0"
+# Re-encoding replies to measure them costs CPU on large reads; "0" skips it
+MEASURE_REPLY_BYTES = os.getenv("SUSOLD_METRICS_REPLY_BYTES", "1") != "0"
+SLOW_QUERY_MS = float(os.getenv("SUSOLD_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_SAMPLES = 100
+METRICS_DIR = os.getenv("SUSOLD_METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("SUSOLD_METRICS_FLUSH_SECONDS", "5"))
+RETIRED_SNAPSHOT = "retired.json"
+# Static bearer token for Prometheus; empty means only admins can read the metrics
+METRICS_TOKEN = os.getenv("SUSOLD_METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_CALL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Requests that matched no route share one label instead of one per raw path
+UNMATCHED_ROUTE = "unmatched"
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions"}
+
+
+class RequestStats:
+    __slots__ = ("db_calls", "db_seconds", "reply_bytes")
+
+    def __init__(self):
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.reply_bytes = 0
+
+
+# Set by the middleware; Motor copies the context into its executor threads,
+# so the command listener sees the stats object of the request it runs for
+_request_stats = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: str):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.total}"
+
+
+# ------------------------- Registry -------------------------
+_lock = threading.Lock()
+_requests = {}        # (method, route, status) -> count
+_latency = {}         # (method, route) -> Histogram
+_db_calls = {}        # (method, route) -> Histogram
+_reply_bytes = {}     # (method, route) -> bytes
+_commands = {}        # (command, collection) -> [count, seconds, failures]
+_slow_queries = deque(maxlen=SLOW_QUERY_SAMPLES)
+
+
+def record_request(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    key = (method, route)
+    with _lock:
+        _requests[(method, route, status)] = _requests.get((method, route, status), 0) + 1
+        _latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        _db_calls.setdefault(key, Histogram(DB_CALL_BUCKETS)).observe(stats.db_calls)
+        _reply_bytes[key] = _reply_bytes.get(key, 0) + stats.reply_bytes
+
+
+def reset_metrics():
+    with _lock:
+        for registry in (_requests, _latency, _db_calls, _reply_bytes, _commands):
+            registry.clear()
+        _slow_queries.clear()
+
+
+def slow_queries() -> list:
+    return collect()["slow_queries"]
+
+
+# ------------------------- Worker snapshots -------------------------
+_last_flush = 0.0
+
+
+def _dump(requests, latency, db_calls, reply_bytes, commands, slow) -> dict:
+    return {
+        "requests": [[*key, count] for key, count in requests.items()],
+        "latency": [[*key, list(h.counts), h.total, h.sum] for key, h in latency.items()],
+        "db_calls": [[*key, list(h.counts), h.total, h.sum] for key, h in db_calls.items()],
+        "reply_bytes": [[*key, size] for key, size in reply_bytes.items()],
+        "commands": [[*key, *counters] for key, counters in commands.items()],
+        "slow_queries": list(slow),
+    }
+
+
+def snapshot() -> dict:
+    """This process's counters as JSON-able lists."""
+    with _lock:
+        return _dump(_requests, _latency, _db_calls, _reply_bytes, _commands, _slow_queries)
+
+
+def merge_snapshots(snapshots: list) -> dict:
+    """Sum snapshots into registries shaped like the module-level ones."""
+    merged = {"requests": {}, "latency": {}, "db_calls": {}, "reply_bytes": {}, "commands": {}, "slow_queries": []}
+    for snap in snapshots:
+        for method, route, status, count in snap.get("requests", []):
+            key = (method, route, status)
+            merged["requests"][key] = merged["requests"].get(key, 0) + count
+        for name, buckets in (("latency", LATENCY_BUCKETS), ("db_calls", DB_CALL_BUCKETS)):
+            for method, route, counts, total, total_sum in snap.get(name, []):
+                histogram = merged[name].setdefault((method, route), Histogram(buckets))
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.total += total
+                histogram.sum += total_sum
+        for method, route, size in snap.get("reply_bytes", []):
+            merged["reply_bytes"][(method, route)] = merged["reply_bytes"].get((method, route), 0) + size
+        for command, collection, count, seconds, failures in snap.get("commands", []):
+            counters = merged["commands"].setdefault((command, collection), [0, 0.0, 0])
+            counters[0] += count
+            counters[1] += seconds
+            counters[2] += failures
+        merged["slow_queries"] += snap.get("slow_queries", [])
+    merged["slow_queries"] = sorted(merged["slow_queries"], key=lambda sample: sample["at"])[-SLOW_QUERY_SAMPLES:]
+    return merged
+
+
+def _read_snapshot(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A worker that is just starting or exiting; skip it for this scrape
+        return None
+
+
+def _write_json(path: str, data: dict):
+    # Readers never see a half-written file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def flush_metrics():
+    """Write this worker's snapshot to ``METRICS_DIR`` (no-op when unset)."""
+    global _last_flush
+    if not METRICS_DIR:
+        return
+    _last_flush = time.monotonic()
+    try:
+        _write_json(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), snapshot())
+    except OSError as e:
+        print("Could not write metrics snapshot:", e)
+
+
+def _maybe_flush():
+    if METRICS_DIR and time.monotonic() - _last_flush >= METRICS_FLUSH_SECONDS:
+        flush_metrics()
+
+
+def collect() -> dict:
+    """Counters of this process plus the snapshots of the other workers."""
+    snapshots = [snapshot()]
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        own = f"{os.getpid()}.json"
+        for name in sorted(os.listdir(METRICS_DIR)):
+            if name.endswith(".json") and name != own:
+                snap = _read_snapshot(os.path.join(METRICS_DIR, name))
+                if snap is not None:
+                    snapshots.append(snap)
+    return merge_snapshots(snapshots)
+
+
+def retire_worker(pid: int, directory: str = None):
+    """Fold an exited worker's snapshot into ``retired.json``. Runs in the gunicorn master."""
+    directory = directory or METRICS_DIR
+    path = os.path.join(directory, f"{pid}.json")
+    snap = _read_snapshot(path)
+    if snap is None:
+        return
+    retired_path = os.path.join(directory, RETIRED_SNAPSHOT)
+    retired = merge_snapshots([_read_snapshot(retired_path) or {}, snap])
+    # Slow query samples of a dead worker are not kept
+    _write_json(retired_path, _dump(retired["requests"], retired["latency"], retired["db_calls"],
+                                    retired["reply_bytes"], retired["commands"], []))
+    os.remove(path)
+
+
+# ------------------------- Mongo command listener -------------------------
+def command_shape(value, depth: int = 0):
+    """The structure of a filter/pipeline with every value replaced by its type name."""
+    if depth > 6:
+        return "..."
+    if isinstance(value, dict):
+        return {key: command_shape(inner, depth + 1) for key, inner in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [command_shape(value[0], depth + 1)] if value else []
+    return type(value).__name__
+
+
+def _command_summary(event) -> dict:
+    command = event.command
+    name = event.command_name
+    collection = command.get("collection") if name == "getMore" else command.get(name)
+    summary = {"command": name, "collection": collection if isinstance(collection, str) else None}
+    for field in ("filter", "pipeline", "sort"):
+        if field in command:
+            summary[field] = command_shape(command[field])
+    if name in ("update", "delete") and command.get("updates", command.get("deletes")):
+        first = (command.get("updates") or command.get("deletes"))[0]
+        summary["filter"] = command_shape(first.get("q", {}))
+    return summary
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._started = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        # The started event is the only one that carries the command body
+        self._started[(event.connection_id, event.request_id)] = (_command_summary(event), _request_stats.get())
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        entry = self._started.pop((event.connection_id, event.request_id), None)
+        if entry is None:
+            return
+        summary, stats = entry
+        seconds = event.duration_micros / 1_000_000
+        size = 0
+        if not failed and MEASURE_REPLY_BYTES:
+            size = len(bson.encode(event.reply))
+
+        with _lock:
+            counters = _commands.setdefault((summary["command"], summary["collection"] or ""), [0, 0.0, 0])
+            counters[0] += 1
+            counters[1] += seconds
+            counters[2] += failed
+            if stats is not None:
+                stats.db_calls += 1
+                stats.db_seconds += seconds
+                stats.reply_bytes += size
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                _slow_queries.append(dict(summary, ms=round(seconds * 1000, 2), failed=failed, at=time.time()))
+
+
+command_listener = CommandMetrics()
+
+
+# ------------------------- Middleware -------------------------
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - started) * 1000
+                timing = (
+                    f"app;dur={elapsed:.1f}, "
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_calls} calls"'
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            record_request(
+                scope["method"],
+                route.path if route is not None else UNMATCHED_ROUTE,
+                status,
+                time.perf_counter() - started,
+                stats,
+            )
+            _maybe_flush()
+
+
+# ------------------------- Exposition -------------------------
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{str(value)}"' for key, value in labels.items())
+
+
+def render_metrics() -> str:
+    # Imported here: jwt_handler imports the database module, which imports this one
+    from backend.registerloginbackend.jwt_handler import password_hash_stats
+
+    registries = collect()
+    lines = ["# HELP susold_http_requests_total Requests by route and status.",
+             "# TYPE susold_http_requests_total counter"]
+    for (method, route, status), count in sorted(registries["requests"].items()):
+        lines.append(f"susold_http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+    lines += ["# HELP susold_http_request_duration_seconds Request latency by route.",
+              "# TYPE susold_http_request_duration_seconds histogram"]
+    for (method, route), histogram in sorted(registries["latency"].items()):
+        lines += histogram.samples("susold_http_request_duration_seconds", _labels(method=method, route=route))
+
+    lines += ["# HELP susold_db_calls_per_request MongoDB commands issued per request.",
+              "# TYPE susold_db_calls_per_request histogram"]
+    for (method, route), histogram in sorted(registries["db_calls"].items()):
+        lines += histogram.samples("susold_db_calls_per_request", _labels(method=method, route=route))
+
+    lines += ["# HELP susold_db_reply_bytes_total Bytes of MongoDB replies read per route.",
+              "# TYPE susold_db_reply_bytes_total counter"]
+    for (method, route), size in sorted(registries["reply_bytes"].items()):
+        lines.append(f"susold_db_reply_bytes_total{{{_labels(method=method, route=route)}}} {size}")
+
+    lines += ["# HELP susold_db_commands_total MongoDB commands by name and collection.",
+              "# TYPE susold_db_commands_total counter"]
+    for (command, collection), (count, _, _) in sorted(registries["commands"].items()):
+        lines.append(f"susold_db_commands_total{{{_labels(command=command, collection=collection)}}} {count}")
+    lines += ["# TYPE susold_db_command_seconds_total counter"]
+    for (command, collection), (_, seconds, _) in sorted(registries["commands"].items()):
+        lines.append(f"susold_db_command_seconds_total{{{_labels(command=command, collection=collection)}}} {seconds}")
+    lines += ["# TYPE susold_db_command_failures_total counter"]
+    for (command, collection), (_, _, failures) in sorted(registries["commands"].items()):
+        lines.append(f"susold_db_command_failures_total{{{_labels(command=command, collection=collection)}}} {failures}")
+
+    # A gauge of the worker that answers the scrape, not a sum
+    lines += ["# HELP susold_password_hash_pool Password hashing thread pool.",
+              "# TYPE susold_password_hash_pool gauge"]
+    for key, value in sorted(password_hash_stats().items()):
+        lines.append(f"susold_password_hash_pool{{{_labels(stat=key)}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+async def require_metrics_access(request: Request):
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return
+    # Imported here for the same reason as in render_metrics
+    from backend.registerloginbackend.jwt_handler import get_current_user
+    from backend.PurchaseScreen_backend.purchase import require_admin
+    await require_admin(await get_current_user(token))
+
+
+metrics_router = APIRouter(dependencies=[Depends(require_metrics_access)])
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@metrics_router.get("/metrics/slow-queries", include_in_schema=False)
+async def get_slow_queries():
+    return slow_queries()
@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from fastapi import HTTPException
+
+
+# ------------------------- Opaque cursor encoding -------------------------
+# A cursor holds the sort value and the _id of the last document of a page.
+# Datetimes and ObjectIds are tagged so they survive the JSON round trip.
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+    return value
+
+
+def encode_cursor(last_doc: dict, sort_field: str = "_id") -> str:
+    payload = {"id": str(last_doc["_id"])}
+    if sort_field != "_id":
+        payload["v"] = _encode_value(last_doc.get(sort_field))
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {"id": ObjectId(payload["id"]), "v": _decode_value(payload.get("v"))}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# ------------------------- Keyset filter -------------------------
+def keyset_filter(cursor: dict, sort_field: str = "_id", direction: int = 1) -> dict:
+    """Build the query that selects documents strictly after ``cursor``.
+
+    Documents are ordered by ``(sort_field, _id)`` in ``direction``. Mongo sorts
+    missing/null values lowest, so a null cursor value is handled explicitly.
+    """
+    id_op = "$gt" if direction == 1 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {id_op: cursor["id"]}}
+
+    value = cursor["v"]
+    tie = {sort_field: value, "_id": {id_op: cursor["id"]}}
+    if value is None:
+        if direction == 1:
+            return {"$or": [{sort_field: {"$ne": None}}, tie]}
+        return tie
+    if direction == 1:
+        return {"$or": [{sort_field: {"$gt": value}}, tie]}
+    return {"$or": [{sort_field: {"$lt": value}}, {sort_field: None}, tie]}
+
+
+def sort_spec(sort_field: str = "_id", direction: int = 1) -> list:
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+async def fetch_page(collection, query: dict, limit: int, cursor: str = None,
+                     sort_field: str = "_id", direction: int = 1, projection: dict = None):
+    """Return ``(docs, next_cursor)`` for one keyset page of ``collection``.
+
+    One extra document is read to tell whether another page exists, so no
+    count or skip is ever needed.
+    """
+    if cursor:
+        after = keyset_filter(decode_cursor(cursor), sort_field, direction)
+        query = {"$and": [query, after]} if query else after
+
+    docs = await collection.find(query, projection).sort(sort_spec(sort_field, direction)).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
@@ -0,0 +1,126 @@
+"""Seller rating aggregates.
+
+Each seller document keeps ``rating_stats`` = ``{"sum", "count", "histogram"}``
+where the histogram counts ratings per star (0-5, rounded half up). New
+ratings are applied with one atomic pipeline update; the average is derived
+on read. A seller that only has the old ``rating``/``rate_number`` fields is
+seeded from them on the first new rating (their histogram stays empty until
+the rebuild below).
+
+``python -m backend.ratings`` rebuilds every seller's stats from the
+feedbacks collection (``--seller <user_id>`` for one seller). Run it once
+after deploying so sellers rated before the stats existed are included.
+"""
+import argparse
+import asyncio
+from pymongo import ReturnDocument
+from backend.database import users_collection, feedback_collection
+
+STARS = range(0, 6)
+
+
+def star_bucket(rating: float) -> int:
+    return min(5, max(0, int(rating + 0.5)))
+
+
+def empty_stats() -> dict:
+    return {"sum": 0, "count": 0, "histogram": {str(star): 0 for star in STARS}}
+
+
+def rating_summary(user: dict) -> dict:
+    """Average, count and histogram for a user document (falls back to the old fields)."""
+    stats = user.get("rating_stats")
+    if not stats:
+        return {
+            "rating": user.get("rating", 0.0),
+            "rate_number": user.get("rate_number", 0),
+            "histogram": empty_stats()["histogram"],
+        }
+    count = stats.get("count", 0)
+    histogram = empty_stats()["histogram"]
+    histogram.update(stats.get("histogram", {}))
+    return {
+        "rating": round(stats["sum"] / count, 2) if count else 0.0,
+        "rate_number": count,
+        "histogram": histogram,
+    }
+
+
+def record_rating_pipeline(rating: float) -> list:
+    bucket = f"rating_stats.histogram.{star_bucket(rating)}"
+    return [
+        # Legacy sellers keep their old average: sum = rating * rate_number
+        {"$set": {"rating_stats": {"$ifNull": ["$rating_stats", {
+            "sum": {"$multiply": [{"$ifNull": ["$rating", 0]}, {"$ifNull": ["$rate_number", 0]}]},
+            "count": {"$ifNull": ["$rate_number", 0]},
+            "histogram": {"$literal": empty_stats()["histogram"]},
+        }]}}},
+        {"$set": {
+            "rating_stats.sum": {"$add": ["$rating_stats.sum", rating]},
+            "rating_stats.count": {"$add": ["$rating_stats.count", 1]},
+            bucket: {"$add": [{"$ifNull": ["$" + bucket, 0]}, 1]},
+        }},
+        {"$set": {"rate_number": "$rating_stats.count"}},
+    ]
+
+
+async def record_rating(seller_id: str, rating: float):
+    """Add one rating to the seller's stats; returns the updated summary or None if no such seller."""
+    seller = await users_collection.find_one_and_update(
+        {"user_id": seller_id},
+        record_rating_pipeline(rating),
+        projection={"rating_stats": 1, "_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    return rating_summary(seller) if seller else None
+
+
+# ------------------------- Repair -------------------------
+def rebuild_pipeline(seller_id: str = None) -> list:
+    match = {"rating": {"$ne": None}}
+    if seller_id:
+        match["receiver_id"] = seller_id
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"seller": "$receiver_id", "star": {"$toInt": {"$min": [5, {"$floor": {"$add": ["$rating", 0.5]}}]}}},
+            "sum": {"$sum": "$rating"},
+            "count": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": "$_id.seller",
+            "sum": {"$sum": "$sum"},
+            "count": {"$sum": "$count"},
+            "histogram": {"$push": {"k": {"$toString": "$_id.star"}, "v": "$count"}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id",
+            "rating_stats": {
+                "sum": "$sum",
+                "count": "$count",
+                "histogram": {"$mergeObjects": [empty_stats()["histogram"], {"$arrayToObject": "$histogram"}]},
+            },
+        }},
+        {"$merge": {
+            "into": users_collection.name,
+            "on": "user_id",
+            "whenMatched": [{"$set": {"rating_stats": "$$new.rating_stats", "rate_number": "$$new.rating_stats.count"}}],
+            "whenNotMatched": "discard",
+        }},
+    ]
+
+
+async def rebuild_rating_stats(seller_id: str = None):
+    """Recompute stats from the feedbacks; sellers without ratings are reset to zero first."""
+    scope = {"user_id": seller_id} if seller_id else {"rating_stats": {"$exists": True}}
+    await users_collection.update_many(scope, {"$set": {"rating_stats": empty_stats(), "rate_number": 0}})
+    await feedback_collection.aggregate(rebuild_pipeline(seller_id)).to_list(length=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild seller rating stats from feedbacks")
+    parser.add_argument("--seller", help="only this user_id")
+    args = parser.parse_args()
+    asyncio.run(rebuild_rating_stats(args.seller))
+    print("Rating stats rebuilt")
@@ -1,29 +1,22 @@
 from fastapi import APIRouter, HTTPException, Depends
 from backend.database import users_collection
 from fastapi.security import OAuth2PasswordRequestForm
-from backend.registerloginbackend.jwt_handler import get_password_hash , verify_password, create_access_token, get_current_user, authenticate_user
+from backend.registerloginbackend.jwt_handler import hash_password, create_access_token, get_current_user, authenticate_user
 from pydantic import EmailStr
 from datetime import timedelta
 from typing import List
-import random
+from backend.ids import allocate_id
+from backend.ratings import empty_stats
 
 from backend.registerloginbackend.user_model import UserRegisterModel, UserLoginModel
 
 auth_router = APIRouter()
 
 async def generate_unique_user_id():
-    while True:
-        user_id = "user" + str(random.randint(10000, 99999))
-        existing_user = await users_collection.find_one({"user_id": user_id})
-        if not existing_user:
-            return user_id
+    return await allocate_id("user")
         
 async def generate_tax_id():
-    while True:
-        tax_id = str(random.randint(10000000000, 99999999999))
-        existing_user = await users_collection.find_one({"tax_id": tax_id})
-        if not existing_user:
-            return tax_id
+    return await allocate_id("tax_id")
 
 
 @auth_router.post("/register")
@@ -36,7 +29,7 @@ async def register(user: UserRegisterModel):
     # Start with the data from UserRegisterModel
     user_data = user.model_dump()
     user_data["email"] = user_email
-    user_data["password"] = get_password_hash(user.password)
+    user_data["password"] = await hash_password(user.password)
     
     # Generate a unique user ID
     user_data["user_id"] = await generate_unique_user_id()
@@ -47,6 +40,7 @@ async def register(user: UserRegisterModel):
     user_data["isVerified"] = False
     user_data["rating"] = 0.0
     user_data["rate_number"] = 0
+    user_data["rating_stats"] = empty_stats()
     user_data["feedbackReceived"] = []
     user_data["favorites"] = []
     user_data["offeredProducts"] = []
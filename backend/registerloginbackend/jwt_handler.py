@@ -1,15 +1,56 @@
+import asyncio
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from backend.database import users_collection
+from backend.response_cache import get_backend
 from passlib.context import CryptContext
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Principal cache: token subject (email) -> (expires_at, user document).
+# Entries are per process. invalidate_principal also bumps a counter on the
+# response cache backend; with Redis (several workers) every worker sees the
+# bump on its next request and drops its own entries.
+PRINCIPAL_CACHE_TTL = 60
+PRINCIPAL_CACHE_SIZE = 1024
+PRINCIPALS_COUNTER = "principals"
+_principal_cache = OrderedDict()
+_principal_generation = None
+
+# The user document loaded for the current request
+_request_user = ContextVar("request_user", default=None)
+
+# Changing SUSOLD_BCRYPT_ROUNDS makes existing hashes "need update"; they are
+# rehashed with the new cost the next time the user logs in.
+BCRYPT_ROUNDS = int(os.getenv("SUSOLD_BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL, so a thread pool spreads hashing across cores
+# without blocking the event loop. Work beyond the queue limit is rejected.
+HASH_WORKERS = int(os.getenv("SUSOLD_HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.getenv("SUSOLD_HASH_QUEUE_LIMIT", "64"))
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_lock = threading.Lock()
+_hash_stats = {"in_flight": 0, "running": 0, "completed": 0, "rejected": 0}
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/auth/token",  # Updated to match your prefix
@@ -22,6 +63,44 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def password_hash_stats() -> dict:
+    """Snapshot of the hashing pool; queue_depth is jobs waiting for a thread."""
+    with _hash_lock:
+        stats = dict(_hash_stats)
+    stats["queue_depth"] = stats["in_flight"] - stats["running"]
+    stats["workers"] = HASH_WORKERS
+    return stats
+
+def _tracked(fn, *args):
+    with _hash_lock:
+        _hash_stats["running"] += 1
+    try:
+        return fn(*args)
+    finally:
+        with _hash_lock:
+            _hash_stats["running"] -= 1
+            _hash_stats["completed"] += 1
+
+async def _run_hash_job(fn, *args):
+    with _hash_lock:
+        if _hash_stats["in_flight"] >= HASH_WORKERS + HASH_QUEUE_LIMIT:
+            _hash_stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please try again")
+        _hash_stats["in_flight"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, _tracked, fn, *args)
+    finally:
+        with _hash_lock:
+            _hash_stats["in_flight"] -= 1
+
+async def hash_password(password: str) -> str:
+    return await _run_hash_job(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Return (is_valid, new_hash); new_hash is set when the stored hash uses outdated settings."""
+    return await _run_hash_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -37,19 +116,84 @@ def decode_token(token: str):
     
 async def authenticate_user(email: str, password: str):
     user = await users_collection.find_one({"email": email})
-    if not user or not verify_password(password, user["password"]):
+    if not user:
         return None
+
+    is_valid, new_hash = await verify_and_update_password(password, user["password"])
+    if not is_valid:
+        return None
+
+    # Transparent rehash when the bcrypt cost factor was changed
+    if new_hash:
+        await users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        user["password"] = new_hash
     return user
 
+# Entries are copied in and out so a handler that edits its user cannot change the cache
+def _cache_get(email: str):
+    entry = _principal_cache.get(email)
+    if entry is None:
+        return None
+    expires_at, user = entry
+    if expires_at < time.monotonic():
+        del _principal_cache[email]
+        return None
+    _principal_cache.move_to_end(email)
+    return copy.deepcopy(user)
+
+def _cache_put(email: str, user: dict):
+    _principal_cache[email] = (time.monotonic() + PRINCIPAL_CACHE_TTL, copy.deepcopy(user))
+    _principal_cache.move_to_end(email)
+    while len(_principal_cache) > PRINCIPAL_CACHE_SIZE:
+        _principal_cache.popitem(last=False)
+
+async def _sync_principal_cache():
+    # A changed counter means some worker invalidated a user; we do not know which one.
+    # None (shared backend unreachable) means we cannot tell, so nothing cached is trusted.
+    global _principal_generation
+    generation = await get_backend().counter(PRINCIPALS_COUNTER)
+    if generation is None or generation != _principal_generation:
+        _principal_cache.clear()
+        _principal_generation = generation
+
+async def invalidate_principal(email: str = None, user_id: str = None):
+    """Drop a cached user after their role or profile changes, in every worker."""
+    await get_backend().bump(PRINCIPALS_COUNTER)
+    if email is not None:
+        _principal_cache.pop(email, None)
+    if user_id is not None:
+        for key, (_, user) in list(_principal_cache.items()):
+            if user.get("user_id") == user_id:
+                del _principal_cache[key]
+    current = _request_user.get()
+    if current is not None and (current.get("email") == email or current.get("user_id") == user_id):
+        _request_user.set(None)
+
+async def load_user(current_user: dict):
+    """Full user document of the authenticated user, loaded at most once per request.
+
+    Only use it for identity, role and profile fields; basket, favorites and
+    offerings change without invalidating the cache.
+    """
+    user = _request_user.get()
+    if user is not None and user.get("user_id") == current_user["user_id"]:
+        return user
+    return await users_collection.find_one({"user_id": current_user["user_id"]})
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     payload = decode_token(token)
     email = payload.get("sub")
     if email is None:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    user = await users_collection.find_one({"email": email})
+    await _sync_principal_cache()
+    user = _cache_get(email)
     if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+        user = await users_collection.find_one({"email": email}, {"password": 0})
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        _cache_put(email, user)
+    _request_user.set(user)
     
     # Return user_id and email to ensure all required fields are available
     return {
@@ -0,0 +1,245 @@
+"""Response cache for the public catalog reads.
+
+``cached_json`` serves a GET from the cache when it can, keyed on the path
+and the sorted query parameters, and answers ``If-None-Match`` with a 304.
+Every entry is tagged (``listing``, ``item:<item_id>``, ``title:<title>``,
+``categories``) and the write handlers drop exactly the tags they touch
+through ``invalidate_items`` / ``invalidate_categories``.
+
+The default backend is an in-process LRU, so with several API workers a
+write only clears the worker that handled it and the others catch up when
+the TTL expires. Set ``SUSOLD_CACHE_BACKEND=redis`` (and ``SUSOLD_CACHE_URL``,
+with the ``redis`` package installed) to share one cache between workers;
+the gunicorn profile does this whenever ``SUSOLD_CACHE_URL`` is set.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import quote, urlencode
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+from backend.facets import clear_facet_cache
+
+CACHE_TTL = int(os.getenv("SUSOLD_CACHE_TTL", "60"))
+CACHE_SIZE = int(os.getenv("SUSOLD_CACHE_SIZE", "2048"))
+REDIS_TIMEOUT = float(os.getenv("SUSOLD_CACHE_TIMEOUT", "0.5"))
+# Browsers revalidate quickly; the ETag makes that a cheap 304
+CACHE_CONTROL = "public, max-age=15, must-revalidate"
+
+LISTING_TAG = "listing"
+# Invalidation counters; other per-process caches (e.g. the principal cache) add their own
+RESPONSES_COUNTER = "responses"
+CATEGORIES_TAG = "categories"
+
+
+# ------------------------- Backends -------------------------
+class MemoryBackend:
+    """Per-process LRU with a TTL and a tag -> keys index for invalidation."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()  # key -> (expires_at, etag, body, tags)
+        self.tags = {}
+        self.counters = {}
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    async def set(self, key: str, etag: str, body: bytes, tags: list, ttl: int):
+        self._drop(key)
+        self.entries[key] = (time.monotonic() + ttl, etag, body, tags)
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.size:
+            self._drop(next(iter(self.entries)))
+
+    async def invalidate(self, tags: list):
+        await self.bump(RESPONSES_COUNTER)
+        for tag in tags:
+            for key in self.tags.pop(tag, set()):
+                self._drop(key)
+
+    async def counter(self, name: str):
+        return self.counters.get(name, 0)
+
+    async def bump(self, name: str):
+        self.counters[name] = self.counters.get(name, 0) + 1
+
+    async def discard(self, key: str):
+        self._drop(key)
+
+    async def clear(self):
+        self.entries.clear()
+        self.tags.clear()
+        self.counters.clear()
+
+    def _drop(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[3]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class RedisBackend:
+    """Cache shared by every worker; tag sets live next to the entries.
+
+    When Redis is unreachable the request skips the cache instead of failing.
+    """
+
+    prefix = "susold:cache:"
+
+    def __init__(self):
+        try:
+            import redis.asyncio as redis
+            from redis.exceptions import RedisError
+        except ImportError:
+            raise RuntimeError("SUSOLD_CACHE_BACKEND=redis needs the 'redis' package")
+        self.errors = (RedisError, OSError)
+        # Short timeouts: a dead cache must not hold the request for long
+        self.redis = redis.from_url(
+            os.getenv("SUSOLD_CACHE_URL", "redis://localhost:6379/0"),
+            socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT
+        )
+
+    async def get(self, key: str):
+        try:
+            raw = await self.redis.get(self.prefix + key)
+        except self.errors as e:
+            print("Response cache read skipped:", e)
+            return None
+        if raw is None:
+            return None
+        etag, body = raw.split(b"\n", 1)
+        return etag.decode(), body
+
+    async def set(self, key: str, etag: str, body: bytes, tags: list, ttl: int):
+        pipe = self.redis.pipeline()
+        pipe.set(self.prefix + key, etag.encode() + b"\n" + body, ex=ttl)
+        for tag in tags:
+            pipe.sadd(self.prefix + "tag:" + tag, key)
+            pipe.expire(self.prefix + "tag:" + tag, ttl)
+        try:
+            await pipe.execute()
+        except self.errors as e:
+            print("Response cache write skipped:", e)
+
+    async def invalidate(self, tags: list):
+        try:
+            # Bumped before the delete; see cached_json
+            await self.redis.incr(self.prefix + "counter:" + RESPONSES_COUNTER)
+            for tag in tags:
+                tag_key = self.prefix + "tag:" + tag
+                keys = await self.redis.smembers(tag_key)
+                await self.redis.delete(tag_key, *(self.prefix + k.decode() for k in keys))
+        except self.errors as e:
+            # Entries left behind expire with their TTL
+            print("Response cache invalidation failed:", e)
+
+    async def counter(self, name: str):
+        """Shared counter value; None when Redis cannot be reached."""
+        try:
+            return await self.redis.get(self.prefix + "counter:" + name)
+        except self.errors as e:
+            print("Response cache read skipped:", e)
+            return None
+
+    async def bump(self, name: str):
+        try:
+            await self.redis.incr(self.prefix + "counter:" + name)
+        except self.errors as e:
+            print("Response cache write skipped:", e)
+
+    async def discard(self, key: str):
+        try:
+            await self.redis.delete(self.prefix + key)
+        except self.errors as e:
+            print("Response cache write skipped:", e)
+
+    async def clear(self):
+        async for key in self.redis.scan_iter(match=self.prefix + "*"):
+            await self.redis.delete(key)
+
+
+CACHE_BACKENDS = {
+    "memory": MemoryBackend,
+    "redis": RedisBackend,
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = CACHE_BACKENDS[os.getenv("SUSOLD_CACHE_BACKEND", "memory")]()
+    return _backend
+
+
+# ------------------------- Reads -------------------------
+def cache_key(request: Request) -> str:
+    # Parameter order and empty values do not create separate entries
+    # Re-encode both parts so a decoded "&" or "=" inside a value cannot mimic another query
+    params = sorted((k, v) for k, v in request.query_params.multi_items() if v != "")
+    return quote(request.scope["path"]) + "?" + urlencode(params)
+
+
+def _response(body: bytes, etag: str, request: Request) -> Response:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def cached_json(request: Request, tags: list, build, ttl: int = CACHE_TTL) -> Response:
+    """Return the cached response for ``request`` or build, store and return it.
+
+    ``build`` is an async callable returning the JSON-able payload; errors it
+    raises (e.g. a 404 HTTPException) are not cached.
+    """
+    key = cache_key(request)
+    backend = get_backend()
+
+    hit = await backend.get(key)
+    if hit is not None:
+        etag, body = hit
+        return _response(body, etag, request)
+
+    # A write that invalidates while build() runs may have changed what it read;
+    # such a payload is still returned but never stored
+    generation = await backend.counter(RESPONSES_COUNTER)
+    body = json.dumps(jsonable_encoder(await build())).encode()
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    if await backend.counter(RESPONSES_COUNTER) == generation:
+        await backend.set(key, etag, body, tags, ttl)
+        # An invalidation between the check and the write may have missed the new entry
+        if await backend.counter(RESPONSES_COUNTER) != generation:
+            await backend.discard(key)
+    return _response(body, etag, request)
+
+
+# ------------------------- Invalidation -------------------------
+async def invalidate_items(item_ids: list, titles: list = ()):
+    """Drop every listing plus the item and title pages of the changed items."""
+    clear_facet_cache()
+    tags = [LISTING_TAG] + [f"item:{item_id}" for item_id in item_ids] + [f"title:{title}" for title in titles if title]
+    await get_backend().invalidate(tags)
+
+
+async def invalidate_categories():
+    await get_backend().invalidate([CATEGORIES_TAG])
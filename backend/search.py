@@ -0,0 +1,146 @@
+"""Product search terms and ranked search queries.
+
+Each item carries a ``search`` sub-document built from its text fields:
+
+- ``terms``: every token of title/description/brand/category in folded form
+  plus its Turkish and English stems
+- ``title``: the same, for the title only (ranked higher)
+- ``prefixes``: 2..15 character prefixes of title and brand tokens, for typeahead
+
+``search.terms`` and ``search.prefixes`` are multikey indexes, so a search
+reads only the items holding the query terms. Items saved before this field
+existed are backfilled once by the index migration step (``backend/indexes.py``)
+or by hand with ``python -m backend.search``; add ``--reindex`` to rebuild the
+terms of every item (e.g. after changing the tokenizer).
+"""
+import argparse
+import asyncio
+import re
+from functools import lru_cache
+import snowballstemmer
+from pymongo import UpdateOne
+from backend.database import item_collection
+
+SEARCHABLE_FIELDS = ("title", "description", "brand", "category", "sub_category")
+# Hidden from API responses; only the search queries read it
+ITEM_PUBLIC_PROJECTION = {"search": 0}
+
+MIN_PREFIX = 2
+MAX_PREFIX = 15
+TITLE_WEIGHT = 3
+REINDEX_BATCH_SIZE = 500
+# The stemmers are pure Python and listing vocabularies repeat a lot
+TERM_CACHE_SIZE = 65536
+
+STOPWORDS = {
+    "a", "an", "and", "for", "in", "of", "on", "the", "to", "with",
+    "bir", "bu", "da", "de", "icin", "için", "ile", "ve", "veya",
+}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_TURKISH_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+_STEMMERS = [snowballstemmer.stemmer("turkish"), snowballstemmer.stemmer("english")]
+
+
+# ------------------------- Text analysis -------------------------
+def tokenize(text) -> list:
+    if not text:
+        return []
+    words = _TOKEN.findall(str(text).translate(_TURKISH_UPPER).lower())
+    return [word for word in words if word not in STOPWORDS]
+
+
+@lru_cache(maxsize=TERM_CACHE_SIZE)
+def term_variants(token: str) -> frozenset:
+    """Folded token plus its folded stems; documents and queries use the same variants."""
+    variants = {token.translate(_FOLD)}
+    for stemmer in _STEMMERS:
+        stem = stemmer.stemWord(token)
+        if len(stem) >= MIN_PREFIX:
+            variants.add(stem.translate(_FOLD))
+    return frozenset(variants)
+
+
+def _terms(tokens: list) -> set:
+    return set().union(*(term_variants(token) for token in tokens)) if tokens else set()
+
+
+def search_fields(item: dict) -> dict:
+    """The ``search`` sub-document for an item; merge it into every insert/update."""
+    title_tokens = tokenize(item.get("title"))
+    brand_tokens = tokenize(item.get("brand"))
+    other_tokens = brand_tokens + [
+        token for field in ("description", "category", "sub_category") for token in tokenize(item.get(field))
+    ]
+
+    title_terms = _terms(title_tokens)
+    prefixes = {
+        token.translate(_FOLD)[:size]
+        for token in title_tokens + brand_tokens
+        for size in range(MIN_PREFIX, min(len(token), MAX_PREFIX) + 1)
+    }
+    return {"search": {
+        "terms": sorted(title_terms | _terms(other_tokens)),
+        "title": sorted(title_terms),
+        "prefixes": sorted(prefixes),
+    }}
+
+
+# ------------------------- Queries -------------------------
+def search_pipeline(text: str, base_query: dict, limit: int, typeahead: bool = False) -> list:
+    """Aggregation that matches every query token and ranks by relevance.
+
+    With ``typeahead`` the last token is matched as a prefix. Returns an empty
+    list when the text has no searchable tokens.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return []
+
+    prefix = None
+    if typeahead:
+        prefix = tokens.pop().translate(_FOLD)[:MAX_PREFIX]
+
+    clauses = []
+    score = []
+    for token in tokens:
+        variants = sorted(term_variants(token))
+        clauses.append({"search.terms": {"$in": variants}})
+        in_title = {"$gt": [{"$size": {"$setIntersection": [{"$ifNull": ["$search.title", []]}, variants]}}, 0]}
+        score.append({"$cond": [in_title, TITLE_WEIGHT, 1]})
+    if prefix:
+        clauses.append({"search.prefixes": prefix})
+        score.append(1)
+
+    return [
+        {"$match": {"$and": [base_query, *clauses]} if base_query else {"$and": clauses}},
+        {"$addFields": {"relevance": {"$add": score}}},
+        {"$sort": {"relevance": -1, "likes": -1, "_id": 1}},
+        {"$limit": limit},
+        {"$project": ITEM_PUBLIC_PROJECTION},
+    ]
+
+
+# ------------------------- Backfill -------------------------
+async def reindex_items(only_missing: bool = True) -> int:
+    query = {"search": {"$exists": False}} if only_missing else {}
+    projection = {field: 1 for field in SEARCHABLE_FIELDS}
+
+    updated = 0
+    batch = []
+    async for item in item_collection.find(query, projection):
+        batch.append(UpdateOne({"_id": item["_id"]}, {"$set": search_fields(item)}))
+        if len(batch) >= REINDEX_BATCH_SIZE:
+            updated += (await item_collection.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await item_collection.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build product search terms")
+    parser.add_argument("--reindex", action="store_true", help="rebuild terms for every item, not only missing ones")
+    args = parser.parse_args()
+    print(f"Indexed {asyncio.run(reindex_items(only_missing=not args.reindex))} items")
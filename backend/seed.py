@@ -0,0 +1,435 @@
+"""Synthetic catalog, users, orders, feedback and refunds for benchmarks and index tuning.
+
+    SUSOLD_DB_NAME=susold_bench python -m backend.seed --users 100000 --items 90000 --orders 400000
+    python -m backend.seed --users 5000 --items 20000 --orders 30000 --item-skew 1.3 --workers 4
+
+Documents have the same shape the API writes (``UserRegisterModel`` plus the
+register defaults, ``ProductCreate`` plus the search terms, complete-order's
+order, send_feedback's feedback, refund-request's refund). Every document is
+a pure function of ``(seed, kind, n)``, so the collections are generated in
+independent ranges by a pool of processes, each inserting with
+``insert_many`` batches. Indexes, sellers' ``offeredProducts`` and rating
+stats are built server-side once everything is loaded.
+
+Skew: items, buyers and sellers are drawn from Zipf distributions
+(``--item-skew`` / ``--buyer-skew`` / ``--seller-skew``, 0 = uniform), so a
+few items collect most orders, likes and favorites and a few users place
+most orders. Orders only reference sold items (the first ``--sold-fraction``
+of the catalog); popular ones appear in many orders. Approved refunds do not
+restock their items.
+
+Seeding drops the target collections first, so it refuses to run against the
+default ``cs308`` database; set ``SUSOLD_DB_NAME`` to a scratch database.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from backend.database import (
+    MONGO_URI, MONGO_DB_NAME, users_collection, item_collection, order_collection,
+    feedback_collection, refund_collection, category_collection
+)
+from backend.ids import counters_collection
+from backend.indexes import apply_indexes, migrations_collection
+from backend.ratings import empty_stats, rebuild_rating_stats
+from backend.search import search_fields
+
+PROTECTED_DATABASES = {"cs308"}
+BATCH_SIZE = 1000
+# Documents per worker task; small enough to spread over the pool, large enough to batch well
+CHUNK_SIZE = 20000
+
+# item ids must match ^item\d{5}$, so at most 90000 items fit
+FIRST_ITEM = 10000
+MAX_ITEMS = 99999 - FIRST_ITEM + 1
+FIRST_USER = 100000
+FIRST_ORDER = 100000
+FIRST_TAX_ID = 10000000000
+
+CATEGORIES = {
+    "Electronics": ["Phone", "Laptop", "Headphones", "Monitor"],
+    "Books": ["Textbook", "Novel", "Notebook"],
+    "Furniture": ["Desk", "Chair", "Lamp", "Shelf"],
+    "Clothing": ["Jacket", "Shoes", "Sweater"],
+    "Sports": ["Bicycle", "Racket", "Ball"],
+}
+BRANDS = ["Apple", "Samsung", "Ikea", "Nike", "Adidas", "Lenovo", "Sony", "Pegasus", "Koton", "Decathlon"]
+CONDITIONS = ["New", "Like New", "Good", "Fair"]
+ADJECTIVES = ["used", "clean", "cheap", "barely used", "vintage", "portable", "large", "small", "blue", "black"]
+COMMENTS = ["Great seller, fast delivery.", "Item as described.", "Okay but a bit late.", "Would buy again!", "Not as described."]
+DORMS = ["A", "B", "C", "D", "E"]
+# Delivery state of sold items, by weight
+SOLD_STATES = (("delivered", 0.8), ("inTransit", 0.1), ("processing", 0.1))
+REFUND_STATES = (("pending", 0.5), ("approved", 0.3), ("rejected", 0.2))
+
+DEFAULT_PLAN = {
+    "seed": 0,
+    "users": 1000,
+    "items": 5000,
+    "orders": 2000,
+    "sold_fraction": 0.4,
+    "feedback_rate": 0.5,
+    "refund_rate": 0.05,
+    "item_skew": 1.1,
+    "buyer_skew": 0.8,
+    "seller_skew": 0.8,
+    "favorites": 5,
+    "days": 365,
+    "until": "2025-06-01T00:00:00+00:00",
+    "password_hash": "",
+    "batch_size": BATCH_SIZE,
+}
+
+
+def item_id(n: int) -> str:
+    return f"item{FIRST_ITEM + n}"
+
+
+def user_id(n: int) -> str:
+    return f"user{FIRST_USER + n}"
+
+
+def order_id(n: int) -> str:
+    return f"order{FIRST_ORDER + n}"
+
+
+def user_email(n: int) -> str:
+    return f"bench.user{n}@sabanciuniv.edu"
+
+
+# ------------------------- Sampling -------------------------
+def _rng(plan: dict, kind: str, n: int) -> random.Random:
+    return random.Random(f"{plan['seed']}:{kind}:{n}")
+
+
+@lru_cache(maxsize=16)
+def zipf_table(size: int, skew: float) -> list:
+    """Cumulative Zipf weights for ranks 1..size; skew 0 is uniform."""
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, size + 1)))
+
+
+def zipf_index(rng: random.Random, size: int, skew: float) -> int:
+    """Index in [0, size) drawn with probability proportional to 1 / (index + 1) ** skew."""
+    table = zipf_table(size, skew)
+    return min(bisect.bisect_left(table, rng.random() * table[-1]), size - 1)
+
+
+def _weighted(rng: random.Random, choices) -> str:
+    return rng.choices([value for value, _ in choices], [weight for _, weight in choices])[0]
+
+
+def sold_count(plan: dict) -> int:
+    return max(1, int(plan["items"] * plan["sold_fraction"])) if plan["items"] else 0
+
+
+def item_price(plan: dict, n: int) -> float:
+    return round(_rng(plan, "price", n).lognormvariate(4.5, 1.0), 2)
+
+
+def item_seller(plan: dict, n: int) -> int:
+    return zipf_index(_rng(plan, "seller", n), plan["users"], plan["seller_skew"])
+
+
+def item_state(plan: dict, n: int) -> str:
+    if n >= sold_count(plan):
+        return "stillInStock"
+    return _weighted(_rng(plan, "state", n), SOLD_STATES)
+
+
+def order_plan(plan: dict, n: int):
+    """(buyer, item indexes, date) of order ``n``."""
+    rng = _rng(plan, "order", n)
+    buyer = zipf_index(rng, plan["users"], plan["buyer_skew"])
+    items = sorted({zipf_index(rng, sold_count(plan), plan["item_skew"]) for _ in range(rng.randint(1, 3))})
+    date = datetime.fromisoformat(plan["until"]) - timedelta(seconds=rng.randrange(plan["days"] * 86400))
+    return buyer, items, date
+
+
+# ------------------------- Documents -------------------------
+def make_user(plan: dict, n: int) -> dict:
+    rng = _rng(plan, "user", n)
+    favorites = {zipf_index(rng, plan["items"], plan["item_skew"]) for _ in range(rng.randint(0, 2 * plan["favorites"]))} if plan["items"] else set()
+    return {
+        "name": f"Bench{n}",
+        "lastname": "User",
+        "email": user_email(n),
+        "password": plan["password_hash"],
+        "photo": [],
+        "credit_cards": [],
+        "addresses": [f"{rng.choice(DORMS)} Block, Room {rng.randint(100, 499)}"],
+        # user 0 runs the dashboards in the benchmarks
+        "isManager": n == 0,
+        "isSalesManager": n == 0,
+        "user_id": user_id(n),
+        "tax_id": str(FIRST_TAX_ID + n),
+        "isVerified": rng.random() < 0.8,
+        "rating": 0.0,
+        "rate_number": 0,
+        "rating_stats": empty_stats(),
+        "feedbackReceived": [],
+        "favorites": [item_id(i) for i in sorted(favorites)],
+        # filled from the items once they are loaded
+        "offeredProducts": [],
+        "basket": [],
+    }
+
+
+def make_item(plan: dict, n: int) -> dict:
+    rng = _rng(plan, "item", n)
+    category = rng.choice(list(CATEGORIES))
+    sub_category = rng.choice(CATEGORIES[category])
+    brand = rng.choice(BRANDS)
+    price = item_price(plan, n)
+    state = item_state(plan, n)
+    item = {
+        "title": f"{brand} {sub_category}",
+        "category": category,
+        "sub_category": sub_category,
+        "brand": brand,
+        "price": price,
+        "condition": rng.choice(CONDITIONS),
+        "age": rng.randint(0, 6),
+        "course": None,
+        "dorm": rng.random() < 0.5,
+        "verified": rng.random() < 0.7,
+        "warranty_status": None,
+        "inStock": state == "stillInStock",
+        "available_now": True,
+        "isSold": state,
+        "returnable": rng.random() < 0.6,
+        "description": f"{rng.choice(ADJECTIVES)} {sub_category.lower()} from {brand}",
+        "image": "None",
+        "item_id": item_id(n),
+        "user_id": user_id(item_seller(plan, n)),
+        "discount_rate": 0.0,
+        "discounted_price": None,
+        "cost": round(price * 0.6, 2),
+        # Popular (low-rank) items collect most likes
+        "likes": int(rng.uniform(0.5, 1.5) * 500 / (n + 1) ** plan["item_skew"]),
+        "created_at": datetime.fromisoformat(plan["until"]) - timedelta(seconds=rng.randrange(plan["days"] * 86400)),
+    }
+    item.update(search_fields(item))
+    return item
+
+
+def make_order(plan: dict, n: int) -> dict:
+    buyer, items, date = order_plan(plan, n)
+    return {
+        "order_id": order_id(n),
+        "item_ids": [item_id(i) for i in items],
+        "shipping_address": "A Block, Room 101",
+        "payment_info": "**** **** **** 4242",
+        "user_id": user_id(buyer),
+        "date": date,
+        "total_price": round(sum(item_price(plan, i) for i in items), 2),
+        "number_of_items": len(items),
+    }
+
+
+def make_feedback(plan: dict, n: int):
+    """Feedback from the buyer of order ``n`` to the seller of its first item, or None."""
+    rng = _rng(plan, "feedback", n)
+    if rng.random() >= plan["feedback_rate"]:
+        return None
+    buyer, items, date = order_plan(plan, n)
+    if item_state(plan, items[0]) != "delivered":
+        return None
+    rating = rng.choice([1, 2, 3, 4, 4, 5, 5, 5])
+    comment = rng.choice(COMMENTS) if rng.random() < 0.6 else None
+    return {
+        "rating": rating,
+        "comment": comment,
+        "sender_id": user_id(buyer),
+        "receiver_id": user_id(item_seller(plan, items[0])),
+        "date": date + timedelta(days=rng.randint(1, 10)),
+        "isCommentVerified": comment is not None and rng.random() < 0.7,
+        "item": item_id(items[0]),
+    }
+
+
+def make_refund(plan: dict, n: int):
+    rng = _rng(plan, "refund", n)
+    if rng.random() >= plan["refund_rate"]:
+        return None
+    buyer, items, _ = order_plan(plan, n)
+    delivered = [i for i in items if item_state(plan, i) == "delivered"]
+    if not delivered:
+        return None
+    amount = round(sum(item_price(plan, i) for i in delivered), 2)
+    return {
+        "user_id": user_id(buyer),
+        "item_ids": [item_id(i) for i in delivered],
+        "order_id": order_id(n),
+        "total_price": amount,
+        "refund_amount": amount,
+        "status": _weighted(rng, REFUND_STATES),
+    }
+
+
+# kind -> (collection name, document builder, plan key holding the range size)
+GENERATORS = {
+    "users": (users_collection.name, make_user, "users"),
+    "items": (item_collection.name, make_item, "items"),
+    "orders": (order_collection.name, make_order, "orders"),
+    "feedbacks": (feedback_collection.name, make_feedback, "orders"),
+    "refund_requests": (refund_collection.name, make_refund, "orders"),
+}
+
+
+# ------------------------- Loading -------------------------
+_sync_client = None
+
+
+def _sync_db():
+    # Worker processes write with plain pymongo; one client per process
+    global _sync_client
+    if _sync_client is None:
+        from pymongo import MongoClient
+        _sync_client = MongoClient(MONGO_URI)
+    return _sync_client[MONGO_DB_NAME]
+
+
+def load_range(plan: dict, kind: str, start: int, stop: int) -> int:
+    """Generate documents ``start..stop`` of ``kind`` and insert them; returns the inserted count."""
+    collection_name, build, _ = GENERATORS[kind]
+    collection = _sync_db()[collection_name]
+    inserted = 0
+    batch = []
+    for n in range(start, stop):
+        doc = build(plan, n)
+        if doc is None:
+            continue
+        batch.append(doc)
+        if len(batch) >= plan["batch_size"]:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+    if batch:
+        inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+    return inserted
+
+
+def tasks(plan: dict) -> list:
+    return [
+        (kind, start, min(start + CHUNK_SIZE, plan[size_key]))
+        for kind, (_, _, size_key) in GENERATORS.items()
+        for start in range(0, plan[size_key], CHUNK_SIZE)
+    ]
+
+
+async def link_offerings():
+    """Set every seller's offeredProducts from the items they sell, in one aggregation."""
+    await item_collection.aggregate([
+        {"$group": {"_id": "$user_id", "offeredProducts": {"$push": "$item_id"}}},
+        {"$project": {"_id": 0, "user_id": "$_id", "offeredProducts": 1}},
+        {"$merge": {
+            "into": users_collection.name,
+            "on": "user_id",
+            "whenMatched": [{"$set": {"offeredProducts": "$$new.offeredProducts"}}],
+            "whenNotMatched": "discard",
+        }},
+    ]).to_list(length=None)
+
+
+async def set_counters(users: int, items: int, orders: int):
+    """Point the id sequences past the seeded ids so the API allocates fresh ones."""
+    for kind, seq in (("user", users), ("item", items), ("order", orders), ("tax_id", users)):
+        await counters_collection.update_one({"_id": kind}, {"$set": {"seq": seq}}, upsert=True)
+
+
+async def seed_dataset(users: int, items: int, orders: int, seed: int = 0, password_hash: str = "",
+                       workers: int = None, **options) -> dict:
+    """Drop and regenerate the dataset; returns the inserted count per collection.
+
+    ``options`` override the other ``DEFAULT_PLAN`` entries (rates, skews,
+    ``days``, ``until``, ``batch_size``). Every user shares ``password_hash``
+    so seeding does not spend time in bcrypt.
+    """
+    if MONGO_DB_NAME in PROTECTED_DATABASES:
+        raise RuntimeError(f"Refusing to seed '{MONGO_DB_NAME}'; set SUSOLD_DB_NAME to a scratch database")
+    if items > MAX_ITEMS:
+        raise ValueError(f"At most {MAX_ITEMS} items fit the itemNNNNN id format")
+    if users < 1:
+        raise ValueError("At least one user is needed")
+    if orders and not items:
+        raise ValueError("Orders need items")
+
+    plan = dict(DEFAULT_PLAN, **options)
+    plan.update(seed=seed, users=users, items=items, orders=orders, password_hash=password_hash)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    # Dropping removes the indexes too, so the manifest is re-applied from scratch
+    for collection in (users_collection, item_collection, order_collection, feedback_collection,
+                       refund_collection, category_collection, counters_collection, migrations_collection):
+        await collection.drop()
+
+    loop = asyncio.get_running_loop()
+    counts = dict.fromkeys(GENERATORS, 0)
+    if workers == 1:
+        for kind, start, stop in tasks(plan):
+            counts[kind] += await asyncio.to_thread(load_range, plan, kind, start, stop)
+    else:
+        # spawn: the parent's Motor client must not be forked into the workers
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            jobs = [(kind, loop.run_in_executor(pool, load_range, plan, kind, start, stop)) for kind, start, stop in tasks(plan)]
+            for kind, job in jobs:
+                counts[kind] += await job
+
+    counts["categories"] = len((await category_collection.insert_many([{"name": name} for name in CATEGORIES])).inserted_ids)
+    loaded = time.perf_counter()
+
+    await apply_indexes()
+    await link_offerings()
+    await rebuild_rating_stats()
+    await set_counters(users, items, orders)
+
+    print(f"Seeded {MONGO_DB_NAME}: {counts} "
+          f"(load {loaded - started:.1f}s, indexes and links {time.perf_counter() - loaded:.1f}s)")
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic SuSOLD dataset in a scratch database")
+    parser.add_argument("--users", type=int, default=DEFAULT_PLAN["users"])
+    parser.add_argument("--items", type=int, default=DEFAULT_PLAN["items"], help=f"at most {MAX_ITEMS} (itemNNNNN ids)")
+    parser.add_argument("--orders", type=int, default=DEFAULT_PLAN["orders"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sold-fraction", type=float, default=DEFAULT_PLAN["sold_fraction"], help="share of items that are sold")
+    parser.add_argument("--feedback-rate", type=float, default=DEFAULT_PLAN["feedback_rate"], help="share of orders with feedback")
+    parser.add_argument("--refund-rate", type=float, default=DEFAULT_PLAN["refund_rate"], help="share of orders with a refund request")
+    parser.add_argument("--item-skew", type=float, default=DEFAULT_PLAN["item_skew"], help="Zipf exponent of item popularity")
+    parser.add_argument("--buyer-skew", type=float, default=DEFAULT_PLAN["buyer_skew"], help="Zipf exponent of orders per buyer")
+    parser.add_argument("--seller-skew", type=float, default=DEFAULT_PLAN["seller_skew"], help="Zipf exponent of items per seller")
+    parser.add_argument("--days", type=int, default=DEFAULT_PLAN["days"], help="orders are spread over this many days")
+    parser.add_argument("--until", default=None, help="ISO date of the newest order (default: today)")
+    parser.add_argument("--password", default="Bench1234", help="password of every generated user")
+    parser.add_argument("--workers", type=int, default=None, help="loader processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from backend.registerloginbackend.jwt_handler import get_password_hash
+
+    args = parse_args(argv)
+    until = datetime.fromisoformat(args.until) if args.until else datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    asyncio.run(seed_dataset(
+        args.users, args.items, args.orders, seed=args.seed,
+        password_hash=get_password_hash(args.password), workers=args.workers,
+        sold_fraction=args.sold_fraction, feedback_rate=args.feedback_rate, refund_rate=args.refund_rate,
+        item_skew=args.item_skew, buyer_skew=args.buyer_skew, seller_skew=args.seller_skew,
+        days=args.days, until=until.isoformat(), batch_size=args.batch_size,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+
+# ------------------------- Streamed JSON responses -------------------------
+async def json_array_chunks(docs, transform=None):
+    """Yield a JSON array one element at a time from an async iterable (e.g. a Motor cursor)."""
+    yield "["
+    first = True
+    async for doc in docs:
+        if transform is not None:
+            doc = transform(doc)
+        yield ("" if first else ",") + json.dumps(jsonable_encoder(doc))
+        first = False
+    yield "]"
+
+
+def stream_json_array(docs, transform=None) -> StreamingResponse:
+    return StreamingResponse(json_array_chunks(docs, transform), media_type="application/json")
+
+
+# ------------------------- NDJSON / CSV -------------------------
+EXPORT_FORMAT_PATTERN = "^(ndjson|csv)$"
+EXPORT_BATCH_SIZE = 500
+
+
+def select_columns(columns: Optional[str], allowed: list) -> list:
+    """Parse a comma separated ``columns`` query value against the exportable fields."""
+    if not columns:
+        return list(allowed)
+    selected = [column.strip() for column in columns.split(",") if column.strip()]
+    unknown = [column for column in selected if column not in allowed]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown export columns: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return selected
+
+
+def export_projection(columns: list) -> dict:
+    return {"_id": 0, **{column: 1 for column in columns}}
+
+
+async def ndjson_chunks(docs, transform=None):
+    async for doc in docs:
+        if transform is not None:
+            doc = transform(doc)
+        yield json.dumps(jsonable_encoder(doc)) + "\n"
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ";".join(str(v) for v in value)
+    return value
+
+
+async def csv_chunks(docs, columns: list, transform=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    async for doc in docs:
+        if transform is not None:
+            doc = transform(doc)
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([_csv_value(doc.get(column)) for column in columns])
+        yield buffer.getvalue()
+
+
+def stream_export(docs, fmt: str, columns: list, filename: str, transform=None) -> StreamingResponse:
+    """Stream ``docs`` as NDJSON or CSV without building the result in memory."""
+    if fmt == "csv":
+        body, media_type = csv_chunks(docs, columns, transform), "text/csv"
+    else:
+        body, media_type = ndjson_chunks(docs, transform), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"}
+    )
@@ -132,20 +132,18 @@ async def test_mark_product_out_of_stock():
     with patch("UserProfile_backend.main_routes.users_collection.find_one", new_callable=AsyncMock) as mock_user_find_one, \
          patch("UserProfile_backend.main_routes.item_collection.find_one", new_callable=AsyncMock) as mock_item_find_one, \
          patch("UserProfile_backend.main_routes.item_collection.update_one", new_callable=AsyncMock) as mock_item_update, \
-         patch("UserProfile_backend.main_routes.users_collection.find", new_callable=MagicMock) as mock_users_find, \
-         patch("UserProfile_backend.main_routes.users_collection.update_one", new_callable=AsyncMock) as mock_user_update:
+         patch("UserProfile_backend.main_routes.users_collection.update_many", new_callable=AsyncMock) as mock_user_update:
 
         mock_user_find_one.return_value = sample_manager
         mock_item_find_one.return_value = {
             "item_id": "item123", "inStock": True, "user_id": "seller1"
         }
-        mock_users_find.return_value.__aiter__.return_value = [
-            {"user_id": "u1", "basket": ["item123"]}
-        ]
+        mock_user_update.return_value.modified_count = 1
 
         response = client.patch("/api/change-stock-status?item_id=item123&in_stock=false")
         assert response.status_code == 200
         assert "out of stock" in response.json()["message"]
+        assert response.json()["users_updated"] == 1
 
     # Clean up
     app.dependency_overrides = {}
@@ -243,13 +241,11 @@ async def test_get_items_without_price_as_sales_manager():
 async def test_get_sales_summary():
     app.dependency_overrides[get_current_user] = lambda: sample_sales_manager
 
-    with patch("HomePage_backend.app.routes.home.order_collection.find", new_callable=MagicMock) as mock_order_find, \
-         patch("HomePage_backend.app.routes.home.item_collection.find_one", new_callable=AsyncMock) as mock_item_find:
+    with patch("HomePage_backend.app.routes.home.order_collection.aggregate", new_callable=MagicMock) as mock_aggregate:
 
-        mock_order_find.return_value.to_list = AsyncMock(return_value=[
-            {"item_ids": ["item123"], "total_price": 150}
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=[
+            {"totals": [{"_id": None, "revenue": 150, "cost": 70}]}
         ])
-        mock_item_find.return_value = {"item_id": "item123", "price": 150, "cost": 70}
 
         response = client.get("/api/home/sales-summary?start_date=2024-05-01&end_date=2024-05-30")
         assert response.status_code == 200
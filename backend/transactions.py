@@ -0,0 +1,31 @@
+import os
+from backend.database import client
+
+# "auto" probes the deployment once; "off" forces plain writes (e.g. a local standalone mongod)
+TRANSACTIONS_MODE = os.getenv("SUSOLD_MONGO_TRANSACTIONS", "auto")
+
+_supports_transactions = None
+
+
+async def supports_transactions() -> bool:
+    """Transactions need a replica set or a sharded cluster; a standalone server has neither."""
+    global _supports_transactions
+    if TRANSACTIONS_MODE == "off":
+        return False
+    if _supports_transactions is None:
+        hello = await client.admin.command("hello")
+        _supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _supports_transactions
+
+
+async def run_in_transaction(callback):
+    """Run ``callback(session)`` atomically where the deployment allows it.
+
+    On a standalone server ``callback(None)`` runs directly, so the callback
+    must pass ``session=`` through to every write and keep them idempotent
+    enough to be retried by hand.
+    """
+    if not await supports_transactions():
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
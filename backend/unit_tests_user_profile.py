@@ -3,6 +3,7 @@ import pytest
 from httpx import AsyncClient, ASGITransport
 import pytest_asyncio
 from unittest.mock import AsyncMock, patch
+from bson import ObjectId
 from datetime import datetime, timedelta, timezone
 from backend.main import app
 from backend.registerloginbackend.jwt_handler import get_current_user
@@ -24,6 +25,12 @@ def override_get_current_user():
     yield
     app.dependency_overrides = {}
 
+@pytest.fixture(autouse=True)
+def no_transactions():
+    # Test runs have no replica set; writes go through the plain path
+    with patch("backend.transactions.supports_transactions", AsyncMock(return_value=False)):
+        yield
+
 @pytest_asyncio.fixture
 async def client():
     transport = ASGITransport(app=app)
@@ -42,10 +49,14 @@ async def test_get_user_orders_not_found(client: AsyncClient):
 async def test_get_user_orders_success(client: AsyncClient):
     with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
          patch("backend.database.order_collection.find") as mock_find_orders, \
-         patch("backend.database.item_collection.find_one", AsyncMock(return_value={"item_id": "item1", "isSold": "processing"})), \
-         patch("backend.database.refund_collection.find_one", AsyncMock(return_value=None)):
+         patch("backend.database.item_collection.find") as mock_find_items, \
+         patch("backend.database.refund_collection.find") as mock_find_refunds:
 
-        mock_find_orders.return_value.to_list = AsyncMock(return_value=[{
+        mock_find_items.return_value.to_list = AsyncMock(return_value=[{"item_id": "item1", "isSold": "processing"}])
+        mock_find_refunds.return_value.to_list = AsyncMock(return_value=[])
+
+        mock_find_orders.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=[{
+            "_id": ObjectId(),
             "order_id": "ord123",
             "user_id": "user12345",
             "date": datetime.now(timezone.utc),
@@ -58,6 +69,39 @@ async def test_get_user_orders_success(client: AsyncClient):
         data = response.json()
         assert len(data) == 1
         assert data[0]["status"] == "processing"
+        # Bounded by default (one extra order tells whether there is a next page)
+        mock_find_orders.return_value.sort.return_value.limit.assert_called_once_with(21)
+
+
+@pytest.mark.asyncio
+async def test_get_user_orders_export_streams_full_history(client: AsyncClient):
+    orders = [{"_id": ObjectId(), "order_id": f"ord{n}", "item_ids": ["item1"]} for n in range(3)]
+
+    class OrderCursor:
+        def sort(self, *args):
+            return self
+
+        def batch_size(self, size):
+            return self
+
+        async def __aiter__(self):
+            for order in orders:
+                yield order
+
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
+         patch("backend.database.order_collection.find", return_value=OrderCursor()), \
+         patch("backend.database.item_collection.find") as mock_find_items, \
+         patch("backend.database.refund_collection.find") as mock_find_refunds:
+
+        mock_find_items.return_value.to_list = AsyncMock(return_value=[{"item_id": "item1", "isSold": "delivered"}])
+        mock_find_refunds.return_value.to_list = AsyncMock(return_value=[{"order_id": "ord1", "status": "approved"}])
+
+        response = await client.get("/api/user-orders?format=csv")
+        assert response.status_code == 200
+        lines = response.text.strip().splitlines()
+        assert lines[0] == "order_id,date,status,refund_status,item_ids,shipping_address,number_of_items"
+        assert len(lines) == 4
+        assert lines[2].startswith("ord1,,delivered,approved,item1")
 
 
 # ------------------ get-all-orders ------------------
@@ -73,29 +117,91 @@ async def test_get_all_orders_not_manager(client: AsyncClient):
 @pytest.mark.asyncio
 async def test_get_all_orders_success(client: AsyncClient):
     with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
-         patch("backend.database.order_collection.find") as mock_find_orders, \
-         patch("backend.database.item_collection.find_one", AsyncMock(return_value={
-             "item_id": "item1",
-             "title": "Test Product",
-             "image": ["img.png"],
-             "price": 50,
-             "category": "Book",
-             "isSold": "delivered",
-             "inStock": True
-         })):
-
-        mock_find_orders.return_value.to_list = AsyncMock(return_value=[{
+         patch("backend.database.order_collection.aggregate") as mock_aggregate:
+
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=[{
+            "_id": ObjectId(),
             "order_id": "ord123",
             "user_id": "user12345",
             "date": datetime.now(timezone.utc),
             "item_ids": ["item1"],
-            "shipping_address": "Test Address"
+            "shipping_address": "Test Address",
+            "items": [{
+                "item_id": "item1",
+                "title": "Test Product",
+                "image": ["img.png"],
+                "price": 50,
+                "category": "Book",
+                "isSold": "delivered",
+                "inStock": True
+            }]
         }])
 
-        response = await client.get("/api/all-orders")
+        response = await client.get("/api/all-orders?limit=10")
         assert response.status_code == 200
         assert len(response.json()) == 1
         assert response.json()[0]["order_id"] == "ord123"
+        assert response.json()[0]["items"][0]["image"] == "img.png"
+        assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_get_all_orders_streams_full_history(client: AsyncClient):
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
+         patch("backend.database.order_collection.aggregate") as mock_aggregate:
+
+        mock_aggregate.return_value.__aiter__.return_value = [
+            {"order_id": f"ord{i}", "user_id": "user12345", "item_ids": [], "items": []}
+            for i in range(3)
+        ]
+
+        response = await client.get("/api/all-orders?user_id=user12345")
+        assert response.status_code == 200
+        assert [order["order_id"] for order in response.json()] == ["ord0", "ord1", "ord2"]
+        assert mock_aggregate.call_args[0][0][0] == {"$match": {"user_id": "user12345"}}
+
+
+@pytest.mark.asyncio
+async def test_export_all_orders_csv_with_columns(client: AsyncClient):
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
+         patch("backend.database.order_collection.find") as mock_find:
+
+        docs = mock_find.return_value.sort.return_value.batch_size.return_value
+        docs.__aiter__.return_value = [
+            {"order_id": "ord1", "total_price": 50, "item_ids": ["item1", "item2"]},
+            {"order_id": "ord2", "total_price": 20, "item_ids": ["item3"]},
+        ]
+
+        response = await client.get("/api/all-orders?format=csv&columns=order_id,total_price,item_ids")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.text.splitlines() == [
+            "order_id,total_price,item_ids",
+            "ord1,50,item1;item2",
+            "ord2,20,item3",
+        ]
+        assert mock_find.call_args[0][1] == {"_id": 0, "order_id": 1, "total_price": 1, "item_ids": 1}
+
+
+@pytest.mark.asyncio
+async def test_export_all_orders_unknown_column(client: AsyncClient):
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)):
+        response = await client.get("/api/all-orders?format=csv&columns=order_id,payment_info")
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_items_without_price_ndjson(client: AsyncClient):
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
+         patch("backend.database.item_collection.find") as mock_find:
+
+        docs = mock_find.return_value.sort.return_value.batch_size.return_value
+        docs.__aiter__.return_value = [{"item_id": "item1", "image": ["a.png", "b.png"]}]
+
+        response = await client.get("/api/items-without-price?format=ndjson&columns=item_id,image&category=Book")
+        assert response.status_code == 200
+        assert response.text == '{"item_id": "item1", "image": "a.png"}\n'
+        assert mock_find.call_args[0][0]["category"] == "Book"
 
 
 # ------------------ set-price ------------------
@@ -135,7 +241,8 @@ async def test_cancel_order_invalid_status(client: AsyncClient):
     order = {"order_id": "ord123", "user_id": "user12345", "item_ids": ["item1"]}
     item = {"item_id": "item1", "isSold": "delivered"}
 
-    with patch("backend.database.order_collection.find_one", AsyncMock(return_value=order)),          patch("backend.database.item_collection.find_one", AsyncMock(return_value=item)):
+    with patch("backend.database.order_collection.find_one", AsyncMock(return_value=order)), \
+         patch("backend.database.item_collection.count_documents", AsyncMock(return_value=0)):
 
         response = await client.post("/api/cancel-order/ord123")
         assert response.status_code == 400
@@ -148,16 +255,16 @@ async def test_cancel_order_success(client: AsyncClient):
         "user_id": "user12345",
         "item_ids": ["item1"]
     }
-    item = {"item_id": "item1", "isSold": "processing"}
 
     with patch("backend.database.order_collection.find_one", AsyncMock(return_value=order)), \
-         patch("backend.database.item_collection.find_one", AsyncMock(return_value=item)), \
+         patch("backend.database.item_collection.count_documents", AsyncMock(return_value=1)), \
          patch("backend.database.order_collection.delete_one", AsyncMock()), \
-         patch("backend.database.item_collection.update_one", AsyncMock()):
+         patch("backend.database.item_collection.update_many", AsyncMock()) as mock_update_many:
 
         response = await client.post("/api/cancel-order/ord123")
         assert response.status_code == 200
         assert "successfully canceled" in response.json()["message"]
+        assert mock_update_many.call_args[0][0] == {"item_id": {"$in": ["item1"]}}
 
 
 # ------------------ refund-request ------------------
@@ -245,11 +352,12 @@ async def test_handle_refund_request_approve(client: AsyncClient):
     item = {"item_id": "item1", "isSold": "delivered", "price": 100}
     user_doc = {"user_id": "user12345", "name": "Test", "email": "test@sabanciuniv.edu"}
 
-    with patch("backend.database.users_collection.find_one", AsyncMock(side_effect=[mock_user, user_doc])),          patch("backend.database.refund_collection.find_one", AsyncMock(return_value=refund_doc)),          patch("backend.database.item_collection.update_one", AsyncMock()),          patch("backend.database.refund_collection.update_one", AsyncMock()),          patch("backend.UserProfile_backend.main_routes.send_email_notification", AsyncMock()):
+    with patch("backend.database.users_collection.find_one", AsyncMock(side_effect=[mock_user, user_doc])),          patch("backend.database.refund_collection.find_one", AsyncMock(return_value=refund_doc)),          patch("backend.database.item_collection.update_many", AsyncMock()) as mock_update_many,          patch("backend.database.refund_collection.update_many", AsyncMock()),          patch("backend.UserProfile_backend.main_routes.send_email_notification", AsyncMock()):
 
         response = await client.post("/api/handle-refund-request/ord123?action=approve")
         assert response.status_code == 200
         assert "approved" in response.json()["message"]
+        mock_update_many.assert_called_once()
 
 @pytest.mark.asyncio
 async def test_handle_refund_request_reject(client: AsyncClient):
@@ -264,9 +372,64 @@ async def test_handle_refund_request_reject(client: AsyncClient):
 
     with patch("backend.database.users_collection.find_one", AsyncMock(side_effect=[mock_user, user_doc])), \
          patch("backend.database.refund_collection.find_one", AsyncMock(return_value=refund_doc)), \
-         patch("backend.database.refund_collection.update_one", AsyncMock()), \
+         patch("backend.database.refund_collection.update_many", AsyncMock()), \
          patch("backend.UserProfile_backend.main_routes.send_email_notification", AsyncMock()):
 
         response = await client.post("/api/handle-refund-request/ord123?action=reject")
         assert response.status_code == 200
         assert "rejected" in response.json()["message"]
+
+
+@pytest.mark.asyncio
+async def test_refund_queue_pages_and_orders_items(client: AsyncClient):
+    requests = [
+        {
+            "_id": ObjectId(), "order_id": f"ord{i}", "user_id": "user12345", "refund_amount": 10,
+            "status": "pending", "item_ids": ["item2", "item1"],
+            "items": [{"item_id": "item1", "title": "A"}, {"item_id": "item2", "title": "B"}]
+        }
+        for i in range(3)
+    ]
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
+         patch("backend.database.refund_collection.aggregate") as mock_aggregate:
+
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=requests)
+
+        response = await client.get("/api/refund-requests?limit=2")
+        assert response.status_code == 200
+        assert [r["order_id"] for r in response.json()] == ["ord0", "ord1"]
+        assert [i["item_id"] for i in response.json()[0]["items"]] == ["item2", "item1"]
+        assert "X-Next-Cursor" in response.headers
+        assert mock_aggregate.call_args[0][0][0] == {"$match": {"status": "pending"}}
+
+
+@pytest.mark.asyncio
+async def test_handle_refund_requests_bulk_approve(client: AsyncClient):
+    refunds = [
+        {"_id": ObjectId(), "order_id": "ord1", "user_id": "u1", "item_ids": ["item1"], "refund_amount": 10, "status": "pending"},
+        {"_id": ObjectId(), "order_id": "ord2", "user_id": "u2", "item_ids": ["item2", "item3"], "refund_amount": 20, "status": "pending"},
+    ]
+    customers = [
+        {"user_id": "u1", "name": "One", "email": "one@sabanciuniv.edu"},
+        {"user_id": "u2", "name": "Two", "email": "two@sabanciuniv.edu"},
+    ]
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=mock_user)), \
+         patch("backend.database.refund_collection.find") as mock_refund_find, \
+         patch("backend.database.users_collection.find") as mock_users_find, \
+         patch("backend.database.item_collection.update_many", AsyncMock()) as mock_items, \
+         patch("backend.database.refund_collection.update_many", AsyncMock()) as mock_refunds, \
+         patch("backend.UserProfile_backend.main_routes.enqueue_messages", AsyncMock()) as mock_enqueue:
+
+        mock_refund_find.return_value.to_list = AsyncMock(return_value=refunds)
+        mock_users_find.return_value.__aiter__.return_value = customers
+
+        response = await client.post("/api/handle-refund-requests", json={
+            "order_ids": ["ord1", "ord2", "ord9"], "action": "approve"
+        })
+        assert response.status_code == 200
+        assert response.json() == {"processed": 2, "skipped": ["ord9"]}
+        assert sorted(mock_items.call_args[0][0]["item_id"]["$in"]) == ["item1", "item2", "item3"]
+        assert mock_refunds.call_args[0][1] == {"$set": {"status": "approved"}}
+        mock_items.assert_called_once()
+        mock_refunds.assert_called_once()
+        assert [to for to, _, _ in mock_enqueue.call_args[0][0]] == ["one@sabanciuniv.edu", "two@sabanciuniv.edu"]
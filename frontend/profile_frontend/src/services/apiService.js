@@ -164,16 +164,22 @@ export const removeComment = async (feedbackId) => {
 // Kullanıcının satın aldığı ürünleri getir
 export const getPurchasedProducts = async () => {
   try {
-    // /user-orders endpoint'ini kullan
-    const res = await api.get('/user-orders');
+    // /user-orders sayfalı döner; X-Next-Cursor bitene kadar sonraki sayfaları al
+    const orders = [];
+    let cursor = null;
+    do {
+      const res = await api.get('/user-orders', { params: { limit: 100, cursor: cursor || undefined } });
+      orders.push(...(res.data || []));
+      cursor = res.headers['x-next-cursor'];
+    } while (cursor);
     
-    if (!res.data || res.data.length === 0) {
+    if (orders.length === 0) {
       return [];
     }
     
     const orderGroups = [];
     
-    for (const order of res.data) {
+    for (const order of orders) {
       try {
         const orderItems = [];
         
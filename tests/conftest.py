@@ -0,0 +1,14 @@
+import asyncio
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.response_cache import get_backend
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    # Catalog responses are cached across requests; every test starts cold
+    asyncio.run(get_backend().clear())
+    yield
@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.admins import set_admin
+
+# --------------------- TESTS ---------------------
+
+@pytest.mark.asyncio
+async def test_grant_sets_flag_and_drops_cached_principal():
+    with patch("backend.database.users_collection.update_one", new_callable=AsyncMock) as mock_update, \
+         patch("backend.admins.invalidate_principal", new_callable=AsyncMock) as mock_invalidate:
+        mock_update.return_value = SimpleNamespace(matched_count=1)
+
+        assert await set_admin("admin@sabanciuniv.edu", True) is True
+        assert mock_update.call_args[0] == ({"email": "admin@sabanciuniv.edu"}, {"$set": {"isAdmin": True}})
+        mock_invalidate.assert_awaited_once_with(email="admin@sabanciuniv.edu")
+
+
+@pytest.mark.asyncio
+async def test_unknown_email_is_reported():
+    with patch("backend.database.users_collection.update_one", new_callable=AsyncMock) as mock_update, \
+         patch("backend.admins.invalidate_principal", new_callable=AsyncMock) as mock_invalidate:
+        mock_update.return_value = SimpleNamespace(matched_count=0)
+
+        assert await set_admin("nobody@sabanciuniv.edu", False) is False
+        mock_invalidate.assert_not_called()
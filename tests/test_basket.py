@@ -37,15 +37,31 @@ def client():
 @pytest.mark.asyncio
 async def test_get_basket(client):
     with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_user, \
-         patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_item:
+         patch("backend.database.item_collection.find") as mock_find_items:
 
         mock_find_user.return_value = fake_current_user
-        mock_find_item.return_value = sample_item
+        mock_find_items.return_value.to_list = AsyncMock(return_value=[dict(sample_item)])
 
         response = client.get("/api/basket")
         assert response.status_code == 200
         assert len(response.json()["basket"]) == 1
         assert response.json()["basket"][0]["item_id"] == "item123"
+        mock_find_items.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_get_basket_keeps_order_and_drops_missing(client):
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_user, \
+         patch("backend.database.item_collection.find") as mock_find_items:
+
+        mock_find_user.return_value = {**fake_current_user, "basket": ["item3", "gone", "item1"]}
+        mock_find_items.return_value.to_list = AsyncMock(return_value=[
+            {"item_id": "item1", "title": "First"},
+            {"item_id": "item3", "title": "Third"}
+        ])
+
+        response = client.get("/api/basket")
+        assert response.status_code == 200
+        assert [item["item_id"] for item in response.json()["basket"]] == ["item3", "item1"]
 
 @pytest.mark.asyncio
 async def test_add_to_basket(client):
@@ -0,0 +1,83 @@
+import os
+import sys
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.benchmark import percentile, db_calls, compare, StepStats, check_mail_transport, main, parse_args
+
+
+def step(p95, db_ops, errors=0):
+    return {"count": 10, "errors": errors, "p50_ms": 1, "p95_ms": p95, "p99_ms": p95, "rps": 1, "db_ops": db_ops}
+
+# --------------------- TESTS ---------------------
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0.0
+
+
+def test_db_calls_read_from_server_timing():
+    response = SimpleNamespace(headers={"server-timing": 'app;dur=3.1, db;dur=1.2;desc="4 calls"'})
+    assert db_calls(response) == 4
+    assert db_calls(SimpleNamespace(headers={})) == 0
+
+
+def test_step_stats_summary():
+    stats = StepStats()
+    for ms in (10, 20, 30, 40):
+        stats.add(ms / 1000, SimpleNamespace(status_code=200, headers={"server-timing": 'db;dur=1;desc="2 calls"'}))
+    stats.add(0.05, SimpleNamespace(status_code=500, headers={}))
+
+    summary = stats.summary(wall_seconds=1.0)
+    assert summary["count"] == 5
+    assert summary["errors"] == 1
+    assert summary["p50_ms"] == 30.0
+    assert summary["rps"] == 5.0
+    assert summary["db_ops"] == 1.6
+
+
+def test_compare_flags_latency_and_db_op_regressions():
+    baseline = {"steps": {"browse.home": step(10, 2), "browse.item": step(5, 1)}}
+    results = {"steps": {
+        "browse.home": step(11, 2),       # within tolerance
+        "browse.item": step(5, 6),        # N+1
+        "search.search": step(100, 9),    # not in the baseline
+    }}
+    assert compare(results, baseline, tolerance=0.25) == ["browse.item: db ops/request 1 -> 6"]
+
+    results["steps"]["browse.home"] = step(20, 2, errors=1)
+    regressions = compare(results, baseline, tolerance=0.25)
+    assert "browse.home: p95 10ms -> 20ms" in regressions
+    assert "browse.home: errors 0 -> 1" in regressions
+
+
+def test_remote_checkout_needs_the_memory_mail_transport():
+    with patch.dict(os.environ, {}), patch("backend.benchmark.asyncio.run") as mock_run:
+        os.environ.pop("SUSOLD_MAIL_TRANSPORT", None)
+        with pytest.raises(SystemExit):
+            main(["--url", "http://staging:8000"])
+        mock_run.assert_not_called()
+
+        # Without checkout no mail is sent
+        check_mail_transport(parse_args(["--url", "http://staging:8000", "--scenarios", "browse", "search"]))
+
+        os.environ["SUSOLD_MAIL_TRANSPORT"] = "memory"
+        check_mail_transport(parse_args(["--url", "http://staging:8000"]))
+
+
+
+def test_in_process_run_overrides_an_inherited_smtp_transport():
+    with patch.dict(os.environ, {"SUSOLD_MAIL_TRANSPORT": "smtp"}), \
+         patch("backend.benchmark.asyncio.run") as mock_run, \
+         patch("backend.benchmark.format_table", return_value=""):
+        mock_run.side_effect = lambda coro: coro.close() or {"steps": {}}
+
+        main(["--no-seed"])
+        assert os.environ["SUSOLD_MAIL_TRANSPORT"] == "memory"
+        mock_run.assert_called_once()
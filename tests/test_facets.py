@@ -0,0 +1,63 @@
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.main import app
+from backend import facets
+from backend.facets import cache_key
+
+client = TestClient(app)
+
+raw_facets = {
+    "category": [{"_id": "Books", "count": 2}],
+    "dorm": [{"_id": True, "count": 1}],
+    "price": [{"_id": 0, "count": 1}, {"_id": "5000+", "count": 1}],
+    "total": [{"count": 2}],
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    facets._facet_cache.clear()
+    yield
+    facets._facet_cache.clear()
+
+
+def mock_listing():
+    cursor = MagicMock()
+    cursor.__aiter__.return_value = []
+    return cursor
+
+# --------------------- TESTS ---------------------
+
+def test_cache_key_ignores_filter_order():
+    assert cache_key({"category": "Books", "dorm": True}) == cache_key({"dorm": True, "category": "Books"})
+
+
+def test_home_returns_facets_from_one_cached_aggregation():
+    with patch("backend.database.item_collection.find", return_value=mock_listing()), \
+         patch("backend.database.item_collection.aggregate") as mock_aggregate:
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=[raw_facets])
+
+        first = client.get("/api/home/?facets=true&category=Books")
+        second = client.get("/api/home/?category=Books&facets=true")
+
+        assert first.status_code == 200
+        counts = first.json()["facets"]
+        assert counts["category"] == [{"value": "Books", "count": 2}]
+        assert counts["price"] == [{"min": 0, "max": 50, "count": 1}, {"min": 5000, "max": None, "count": 1}]
+        assert counts["total"] == 2
+        assert second.json()["facets"] == counts
+        mock_aggregate.assert_called_once()
+        assert mock_aggregate.call_args[0][0][0] == {"$match": {"category": "Books", "price": {"$gt": 0}}}
+
+
+def test_home_without_facets_skips_aggregation():
+    with patch("backend.database.item_collection.find", return_value=mock_listing()), \
+         patch("backend.database.item_collection.aggregate") as mock_aggregate:
+        response = client.get("/api/home/")
+        assert "facets" not in response.json()
+        mock_aggregate.assert_not_called()
@@ -2,7 +2,7 @@ import os
 import sys
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from bson import ObjectId
 from datetime import datetime, timezone
 
@@ -100,13 +100,16 @@ async def test_update_product_success(client):
 async def test_delete_product_success(client):
     with patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one, \
          patch("backend.database.item_collection.delete_one", new_callable=AsyncMock), \
-         patch("backend.database.users_collection.update_one", new_callable=AsyncMock):
+         patch("backend.database.users_collection.update_many", new_callable=AsyncMock) as mock_update_many:
 
         mock_find_one.return_value = {**sample_product, "user_id": "user123"}
+        mock_update_many.return_value.modified_count = 2
 
         response = client.delete("/api/home/item123")
         assert response.status_code == 200
         assert "Product deleted successfully" in response.json()["message"]
+        assert response.json()["users_updated"] == 2
+        assert {"basket": "item123"} in mock_update_many.call_args[0][0]["$or"]
 
 @pytest.mark.asyncio
 async def test_update_product_unauthorized(client):
@@ -126,6 +129,34 @@ async def test_delete_product_not_found(client):
         assert response.status_code == 404
         assert "Product not found" in response.json()["detail"]
 
+@pytest.mark.asyncio
+async def test_sales_summary_with_daily_breakdown():
+    async def sales_manager_override():
+        return {**fake_current_user, "isSalesManager": True}
+
+    app.dependency_overrides[get_current_user] = sales_manager_override
+    sales_client = TestClient(app)
+
+    with patch("backend.database.order_collection.aggregate", new_callable=MagicMock) as mock_aggregate:
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=[{
+            "totals": [{"_id": None, "revenue": 200, "cost": 55}],
+            "by_day": [
+                {"_id": "2024-05-03", "revenue": 160, "cost": 55},
+                {"_id": "2024-05-04", "revenue": 40, "cost": 0}
+            ]
+        }])
+
+        response = sales_client.get("/api/home/sales-summary?start_date=2024-05-01&end_date=2024-05-30&by_day=true")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_profit"] == 145
+        assert data["by_day"][0] == {"date": "2024-05-03", "revenue": 160, "cost": 55, "profit": 105}
+        assert "by_category" not in data
+
+        pipeline = mock_aggregate.call_args[0][0]
+        assert "by_day" in pipeline[-1]["$facet"]
+        mock_aggregate.assert_called_once()
+
 @pytest.mark.asyncio
 async def test_add_product_without_authentication():
     from fastapi import HTTPException
@@ -34,13 +34,16 @@ def client():
 async def test_delete_product_success(client):
     with patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one, \
          patch("backend.database.item_collection.delete_one", new_callable=AsyncMock), \
-         patch("backend.database.users_collection.update_one", new_callable=AsyncMock):
+         patch("backend.database.users_collection.update_many", new_callable=AsyncMock) as mock_update_many:
 
         mock_find_one.return_value = {**sample_product, "user_id": "user123"}
+        mock_update_many.return_value.modified_count = 2
 
         response = client.delete("/api/home/item123")
         assert response.status_code == 200
         assert "Product deleted successfully" in response.json()["message"]
+        assert response.json()["users_updated"] == 2
+        assert {"basket": "item123"} in mock_update_many.call_args[0][0]["$or"]
 
 @pytest.mark.asyncio
 async def test_delete_product_not_found(client):
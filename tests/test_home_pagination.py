@@ -0,0 +1,81 @@
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.main import app
+from backend.pagination import encode_cursor, decode_cursor, keyset_filter
+
+client = TestClient(app)
+
+first_id = ObjectId()
+second_id = ObjectId()
+
+sample_products = [
+    {"_id": first_id, "item_id": "item10001", "title": "Lamp", "price": 50},
+    {"_id": second_id, "item_id": "item10002", "title": "Desk", "price": 80},
+]
+
+
+def mock_find_chain(docs):
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.to_list = AsyncMock(return_value=docs)
+    return cursor
+
+# --------------------- TESTS ---------------------
+
+def test_cursor_round_trip():
+    token = encode_cursor(sample_products[0], "price")
+    decoded = decode_cursor(token)
+    assert decoded["id"] == first_id
+    assert decoded["v"] == 50
+
+
+def test_invalid_cursor_rejected():
+    response = client.get("/api/home/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_keyset_filter_descending():
+    query = keyset_filter({"id": first_id, "v": 50}, "price", -1)
+    assert {"price": {"$lt": 50}} in query["$or"]
+    assert {"price": 50, "_id": {"$lt": first_id}} in query["$or"]
+
+
+@pytest.mark.asyncio
+async def test_first_page_returns_next_cursor():
+    with patch("backend.database.item_collection.find") as mock_find:
+        mock_cursor = mock_find_chain(list(sample_products))
+        mock_find.return_value = mock_cursor
+
+        response = client.get("/api/home/?limit=1&sort_by=price_asc")
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["featured_products"]) == 1
+        assert body["featured_products"][0]["item_id"] == "item10001"
+        assert decode_cursor(body["next_cursor"]) == {"id": first_id, "v": 50}
+        mock_cursor.sort.assert_called_with([("price", 1), ("_id", 1)])
+        mock_cursor.limit.assert_called_with(2)
+
+
+@pytest.mark.asyncio
+async def test_next_page_uses_keyset_filter():
+    token = encode_cursor(sample_products[0], "price")
+    with patch("backend.database.item_collection.find") as mock_find:
+        mock_find.return_value = mock_find_chain([sample_products[1]])
+
+        response = client.get(f"/api/home/?limit=1&sort_by=price_asc&cursor={token}")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["featured_products"][0]["item_id"] == "item10002"
+        assert body["next_cursor"] is None
+
+        query = mock_find.call_args[0][0]
+        assert {"price": {"$gt": 0}} in query["$and"]
+        assert {"price": {"$gt": 50}} in query["$and"][1]["$or"]
@@ -0,0 +1,42 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import ids
+from backend.ids import allocate_id
+
+# --------------------- TESTS ---------------------
+
+@pytest.mark.asyncio
+async def test_allocate_order_id_from_counter():
+    with patch.object(ids.counters_collection, "find_one_and_update", new_callable=AsyncMock) as mock_counter, \
+         patch("backend.database.order_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+
+        mock_counter.return_value = {"_id": "order", "seq": 1}
+        mock_find_one.return_value = None
+
+        assert await allocate_id("order") == "order100000"
+        assert mock_counter.call_args[0][1] == {"$inc": {"seq": 1}}
+
+
+@pytest.mark.asyncio
+async def test_allocate_item_id_skips_taken_ids():
+    with patch.object(ids.counters_collection, "find_one_and_update", new_callable=AsyncMock) as mock_counter, \
+         patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+
+        mock_counter.side_effect = [{"seq": 5}, {"seq": 6}]
+        mock_find_one.side_effect = [{"_id": "legacy"}, None]
+
+        assert await allocate_id("item") == "item10005"
+        assert mock_counter.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_allocate_item_id_space_exhausted():
+    with patch.object(ids.counters_collection, "find_one_and_update", new_callable=AsyncMock) as mock_counter:
+        mock_counter.return_value = {"seq": 90001}
+
+        with pytest.raises(RuntimeError):
+            await allocate_id("item")
@@ -0,0 +1,59 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import indexes
+
+# --------------------- TESTS ---------------------
+
+@pytest.mark.asyncio
+async def test_apply_indexes_from_scratch():
+    fake_db = MagicMock()
+    fake_db.__getitem__.return_value.create_indexes = AsyncMock()
+
+    with patch.object(indexes, "db", fake_db), \
+         patch.object(indexes.migrations_collection, "find_one", new_callable=AsyncMock) as mock_find_one, \
+         patch.object(indexes.migrations_collection, "update_one", new_callable=AsyncMock) as mock_update:
+
+        mock_find_one.return_value = None
+
+        applied = await indexes.apply_indexes()
+        assert applied == [v for v, _, _ in indexes.INDEX_MANIFEST]
+        assert mock_update.call_args[0][1]["$set"]["version"] == indexes.LATEST_VERSION
+
+
+@pytest.mark.asyncio
+async def test_apply_indexes_skips_applied_versions():
+    fake_db = MagicMock()
+    fake_db.__getitem__.return_value.create_indexes = AsyncMock()
+
+    with patch.object(indexes, "db", fake_db), \
+         patch.object(indexes.migrations_collection, "find_one", new_callable=AsyncMock) as mock_find_one:
+
+        mock_find_one.return_value = {"_id": "indexes", "version": indexes.LATEST_VERSION}
+
+        assert await indexes.apply_indexes() == []
+        fake_db.__getitem__.return_value.create_indexes.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_data_migrations_backfill_search_terms_once():
+    with patch.object(indexes, "reindex_items", new_callable=AsyncMock) as mock_reindex, \
+         patch.object(indexes.migrations_collection, "find_one", new_callable=AsyncMock) as mock_find_one, \
+         patch.object(indexes.migrations_collection, "update_one", new_callable=AsyncMock) as mock_update:
+
+        mock_find_one.return_value = None
+        assert await indexes.apply_data_migrations() == [1]
+        mock_reindex.assert_awaited_once_with(only_missing=True)
+        assert mock_update.call_args[0][0] == {"_id": "data"}
+
+        mock_find_one.return_value = {"_id": "data", "version": indexes.DATA_MIGRATIONS[-1][0]}
+        assert await indexes.apply_data_migrations() == []
+        assert mock_reindex.await_count == 1
+
+
+def test_plan_stages_finds_nested_collscan():
+    plan = {"stage": "SORT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "COLLSCAN"}}}
+    assert "COLLSCAN" in list(indexes._plan_stages(plan))
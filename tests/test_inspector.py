@@ -0,0 +1,74 @@
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.main import app
+from backend.registerloginbackend.jwt_handler import get_current_user
+
+admin_user = {
+    "user_id": "user100001",
+    "email": "admin@sabanciuniv.edu",
+    "isAdmin": True
+}
+
+async def override_get_current_user():
+    return admin_user
+
+@pytest.fixture
+def client():
+    app.dependency_overrides = {}
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    yield TestClient(app)
+    app.dependency_overrides = {}
+
+# --------------------- TESTS ---------------------
+
+def test_debug_all_requires_admin(client):
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value={"user_id": "user100001"})):
+        response = client.get("/api/debug-all")
+        assert response.status_code == 403
+
+
+def test_debug_all_returns_summary_without_documents(client):
+    stats = [{"storageStats": {"count": 3, "size": 300, "storageSize": 4096, "indexSizes": {"_id_": 100}}}]
+    index_usage = [{"name": "_id_", "key": {"_id": 1}, "accesses": {"ops": 7}}]
+
+    def aggregate(pipeline):
+        result = MagicMock()
+        result.to_list = AsyncMock(return_value=stats if "$collStats" in pipeline[0] else index_usage)
+        return result
+
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=admin_user)), \
+         patch("backend.inspector.db.command", AsyncMock(return_value={"dataSize": 900})), \
+         patch("motor.motor_asyncio.AsyncIOMotorCollection.aggregate", side_effect=aggregate):
+
+        response = client.get("/api/debug-all")
+        assert response.status_code == 200
+        users = response.json()["collections"]["users"]
+        assert users["count"] == 3
+        assert users["indexes"] == [{"name": "_id_", "key": {"_id": 1}, "size_bytes": 100, "ops": 7}]
+
+
+def test_debug_collection_pages_with_redaction(client):
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=admin_user)), \
+         patch("backend.database.users_collection.find") as mock_find:
+
+        mock_find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(
+            return_value=[{"_id": ObjectId(), "user_id": f"user{i}"} for i in range(3)]
+        )
+
+        response = client.get("/api/debug-all/users?limit=2")
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+        assert "X-Next-Cursor" in response.headers
+        assert mock_find.call_args[0][1] == {"password": 0, "credit_cards": 0}
+
+
+def test_debug_collection_unknown(client):
+    with patch("backend.database.users_collection.find_one", AsyncMock(return_value=admin_user)):
+        response = client.get("/api/debug-all/secrets")
+        assert response.status_code == 404
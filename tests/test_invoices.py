@@ -0,0 +1,74 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import invoices
+
+sample_order = {
+    "order_id": "order100001",
+    "user_id": "user123",
+    "item_ids": ["item12345"],
+    "shipping_address": "FENS 1001",
+    "payment_info": "**** 4242",
+    "date": datetime(2024, 5, 3, tzinfo=timezone.utc),
+    "total_price": 150,
+    "number_of_items": 1
+}
+
+# --------------------- TESTS ---------------------
+
+def test_render_pdf_returns_pdf_bytes():
+    pdf = invoices.render_pdf(invoices.invoice_text(sample_order, ["Lamp"]))
+    assert pdf.startswith(b"%PDF")
+
+
+@pytest.mark.asyncio
+async def test_get_invoice_pdf_serves_stored_copy():
+    with patch.object(invoices, "load_invoice", new_callable=AsyncMock) as mock_load, \
+         patch.object(invoices, "render_pdf_async", new_callable=AsyncMock) as mock_render:
+
+        mock_load.return_value = b"%PDF-stored"
+
+        assert await invoices.get_invoice_pdf(sample_order) == b"%PDF-stored"
+        mock_render.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_invoice_pdf_renders_and_stores_once():
+    with patch.object(invoices, "load_invoice", new_callable=AsyncMock) as mock_load, \
+         patch.object(invoices, "render_pdf_async", new_callable=AsyncMock) as mock_render, \
+         patch.object(invoices, "store_invoice", new_callable=AsyncMock) as mock_store:
+
+        mock_load.return_value = None
+        mock_render.return_value = b"%PDF-new"
+        mock_store.return_value = b"%PDF-new"
+
+        pdf = await invoices.get_invoice_pdf(sample_order, ["Lamp"])
+        assert pdf == b"%PDF-new"
+        assert "Lamp" in mock_render.call_args[0][0]
+        mock_store.assert_called_once_with("order100001", b"%PDF-new")
+
+
+@pytest.mark.asyncio
+async def test_store_invoice_serves_winner_on_duplicate():
+    bucket = MagicMock()
+    bucket.upload_from_stream_with_id = AsyncMock(side_effect=DuplicateKeyError("dup"))
+    chunks = MagicMock()
+    chunks.delete_many = AsyncMock()
+    fake_db = MagicMock()
+    fake_db.__getitem__.return_value = chunks
+
+    with patch.object(invoices, "get_bucket", return_value=bucket), \
+         patch.object(invoices, "db", fake_db), \
+         patch.object(invoices, "load_invoice", new_callable=AsyncMock) as mock_load:
+
+        mock_load.return_value = b"%PDF-first"
+
+        assert await invoices.store_invoice("order100001", b"%PDF-second") == b"%PDF-first"
+        file_id = bucket.upload_from_stream_with_id.call_args[0][0]
+        fake_db.__getitem__.assert_called_with("invoices.chunks")
+        chunks.delete_many.assert_awaited_once_with({"files_id": file_id})
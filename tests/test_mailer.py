@@ -0,0 +1,110 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import mailer
+from backend.mailer import MemoryTransport, build_message, process_batch
+
+
+class FailingTransport:
+    def send_batch(self, messages):
+        return [ConnectionError("smtp down")] * len(messages)
+
+    def close(self):
+        pass
+
+
+def queued_mail(**extra):
+    return {
+        "_id": ObjectId(),
+        "to": "buyer@sabanciuniv.edu",
+        "subject": "SUSOLD Invoice",
+        "body": "Please find your invoice attached as a PDF.",
+        "attachments": [],
+        "attempts": 1,  # claim_batch counts the attempt
+        **extra
+    }
+
+# --------------------- TESTS ---------------------
+
+def test_build_message_with_attachment():
+    doc = queued_mail(attachments=[{"filename": "invoice.pdf", "content": b"%PDF-1.4", "subtype": "pdf"}])
+    msg = build_message(doc)
+    assert msg["To"] == "buyer@sabanciuniv.edu"
+    attachment = next(msg.iter_attachments())
+    assert attachment.get_filename() == "invoice.pdf"
+    assert attachment.get_content() == b"%PDF-1.4"
+
+
+@pytest.mark.asyncio
+async def test_process_batch_marks_sent():
+    MemoryTransport.outbox.clear()
+    with patch.object(mailer.mail_queue_collection, "update_one", new_callable=AsyncMock) as mock_update:
+        sent = await process_batch([queued_mail(), queued_mail()], MemoryTransport())
+
+        assert sent == 2
+        assert len(MemoryTransport.outbox) == 2
+        assert mock_update.call_args[0][1]["$set"]["status"] == "sent"
+
+
+@pytest.mark.asyncio
+async def test_process_batch_schedules_retry_with_backoff():
+    with patch.object(mailer.mail_queue_collection, "update_one", new_callable=AsyncMock) as mock_update:
+        sent = await process_batch([queued_mail(attempts=2)], FailingTransport())
+
+        assert sent == 0
+        update = mock_update.call_args[0][1]["$set"]
+        assert update["status"] == "pending"
+        assert "smtp down" in update["last_error"]
+        assert (update["next_attempt_at"] - datetime.now(timezone.utc)).total_seconds() > mailer.BACKOFF_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_process_batch_gives_up_after_max_attempts():
+    with patch.object(mailer.mail_queue_collection, "update_one", new_callable=AsyncMock) as mock_update:
+        await process_batch([queued_mail(attempts=mailer.MAX_ATTEMPTS)], FailingTransport())
+
+        assert mock_update.call_args[0][1]["$set"]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_unbuildable_mail_fails_alone():
+    MemoryTransport.outbox.clear()
+    broken = queued_mail(attachments=[{"filename": "invoice.pdf"}])  # content missing
+    with patch.object(mailer.mail_queue_collection, "update_one", new_callable=AsyncMock) as mock_update:
+        sent = await process_batch([broken, queued_mail()], MemoryTransport())
+
+        assert sent == 1
+        assert len(MemoryTransport.outbox) == 1
+        first = mock_update.call_args_list[0][0]
+        assert first[0] == {"_id": broken["_id"]}
+        assert first[1]["$set"]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_claim_counts_the_attempt_and_expires_exhausted_claims():
+    with patch.object(mailer.mail_queue_collection, "update_many", new_callable=AsyncMock) as mock_expire, \
+         patch.object(mailer.mail_queue_collection, "find_one_and_update", new_callable=AsyncMock) as mock_claim:
+        mock_claim.side_effect = [queued_mail(), None]
+
+        assert len(await mailer.claim_batch()) == 1
+        assert mock_claim.call_args[0][1]["$inc"] == {"attempts": 1}
+        stale = mock_claim.call_args[0][0]["$or"][1]
+        assert stale["attempts"] == {"$lt": mailer.MAX_ATTEMPTS}
+        assert mock_expire.call_args[0][0]["attempts"] == {"$gte": mailer.MAX_ATTEMPTS}
+        assert mock_expire.call_args[0][1]["$set"]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_enqueue_emails_uses_one_insert():
+    with patch.object(mailer.mail_queue_collection, "insert_many", new_callable=AsyncMock) as mock_insert:
+        await mailer.enqueue_emails(["a@sabanciuniv.edu", "b@sabanciuniv.edu"], "SUSOLD Discount Alert", "body")
+
+        mock_insert.assert_called_once()
+        docs = mock_insert.call_args[0][0]
+        assert [doc["to"] for doc in docs] == ["a@sabanciuniv.edu", "b@sabanciuniv.edu"]
+        assert all(doc["status"] == "pending" for doc in docs)
@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import sys
+import pytest
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.main import app
+from backend import metrics
+from backend.metrics import command_listener, command_shape, reset_metrics, snapshot, retire_worker
+
+client = TestClient(app)
+
+SCRAPER = {"Authorization": "Bearer scrape-token"}
+
+sample_product = {"_id": ObjectId(), "item_id": "item10001", "title": "Lamp", "price": 50}
+
+
+def fake_command(request_id, micros=2000, reply=None):
+    """Feed one find command through the listener, as pymongo would."""
+    command = {"find": "items", "filter": {"item_id": "item10001"}}
+    command_listener.started(SimpleNamespace(
+        command=command, command_name="find", connection_id=("db", 27017), request_id=request_id
+    ))
+    command_listener.succeeded(SimpleNamespace(
+        command_name="find", connection_id=("db", 27017), request_id=request_id,
+        duration_micros=micros, reply=reply or {"ok": 1}
+    ))
+
+
+@pytest.fixture(autouse=True)
+def scrape_token():
+    with patch.object(metrics, "METRICS_TOKEN", "scrape-token"):
+        yield
+
+
+# --------------------- TESTS ---------------------
+
+def test_metrics_need_the_scrape_token_or_an_admin():
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics/slow-queries", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    with patch("backend.registerloginbackend.jwt_handler.get_current_user", AsyncMock(return_value={"user_id": "user100002"})), \
+         patch("backend.database.users_collection.find_one", AsyncMock(return_value={"user_id": "user100002"})):
+        assert client.get("/metrics", headers={"Authorization": "Bearer user-jwt"}).status_code == 403
+
+    with patch("backend.registerloginbackend.jwt_handler.get_current_user", AsyncMock(return_value={"user_id": "user100001"})), \
+         patch("backend.database.users_collection.find_one", AsyncMock(return_value={"user_id": "user100001", "isAdmin": True})):
+        assert client.get("/metrics", headers={"Authorization": "Bearer admin-jwt"}).status_code == 200
+
+
+def test_server_timing_counts_db_calls():
+    reset_metrics()
+
+    async def find_one(*args, **kwargs):
+        fake_command(1)
+        fake_command(2)
+        return dict(sample_product)
+
+    with patch("backend.database.item_collection.find_one", new=AsyncMock(side_effect=find_one)):
+        response = client.get("/api/home/item/item10001")
+
+    assert response.status_code == 200
+    assert 'desc="2 calls"' in response.headers["Server-Timing"]
+    assert "app;dur=" in response.headers["Server-Timing"]
+
+
+def test_metrics_exposes_route_histograms():
+    reset_metrics()
+
+    async def find_one(*args, **kwargs):
+        fake_command(3)
+        return dict(sample_product)
+
+    with patch("backend.database.item_collection.find_one", new=AsyncMock(side_effect=find_one)):
+        client.get("/api/home/item/item10001")
+
+    body = client.get("/metrics", headers=SCRAPER).text
+    # The label is the path template, never the raw path
+    route = re.search(r'route="([^"]*/home/item/\{item_id\})"', body).group(1)
+    labels = f'method="GET",route="{route}"'
+    assert "item10001" not in body
+    assert f'susold_http_requests_total{{{labels},status="200"}} 1' in body
+    assert f'susold_db_calls_per_request_bucket{{{labels},le="1"}} 1' in body
+    assert f'susold_db_calls_per_request_bucket{{{labels},le="0"}} 0' in body
+    assert 'susold_db_commands_total{command="find",collection="items"} 1' in body
+    assert "susold_password_hash_pool" in body
+
+
+def test_unmatched_paths_share_one_label():
+    reset_metrics()
+    client.get("/no-such-page/123")
+    client.get("/no-such-page/456")
+
+    body = client.get("/metrics", headers=SCRAPER).text
+    assert 'susold_http_requests_total{method="GET",route="unmatched",status="404"} 2' in body
+
+
+def test_slow_queries_keep_only_the_shape():
+    reset_metrics()
+    with patch.object(metrics, "SLOW_QUERY_MS", 1):
+        fake_command(4, micros=5000)
+
+    samples = client.get("/metrics/slow-queries", headers=SCRAPER).json()
+    assert len(samples) == 1
+    assert samples[0]["collection"] == "items"
+    assert samples[0]["filter"] == {"item_id": "str"}
+    assert samples[0]["ms"] == 5.0
+
+
+def test_command_shape_drops_values():
+    pipeline = [{"$match": {"user_id": "u1", "price": {"$gte": 10}}}, {"$limit": 5}]
+    assert command_shape(pipeline) == [{"$match": {"user_id": "str", "price": {"$gte": "int"}}}]
+
+
+def test_metrics_sum_the_worker_snapshots(tmp_path):
+    reset_metrics()
+    client.get("/no-such-page/1")
+    # Another worker (and one that already exited) saw the same route
+    other = snapshot()
+    (tmp_path / "101.json").write_text(json.dumps(other))
+    (tmp_path / "102.json").write_text(json.dumps(other))
+
+    with patch.object(metrics, "METRICS_DIR", str(tmp_path)):
+        retire_worker(102)
+        assert not (tmp_path / "102.json").exists()
+        body = client.get("/metrics", headers=SCRAPER).text
+
+    assert 'susold_http_requests_total{method="GET",route="unmatched",status="404"} 3' in body
+
@@ -0,0 +1,43 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.registerloginbackend import jwt_handler
+from backend.registerloginbackend.jwt_handler import authenticate_user, hash_password, verify_and_update_password
+
+# --------------------- TESTS ---------------------
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_off_the_event_loop():
+    hashed = await hash_password("Secret1")
+    assert await verify_and_update_password("Secret1", hashed) == (True, None)
+    assert (await verify_and_update_password("Wrong1", hashed))[0] is False
+    assert jwt_handler.password_hash_stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_cost_factor():
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4)
+    user = {"_id": ObjectId(), "email": "old@sabanciuniv.edu", "password": old_context.hash("Secret1")}
+
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_one, \
+         patch("backend.database.users_collection.update_one", new_callable=AsyncMock) as mock_update:
+
+        mock_find_one.return_value = user
+
+        assert await authenticate_user("old@sabanciuniv.edu", "Secret1") is not None
+        new_hash = mock_update.call_args[0][1]["$set"]["password"]
+        assert new_hash.startswith(f"$2b${jwt_handler.BCRYPT_ROUNDS:02d}$")
+
+
+@pytest.mark.asyncio
+async def test_hashing_rejected_when_queue_is_full():
+    with patch.dict(jwt_handler._hash_stats, {"in_flight": jwt_handler.HASH_WORKERS + jwt_handler.HASH_QUEUE_LIMIT}):
+        with pytest.raises(HTTPException) as exc:
+            await hash_password("Secret1")
+        assert exc.value.status_code == 503
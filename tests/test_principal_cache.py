@@ -0,0 +1,104 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.registerloginbackend import jwt_handler
+from backend.response_cache import get_backend
+from backend.registerloginbackend.jwt_handler import (
+    create_access_token, get_current_user, invalidate_principal, load_user
+)
+
+sample_user = {
+    "_id": ObjectId(),
+    "user_id": "user100001",
+    "email": "cache@sabanciuniv.edu",
+    "name": "Cache",
+    "isManager": True
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    jwt_handler._principal_cache.clear()
+    yield
+    jwt_handler._principal_cache.clear()
+
+# --------------------- TESTS ---------------------
+
+@pytest.mark.asyncio
+async def test_principal_loaded_once_across_requests():
+    token = create_access_token({"sub": sample_user["email"]})
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_user)
+
+        first = await get_current_user(token)
+        second = await get_current_user(token)
+
+        assert first == second
+        assert first["isManager"] is True
+        mock_find_one.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_load_user_reuses_request_document():
+    token = create_access_token({"sub": sample_user["email"]})
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_user)
+
+        current_user = await get_current_user(token)
+        user = await load_user(current_user)
+
+        assert user["name"] == "Cache"
+        mock_find_one.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_principal_forces_reload():
+    token = create_access_token({"sub": sample_user["email"]})
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_user)
+
+        await get_current_user(token)
+        await invalidate_principal(user_id=sample_user["user_id"])
+        await get_current_user(token)
+
+        assert mock_find_one.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_principal_is_a_copy():
+    token = create_access_token({"sub": sample_user["email"]})
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_user, addresses=["A Block"])
+
+        current_user = await get_current_user(token)
+        current_user["addresses"].append("B Block")
+        (await load_user(current_user))["name"] = "Changed"
+
+        again = await get_current_user(token)
+        assert again["addresses"] == ["A Block"]
+        assert (await load_user(again))["name"] == "Cache"
+        mock_find_one.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_in_another_worker_drops_the_cache():
+    token = create_access_token({"sub": sample_user["email"]})
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_user)
+
+        await get_current_user(token)
+        # Another worker ran invalidate_principal; only the shared counter moved here
+        await get_backend().bump(jwt_handler.PRINCIPALS_COUNTER)
+        await get_current_user(token)
+        assert mock_find_one.call_count == 2
+
+        # Shared backend unreachable: nothing cached is trusted
+        with patch.object(type(get_backend()), "counter", AsyncMock(return_value=None)):
+            await get_current_user(token)
+            await get_current_user(token)
+        assert mock_find_one.call_count == 4
+
@@ -0,0 +1,64 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.ratings import star_bucket, rating_summary, rebuild_pipeline, rebuild_rating_stats, record_rating
+
+# --------------------- TESTS ---------------------
+
+def test_star_bucket_rounds_half_up():
+    assert star_bucket(4.5) == 5
+    assert star_bucket(2.49) == 2
+    assert star_bucket(0) == 0
+
+
+def test_rating_summary_uses_stats():
+    summary = rating_summary({"rating_stats": {"sum": 9.0, "count": 2, "histogram": {"4": 1, "5": 1}}})
+    assert summary["rating"] == 4.5
+    assert summary["rate_number"] == 2
+    assert summary["histogram"]["3"] == 0
+
+
+def test_rating_summary_falls_back_to_old_fields():
+    summary = rating_summary({"rating": 3.5, "rate_number": 4})
+    assert summary["rating"] == 3.5
+    assert summary["rate_number"] == 4
+
+
+def test_rebuild_pipeline_merges_into_users():
+    pipeline = rebuild_pipeline("user100001")
+    assert pipeline[0]["$match"] == {"rating": {"$ne": None}, "receiver_id": "user100001"}
+    assert pipeline[-1]["$merge"]["on"] == "user_id"
+
+
+@pytest.mark.asyncio
+async def test_rebuild_resets_then_aggregates():
+    with patch("backend.database.users_collection.update_many", new_callable=AsyncMock) as mock_reset, \
+         patch("backend.database.feedback_collection.aggregate") as mock_aggregate:
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=[])
+
+        await rebuild_rating_stats("user100001")
+
+        assert mock_reset.call_args[0][0] == {"user_id": "user100001"}
+        mock_aggregate.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_record_rating_seeds_stats_of_legacy_sellers():
+    with patch("backend.database.users_collection.find_one_and_update", new_callable=AsyncMock) as mock_update:
+        mock_update.return_value = {"rating_stats": {"sum": 17.0, "count": 4, "histogram": {"5": 1}}}
+
+        summary = await record_rating("user100001", 5)
+
+        seed, increment, rate_number = mock_update.call_args[0][1]
+        # Missing stats start from the old average instead of from zero
+        legacy = seed["$set"]["rating_stats"]["$ifNull"][1]
+        assert legacy["sum"] == {"$multiply": [{"$ifNull": ["$rating", 0]}, {"$ifNull": ["$rate_number", 0]}]}
+        assert legacy["count"] == {"$ifNull": ["$rate_number", 0]}
+        assert increment["$set"]["rating_stats.histogram.5"] == {"$add": [{"$ifNull": ["$rating_stats.histogram.5", 0]}, 1]}
+        assert rate_number == {"$set": {"rate_number": "$rating_stats.count"}}
+        assert summary["rating"] == 4.25
+        assert summary["rate_number"] == 4
+
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import types
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.main import app
+from starlette.requests import Request
+from backend import response_cache
+from backend.response_cache import MemoryBackend, RedisBackend, cache_key, invalidate_items
+
+client = TestClient(app)
+
+sample_product = {"_id": ObjectId(), "item_id": "item10001", "title": "Lamp", "price": 50}
+
+# --------------------- TESTS ---------------------
+
+def test_item_page_served_from_cache():
+    with patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_product)
+
+        first = client.get("/api/home/item/item10001")
+        second = client.get("/api/home/item/item10001")
+
+        assert first.json() == second.json()
+        assert first.headers["ETag"] == second.headers["ETag"]
+        assert "max-age" in first.headers["Cache-Control"]
+        mock_find_one.assert_called_once()
+
+
+def test_if_none_match_returns_304():
+    with patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_product)
+
+        etag = client.get("/api/home/item/item10001").headers["ETag"]
+        response = client.get("/api/home/item/item10001", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+
+def test_cache_key_escapes_encoded_separators():
+    def key(path, query):
+        return cache_key(Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []}))
+
+    assert key("/api/home/", b"brand=Ikea%26category%3DBooks") != key("/api/home/", b"brand=Ikea&category=Books")
+    assert key("/api/home/title/a?b=c", b"") != key("/api/home/title/a", b"b=c")
+    assert key("/api/home/", b"b=2&a=1&c=") == key("/api/home/", b"a=1&b=2")
+
+
+def test_build_racing_an_invalidation_is_not_cached():
+    calls = []
+
+    async def find_one(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            # A price change lands while the first response is being built
+            await invalidate_items(["item10001"])
+        return dict(sample_product)
+
+    with patch("backend.database.item_collection.find_one", new=AsyncMock(side_effect=find_one)):
+        assert client.get("/api/home/item/item10001").status_code == 200
+        assert client.get("/api/home/item/item10001").status_code == 200
+        assert client.get("/api/home/item/item10001").status_code == 200
+
+    # The racing build was served but not stored; the next one was
+    assert len(calls) == 2
+
+
+def test_not_found_is_not_cached():
+    with patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = None
+        assert client.get("/api/home/item/item10009").status_code == 404
+
+        mock_find_one.return_value = dict(sample_product, item_id="item10009")
+        assert client.get("/api/home/item/item10009").status_code == 200
+
+
+def test_invalidation_is_limited_to_the_changed_item():
+    with patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_product)
+        client.get("/api/home/item/item10001")
+        client.get("/api/home/item/item10002")
+
+        asyncio.run(invalidate_items(["item10001"]))
+        client.get("/api/home/item/item10001")
+        client.get("/api/home/item/item10002")
+
+        assert mock_find_one.call_count == 3
+
+
+def test_memory_backend_evicts_least_recently_used():
+    async def scenario():
+        backend = MemoryBackend(size=2)
+        await backend.set("a", '"a"', b"1", ["item:a"], 60)
+        await backend.set("b", '"b"', b"2", ["item:b"], 60)
+        await backend.get("a")
+        await backend.set("c", '"c"', b"3", ["item:c"], 60)
+        return await backend.get("a"), await backend.get("b"), backend.tags
+
+    a, b, tags = asyncio.run(scenario())
+    assert a == ('"a"', b"1")
+    assert b is None
+    assert "item:b" not in tags
+
+
+def test_unreachable_redis_skips_the_cache():
+    class RedisError(Exception):
+        pass
+
+    class DeadRedis:
+        async def get(self, key):
+            raise RedisError("Connection refused")
+
+        async def smembers(self, key):
+            raise RedisError("Connection refused")
+
+        async def incr(self, key):
+            raise RedisError("Connection refused")
+
+        def pipeline(self):
+            pipe = MagicMock()
+            pipe.execute = AsyncMock(side_effect=RedisError("Connection refused"))
+            return pipe
+
+    redis_module = types.ModuleType("redis")
+    redis_module.asyncio = types.SimpleNamespace(from_url=lambda url, **kwargs: DeadRedis())
+    exceptions = types.SimpleNamespace(RedisError=RedisError)
+    modules = {"redis": redis_module, "redis.asyncio": redis_module.asyncio, "redis.exceptions": exceptions}
+
+    with patch.dict(sys.modules, modules):
+        backend = RedisBackend()
+
+    with patch.object(response_cache, "_backend", backend), \
+         patch("backend.database.item_collection.find_one", new_callable=AsyncMock) as mock_find_one:
+        mock_find_one.return_value = dict(sample_product)
+        assert client.get("/api/home/item/item10001").status_code == 200
+        assert client.get("/api/home/item/item10001").status_code == 200
+        asyncio.run(invalidate_items(["item10001"]))
+        assert mock_find_one.call_count == 2
+
@@ -0,0 +1,66 @@
+import os
+import sys
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.main import app
+from backend.search import search_fields, search_pipeline
+
+client = TestClient(app)
+
+# --------------------- TESTS ---------------------
+
+def test_search_fields_stem_and_fold():
+    fields = search_fields({"title": "Kırmızı Kitaplar", "description": "Running shoes", "brand": "İş"})["search"]
+    assert "kitap" in fields["terms"]          # Turkish stem
+    assert "run" in fields["terms"]            # English stem
+    assert "kirmizi" in fields["title"]        # folded, dotless i
+    assert {"ki", "kit", "is"} <= set(fields["prefixes"])
+    assert "run" not in fields["title"]
+
+
+def test_query_uses_same_variants_as_documents():
+    pipeline = search_pipeline("KİTABI", {"price": {"$gt": 0}}, 10)
+    terms = pipeline[0]["$match"]["$and"][1]["search.terms"]["$in"]
+    assert "kitap" in terms
+    assert pipeline[-1] == {"$project": {"search": 0}}
+
+
+def test_typeahead_matches_last_token_as_prefix():
+    pipeline = search_pipeline("kitap kır", {}, 10, typeahead=True)
+    assert {"search.prefixes": "kir"} in pipeline[0]["$match"]["$and"]
+
+
+def test_stopwords_only_returns_nothing():
+    assert search_pipeline("the ve", {}, 10) == []
+
+
+def test_home_search_mode_returns_ranked_products():
+    with patch("backend.database.item_collection.aggregate") as mock_aggregate:
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=[
+            {"_id": ObjectId(), "item_id": "item10001", "title": "Kitap", "relevance": 3}
+        ])
+
+        response = client.get("/api/home/?q=kitaplar&category=Books")
+        assert response.status_code == 200
+        assert response.json()["featured_products"][0]["item_id"] == "item10001"
+        match = mock_aggregate.call_args[0][0][0]["$match"]["$and"]
+        assert match[0]["category"] == "Books"
+
+
+def test_home_search_rejects_cursor_and_sort():
+    with patch("backend.database.item_collection.aggregate") as mock_aggregate:
+        assert client.get("/api/home/?q=kitap&cursor=abc").status_code == 400
+        assert client.get("/api/home/?q=kitap&sort_by=price_asc").status_code == 400
+        mock_aggregate.assert_not_called()
+
+
+def test_suggest_returns_titles():
+    with patch("backend.database.item_collection.aggregate") as mock_aggregate:
+        mock_aggregate.return_value.to_list = AsyncMock(return_value=[{"item_id": "item10001", "title": "Kitap"}])
+
+        response = client.get("/api/home/suggest?q=ki")
+        assert response.status_code == 200
+        assert response.json() == {"suggestions": [{"item_id": "item10001", "title": "Kitap"}]}
@@ -0,0 +1,83 @@
+import collections
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.seed import (
+    DEFAULT_PLAN, make_user, make_item, make_order, make_feedback, make_refund,
+    item_price, item_state, sold_count, zipf_index, tasks
+)
+from backend.HomePage_backend.app.schemas import ProductCreate
+from backend.registerloginbackend.user_model import UserRegisterModel
+from backend.UserProfile_backend.model import RefundRequest
+
+plan = dict(DEFAULT_PLAN, users=200, items=1000, orders=500, feedback_rate=1.0, refund_rate=1.0)
+
+# --------------------- TESTS ---------------------
+
+def test_documents_match_the_api_models():
+    item = make_item(plan, 0)
+    ProductCreate(**item)
+    assert item["item_id"] == "item10000"
+    assert item["search"]["terms"]
+
+    user = make_user(plan, 3)
+    UserRegisterModel(**dict(user, password="Bench1234"))
+    assert user["user_id"] == "user100003"
+    assert make_user(plan, 0)["isSalesManager"]
+
+
+def test_documents_are_deterministic():
+    assert make_item(plan, 42) == make_item(plan, 42)
+    assert make_order(plan, 7) == make_order(plan, 7)
+    assert make_item(plan, 42) != make_item(dict(plan, seed=1), 42)
+
+
+def test_orders_reference_sold_items_and_their_prices():
+    for n in range(50):
+        order = make_order(plan, n)
+        indexes = [int(item_id[4:]) - 10000 for item_id in order["item_ids"]]
+        assert all(index < sold_count(plan) for index in indexes)
+        assert all(item_state(plan, index) != "stillInStock" for index in indexes)
+        assert order["total_price"] == round(sum(item_price(plan, index) for index in indexes), 2)
+        assert order["number_of_items"] == len(indexes)
+
+
+def test_feedback_and_refunds_follow_their_order():
+    for n in range(50):
+        order = make_order(plan, n)
+        feedback = make_feedback(plan, n)
+        if feedback is not None:
+            assert feedback["sender_id"] == order["user_id"]
+            assert feedback["item"] == order["item_ids"][0]
+            assert 0 <= feedback["rating"] <= 5
+        refund = make_refund(plan, n)
+        if refund is not None:
+            RefundRequest(**refund)
+            assert refund["order_id"] == order["order_id"]
+            assert set(refund["item_ids"]) <= set(order["item_ids"])
+
+
+def test_rates_skip_documents():
+    quiet = dict(plan, feedback_rate=0.0, refund_rate=0.0)
+    assert all(make_feedback(quiet, n) is None and make_refund(quiet, n) is None for n in range(100))
+
+
+def test_zipf_skew():
+    rng = random.Random(0)
+    skewed = collections.Counter(zipf_index(rng, 100, 1.2) for _ in range(5000))
+    uniform = collections.Counter(zipf_index(rng, 100, 0) for _ in range(5000))
+    assert skewed[0] > 10 * skewed[50]
+    assert uniform[0] < 3 * max(uniform[50], 1)
+    assert all(0 <= index < 100 for index in skewed)
+
+
+def test_tasks_cover_every_range():
+    big = dict(plan, users=45000, items=1000, orders=20001)
+    ranges = collections.defaultdict(list)
+    for kind, start, stop in tasks(big):
+        ranges[kind].append((start, stop))
+    assert ranges["users"] == [(0, 20000), (20000, 40000), (40000, 45000)]
+    assert ranges["orders"][-1] == (20000, 20001)
+    assert ranges["feedbacks"] == ranges["refund_requests"] == ranges["orders"]
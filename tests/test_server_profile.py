@@ -0,0 +1,68 @@
+import os
+import runpy
+import sys
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.main import app
+from backend.database import client_options
+
+GUNICORN_CONF = os.path.join(os.path.dirname(__file__), '..', 'backend', 'gunicorn.conf.py')
+
+# --------------------- TESTS ---------------------
+
+def test_client_options_from_env():
+    env = {"SUSOLD_MONGO_MAX_POOL_SIZE": "40", "SUSOLD_MONGO_WAIT_QUEUE_TIMEOUT_MS": "2500", "SUSOLD_MONGO_MIN_POOL_SIZE": ""}
+    with patch.dict(os.environ, env):
+        assert client_options() == {"maxPoolSize": 40, "waitQueueTimeoutMS": 2500}
+
+
+def test_gunicorn_profile_sizes_workers():
+    before = dict(os.environ)
+    with patch.dict(os.environ, {"WEB_CONCURRENCY": "3", "SUSOLD_CACHE_URL": "redis://redis:6379/0"}), \
+         patch("os.cpu_count", return_value=12):
+        os.environ.pop("SUSOLD_INVOICE_WORKERS", None)
+        conf = runpy.run_path(GUNICORN_CONF)
+        assert conf["workers"] == 3
+        assert conf["preload_app"] is False
+        assert conf["worker_class"].endswith("UvicornWorker")
+        # Workers inherit a share of the machine and skip the index bootstrap
+        assert os.environ["SUSOLD_INVOICE_WORKERS"] == "4"
+        assert os.environ["SUSOLD_APPLY_INDEXES"] == "0"
+        # Several workers share one response cache and one metrics view
+        assert os.environ["SUSOLD_CACHE_BACKEND"] == "redis"
+        assert os.environ["SUSOLD_METRICS_DIR"]
+    assert dict(os.environ) == before
+
+
+def test_gunicorn_profile_keeps_memory_cache_without_a_redis_url():
+    for concurrency in ("1", "0", "4"):
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": concurrency}), patch("os.cpu_count", return_value=8):
+            os.environ.pop("SUSOLD_CACHE_BACKEND", None)
+            os.environ.pop("SUSOLD_CACHE_URL", None)
+            conf = runpy.run_path(GUNICORN_CONF)
+            assert conf["workers"] == max(1, int(concurrency))
+            assert "SUSOLD_CACHE_BACKEND" not in os.environ
+
+
+def test_gunicorn_profile_defaults_to_one_worker_per_core():
+    with patch.dict(os.environ, {}), patch("os.cpu_count", return_value=6):
+        os.environ.pop("WEB_CONCURRENCY", None)
+        assert runpy.run_path(GUNICORN_CONF)["workers"] == 6
+
+
+def test_lifespan_warms_up_and_closes_the_pool():
+    calls = []
+    with patch("backend.main.apply_indexes", AsyncMock(return_value=[])), \
+         patch("backend.main.apply_data_migrations", AsyncMock(return_value=[])), \
+         patch("motor.motor_asyncio.AsyncIOMotorDatabase.command", AsyncMock(side_effect=lambda *a, **k: calls.append("ping"))), \
+         patch("backend.main.start_mail_workers", MagicMock(side_effect=lambda: calls.append("mail start"))), \
+         patch("backend.main.stop_mail_workers", AsyncMock(side_effect=lambda: calls.append("mail stop"))), \
+         patch("backend.main.shutdown_invoice_pool", MagicMock(side_effect=lambda: calls.append("invoice pool"))), \
+         patch("motor.motor_asyncio.AsyncIOMotorClient.close", MagicMock(side_effect=lambda: calls.append("close"))):
+
+        with TestClient(app):
+            assert calls == ["ping", "mail start"]
+
+    assert calls == ["ping", "mail start", "mail stop", "invoice pool", "close"]
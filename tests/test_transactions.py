@@ -0,0 +1,41 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import transactions
+from backend.transactions import run_in_transaction
+
+
+@pytest.fixture(autouse=True)
+def reset_probe():
+    transactions._supports_transactions = None
+    yield
+    transactions._supports_transactions = None
+
+# --------------------- TESTS ---------------------
+
+@pytest.mark.asyncio
+async def test_standalone_runs_without_session():
+    callback = AsyncMock(return_value="done")
+    with patch("motor.motor_asyncio.AsyncIOMotorDatabase.command", AsyncMock(return_value={"isWritablePrimary": True})):
+        assert await run_in_transaction(callback) == "done"
+        callback.assert_awaited_once_with(None)
+
+
+@pytest.mark.asyncio
+async def test_replica_set_uses_transaction():
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    session.with_transaction = AsyncMock(return_value="committed")
+    callback = AsyncMock()
+
+    with patch("motor.motor_asyncio.AsyncIOMotorDatabase.command", AsyncMock(return_value={"setName": "rs0"})) as mock_hello, \
+         patch.object(transactions.client, "start_session", AsyncMock(return_value=session)):
+        assert await run_in_transaction(callback) == "committed"
+        assert await run_in_transaction(callback) == "committed"
+
+        session.with_transaction.assert_awaited_with(callback)
+        mock_hello.assert_awaited_once()
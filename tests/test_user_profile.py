@@ -94,12 +94,10 @@ def test_send_feedback_success(client):
 
     with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_user_find, \
          patch("backend.database.feedback_collection.insert_one", new_callable=AsyncMock) as mock_feedback_insert, \
-         patch("backend.database.users_collection.update_one", new_callable=AsyncMock) as mock_user_update:
+         patch("backend.database.users_collection.find_one_and_update", new_callable=AsyncMock) as mock_user_update:
 
-        mock_user_find.return_value = {
-            "user_id": "fake_seller_id",
-            "rating": 4.0,
-            "rate_number": 2
+        mock_user_update.return_value = {
+            "rating_stats": {"sum": 13.0, "count": 3, "histogram": {"4": 2, "5": 1}}
         }
 
         feedback_data = {
@@ -112,6 +110,11 @@ def test_send_feedback_success(client):
         response = client.post("/api/send_feedback", json=feedback_data)
         assert response.status_code == 200
         assert response.json()["message"] == "Feedback submitted successfully."
+        assert response.json()["new_rating"] == 4.33
+        assert response.json()["rate_number"] == 3
+        update = mock_user_update.call_args[0][1][1]["$set"]
+        assert update["rating_stats.sum"] == {"$add": ["$rating_stats.sum", 5.0]}
+        assert "rating_stats.histogram.5" in update
 
 
 def test_get_unapproved_comments_as_manager(client):
@@ -144,18 +147,39 @@ def test_get_my_feedbacks(client):
     app.dependency_overrides[get_current_user] = override_get_current_user_user
 
     with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_user_find, \
-         patch("backend.database.feedback_collection.find", new_callable=MagicMock) as mock_feedback_find:
+         patch("backend.database.feedback_collection.aggregate", new_callable=MagicMock) as mock_feedback_aggregate:
 
         mock_user_find.return_value = sample_user
-        # Fix: Add _id field to each feedback object
-        mock_feedback_find.return_value.__aiter__.return_value = [
-            {"_id": ObjectId(), "rating": 4.5, "comment": "Great!", "receiver_id": "user123", "isCommentVerified": True},
-            {"_id": ObjectId(), "rating": 3.0, "comment": None, "receiver_id": "user123", "isCommentVerified": False}
-        ]
+        # Masking happens in the pipeline; the mock returns already projected rows
+        mock_feedback_aggregate.return_value.to_list = AsyncMock(return_value=[
+            {"id": ObjectId(), "rating": 4.5, "comment": "Great!"},
+            {"id": ObjectId(), "rating": 3.0, "comment": "no comment"}
+        ])
 
         response = client.get("/api/my_feedbacks")
         assert response.status_code == 200
         assert len(response.json()["feedbacks_received"]) == 2
+        assert response.json()["next_cursor"] is None
+
+
+def test_get_seller_feedbacks_paginated(client):
+    ids = [ObjectId() for _ in range(3)]
+    dates = [datetime(2024, 5, 3 - i, tzinfo=timezone.utc) for i in range(3)]
+
+    with patch("backend.database.feedback_collection.aggregate", new_callable=MagicMock) as mock_feedback_aggregate:
+        mock_feedback_aggregate.return_value.to_list = AsyncMock(return_value=[
+            {"id": ids[i], "date": dates[i], "rating": 5.0, "comment": "no comment"} for i in range(3)
+        ])
+
+        response = client.get("/api/seller_feedbacks?seller_id=unknown_seller&limit=2")
+        assert response.status_code == 200
+        assert len(response.json()["feedbacks_received"]) == 2
+        assert response.json()["next_cursor"] is not None
+
+        pipeline = mock_feedback_aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"receiver_id": "unknown_seller"}}
+        assert pipeline[2] == {"$limit": 3}
+        assert "$cond" in pipeline[-1]["$project"]["comment"]
 
 
 def test_approve_comment_success_as_manager(client):
@@ -241,6 +265,52 @@ def test_get_my_offerings(client):
         response = client.get("/api/my_offerings")
         assert response.status_code == 200
         assert response.json()["offerings"][0]["item_id"] == "item123"
+        # The search terms stay in the database
+        assert mock_items_find.call_args.args[1] == {"search": 0}
+
+
+def test_add_to_offerings_indexes_and_invalidates(client):
+    app.dependency_overrides[get_current_user] = override_get_current_user_user
+    payload = {
+        "title": "Kitaplar", "category": "Books", "brand": "Ikea", "price": 50, "condition": "new",
+        "age": 1, "description": "Ders kitapları", "item_id": "item10042"
+    }
+
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_user_find, \
+         patch("backend.database.item_collection.insert_one", new_callable=AsyncMock) as mock_insert, \
+         patch("backend.database.users_collection.update_one", new_callable=AsyncMock) as mock_user_update, \
+         patch("backend.UserProfile_backend.main_routes.invalidate_items", new_callable=AsyncMock) as mock_invalidate:
+
+        mock_user_find.return_value = sample_user
+
+        response = client.post("/api/add_to_offerings", json=payload)
+        assert response.status_code == 200
+        inserted = mock_insert.call_args[0][0]
+        assert inserted["user_id"] == "user123"
+        assert "kitap" in inserted["search"]["terms"]
+        mock_invalidate.assert_awaited_once_with(["item10042"], ["Kitaplar"])
+        assert mock_user_update.call_args[0][1] == {"$push": {"offeredProducts": "item10042"}}
+
+
+def test_remove_from_offerings_clears_cache_and_references(client):
+    app.dependency_overrides[get_current_user] = override_get_current_user_user
+
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_user_find, \
+         patch("backend.database.item_collection.find_one_and_delete", new_callable=AsyncMock) as mock_delete, \
+         patch("backend.UserProfile_backend.main_routes.invalidate_items", new_callable=AsyncMock) as mock_invalidate, \
+         patch("backend.UserProfile_backend.main_routes.pull_item_references", new_callable=AsyncMock) as mock_pull:
+
+        mock_user_find.return_value = sample_user
+        mock_delete.return_value = {"_id": sample_product["_id"], "title": "Lamp"}
+
+        response = client.post("/api/remove_from_offerings?product_id=item123")
+        assert response.status_code == 200
+        mock_invalidate.assert_awaited_once_with(["item123"], ["Lamp"])
+        mock_pull.assert_awaited_once_with("item123")
+
+        mock_delete.return_value = None
+        response = client.post("/api/remove_from_offerings?product_id=item123")
+        assert response.status_code == 404
 
 
 def test_add_to_favorites(client):
@@ -281,3 +351,38 @@ def test_remove_from_favorites(client):
 
         response = client.post("/api/remove_from_favorites?product_id=item123")
         assert response.status_code == 200
+
+
+def test_get_user_orders_paginated_with_refund_status(client):
+    app.dependency_overrides[get_current_user] = override_get_current_user_user
+
+    orders = [
+        {"_id": ObjectId(), "order_id": "order100001", "user_id": "user123", "item_ids": ["item1", "item2"]},
+        {"_id": ObjectId(), "order_id": "order100002", "user_id": "user123", "item_ids": ["item3"]},
+    ]
+
+    with patch("backend.database.users_collection.find_one", new_callable=AsyncMock) as mock_user_find, \
+         patch("backend.database.order_collection.find", new_callable=MagicMock) as mock_order_find, \
+         patch("backend.database.item_collection.find", new_callable=MagicMock) as mock_item_find, \
+         patch("backend.database.refund_collection.find", new_callable=MagicMock) as mock_refund_find:
+
+        mock_user_find.return_value = sample_user
+        mock_order_cursor = mock_order_find.return_value
+        mock_order_cursor.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=orders)
+        mock_item_find.return_value.to_list = AsyncMock(return_value=[
+            {"item_id": "item1", "isSold": "delivered"},
+            {"item_id": "item2", "isSold": "inTransit"}
+        ])
+        mock_refund_find.return_value.to_list = AsyncMock(return_value=[
+            {"order_id": "order100001", "status": "approved"}
+        ])
+
+        response = client.get("/api/user-orders?limit=1")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["status"] == "inTransit"
+        assert data[0]["refund_status"] == "approved"
+        assert "X-Next-Cursor" in response.headers
+        mock_item_find.assert_called_once()
+        mock_refund_find.assert_called_once()